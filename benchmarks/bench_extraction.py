@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Benchmark: extraction stages on a synthetic corpus.
+
+Generates the scenario documents with corpus.py (cached in --corpus-dir) and
+times fitz.open, detect_page_offset, extract_annotations and
+save_annotations separately. Each scenario runs in a fresh process, so the
+reported peak RSS belongs to that scenario alone. The best of --repeat runs
+is reported.
+
+Results can be written as JSON and compared against a stored baseline; the
+script exits with status 1 if a stage got slower than the threshold allows.
+
+    PYTHONPATH=src python benchmarks/bench_extraction.py --output current.json
+    PYTHONPATH=src python benchmarks/bench_extraction.py --baseline base.json --threshold 0.15
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List, Tuple
+
+import fitz
+
+from corpus import DEFAULT_MIX, make_document
+
+RESULT_FORMAT_VERSION = 1
+
+# name: (pages, lines per page, words per line, annotations per page, mix)
+SCENARIOS: Dict[str, Tuple[int, int, int, float, Dict[str, int]]] = {
+    "small": (20, 40, 12, 3, DEFAULT_MIX),
+    "dense": (50, 70, 16, 40, DEFAULT_MIX),
+    "large-sparse": (2000, 40, 12, 0.1, DEFAULT_MIX),
+    "markup-only": (300, 50, 14, 8, {"highlight": 3, "underline": 1}),
+    "no-annotations": (1000, 40, 12, 0, DEFAULT_MIX),
+}
+
+STAGES = ("open", "detect_page_offset", "extract_annotations", "save_annotations")
+
+
+def corpus_path(corpus_dir: str, name: str) -> str:
+    pages, lines, words, annotations, mix = SCENARIOS[name]
+    mix_key = "-".join(f"{kind}{weight}" for kind, weight in sorted(mix.items()))
+    return os.path.join(corpus_dir, f"{name}-{pages}p-{lines}x{words}-{annotations}a-{mix_key}.pdf")
+
+
+def ensure_corpus(corpus_dir: str, names: List[str]) -> None:
+    os.makedirs(corpus_dir, exist_ok=True)
+    for name in names:
+        path = corpus_path(corpus_dir, name)
+        if not os.path.exists(path):
+            pages, lines, words, annotations, mix = SCENARIOS[name]
+            make_document(path, pages, lines, words, annotations, mix)
+
+
+def peak_rss_kib() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, KiB elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_scenario(pdf_path: str, repeat: int) -> Dict[str, Any]:
+    # Runs in a fresh worker process.
+    from pdf_annotation_extractor import pdf_utils
+    from pdf_annotation_extractor.pdf_utils import PDFProcessor
+
+    best = {stage: float("inf") for stage in STAGES}
+    annotations = pages = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "out.md")
+        for _run in range(repeat):
+            # The detected offset is memoized per process; measure it every time.
+            pdf_utils._detected_offsets.clear()
+            processor = PDFProcessor(pdf_path)
+
+            start = time.perf_counter()
+            processor.__enter__()
+            times = {"open": time.perf_counter() - start}
+            try:
+                start = time.perf_counter()
+                offset = processor.detect_page_offset()
+                times["detect_page_offset"] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                annotations = len(processor.extract_annotations(offset))
+                times["extract_annotations"] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                processor.save_annotations(output_path)
+                times["save_annotations"] = time.perf_counter() - start
+                pages = processor.doc.page_count
+            finally:
+                processor.__exit__(None, None, None)
+
+            for stage, seconds in times.items():
+                best[stage] = min(best[stage], seconds)
+
+    total = sum(best.values())
+    return {
+        "pages": pages,
+        "annotations": annotations,
+        "seconds": best,
+        "total_seconds": total,
+        "pages_per_second": pages / total if total else 0.0,
+        "annotations_per_second": annotations / total if total else 0.0,
+        "peak_rss_kib": peak_rss_kib(),
+    }
+
+
+def run(names: List[str], corpus_dir: str, repeat: int) -> Dict[str, Any]:
+    # Generated in a worker too: on Linux the peak RSS of this process would
+    # carry over into every scenario process started after it.
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        executor.submit(ensure_corpus, corpus_dir, names).result()
+    results = {}
+    for name in names:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            results[name] = executor.submit(run_scenario, corpus_path(corpus_dir, name),
+                                            repeat).result()
+    return {
+        "version": RESULT_FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pymupdf": fitz.VersionBind,
+        "machine": platform.machine(),
+        "repeat": repeat,
+        "scenarios": results,
+    }
+
+
+def print_results(report: Dict[str, Any]) -> None:
+    header = "".join(f"{stage:>21}" for stage in STAGES)
+    print(f"{'scenario':<16}{header}{'pages/s':>10}{'annots/s':>10}{'peak RSS':>11}")
+    for name, result in report["scenarios"].items():
+        stages = "".join(f"{result['seconds'][stage] * 1000:>18.1f} ms" for stage in STAGES)
+        print(f"{name:<16}{stages}{result['pages_per_second']:>10.0f}"
+              f"{result['annotations_per_second']:>10.0f}{result['peak_rss_kib'] / 1024:>8.1f} MiB")
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Stages that are slower than the baseline by more than threshold (0.1 = 10 %).
+    """
+    regressions = []
+    print(f"\n{'scenario':<16}{'stage':<22}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, result in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        for stage in STAGES + ("total",):
+            if stage == "total":
+                before, after = base["total_seconds"], result["total_seconds"]
+            else:
+                before, after = base["seconds"][stage], result["seconds"][stage]
+            if before <= 0:
+                continue
+            change = after / before - 1
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressions.append(f"{name}/{stage}")
+            print(f"{name:<16}{stage:<22}{before * 1000:>9.1f} ms{after * 1000:>9.1f} ms"
+                  f"{change * 100:>+8.1f}%{flag}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run, may be repeated (default: all)")
+    parser.add_argument("--corpus-dir",
+                        default=os.path.join(tempfile.gettempdir(), "pdf-annotation-extractor-bench"),
+                        help="where the generated PDFs are kept between runs")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed slowdown per stage before it counts as a regression (default: 0.10)")
+    args = parser.parse_args()
+
+    report = run(args.scenario or list(SCENARIOS), args.corpus_dir, args.repeat)
+    print_results(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+        print("\nNo regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark: peak memory with and without a memory budget.
+
+Extracts synthetic documents of increasing page count (see corpus.py), each
+run in a fresh process, once without and once with PDFProcessor's
+memory_budget, and reports peak RSS, time and the number of times the
+document was reopened. Without a budget the peak grows with the page count;
+with a budget it should stay flat.
+
+    PYTHONPATH=src python benchmarks/bench_memory.py --pages 1000 4000 --budget 80
+"""
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, Optional
+
+from corpus import make_document
+
+
+def peak_rss_mib() -> float:
+    # VmHWM starts afresh in a new process; ru_maxrss may carry the parent's peak.
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def ensure_document(corpus_dir: str, pages: int) -> str:
+    path = os.path.join(corpus_dir, f"memory-{pages}p.pdf")
+    if not os.path.exists(path):
+        os.makedirs(corpus_dir, exist_ok=True)
+        make_document(path, pages, lines=60, annotations=2)
+    return path
+
+
+def run(pdf_path: str, budget_mib: Optional[int]) -> Dict[str, float]:
+    # Runs in a fresh worker process.
+    from pdf_annotation_extractor.pdf_utils import PDFProcessor
+
+    budget = budget_mib * 1024 * 1024 if budget_mib else None
+    start = time.perf_counter()
+    with PDFProcessor(pdf_path, memory_budget=budget) as processor:
+        annotations = sum(1 for _annotation in processor.iter_annotations())
+    return {
+        "seconds": time.perf_counter() - start,
+        "annotations": annotations,
+        "peak_mib": peak_rss_mib(),
+        "reopens": processor.stats.counters["document_reopens"],
+    }
+
+
+def in_fresh_process(function, *args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(function, *args).result()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1000, 3000, 6000])
+    parser.add_argument("--budget", type=int, default=80, help="memory budget in MiB (default: 80)")
+    parser.add_argument("--corpus-dir",
+                        default=os.path.join(tempfile.gettempdir(), "pdf-annotation-extractor-bench"),
+                        help="where the generated PDFs are kept between runs")
+    args = parser.parse_args()
+
+    print(f"{'pages':>6}{'budget':>10}{'peak RSS':>12}{'time':>10}{'reopens':>9}")
+    for pages in args.pages:
+        pdf_path = in_fresh_process(ensure_document, args.corpus_dir, pages)
+        for budget in (None, args.budget):
+            result = in_fresh_process(run, pdf_path, budget)
+            label = f"{budget} MiB" if budget else "none"
+            print(f"{pages:>6}{label:>10}{result['peak_mib']:>8.1f} MiB{result['seconds']:>8.2f} s"
+                  f"{result['reopens']:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
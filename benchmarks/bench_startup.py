@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark: start-up time of the command line interface.
+
+Runs `python -m pdf_annotation_extractor --help` in fresh interpreters and
+compares the best wall time with the budget. It also checks that building
+the parser imports neither tkinter nor PyMuPDF. Exits with status 1 if the
+budget is exceeded or a heavy module is imported, so it can run in CI.
+
+    PYTHONPATH=src python benchmarks/bench_startup.py
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+# Modules the command line must not import before a command needs them.
+HEAVY_MODULES = ("tkinter", "fitz")
+
+CHECK_IMPORTS = (
+    "import sys\n"
+    "from pdf_annotation_extractor import cli\n"
+    "cli.build_parser()\n"
+    "print(' '.join(name for name in {modules!r} if name in sys.modules))\n"
+)
+
+
+def best_time(command, repeat: int) -> float:
+    best = float("inf")
+    for _run in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget", type=float, default=100.0,
+                        help="maximum start-up time in milliseconds (default: 100)")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    interpreter = best_time([sys.executable, "-c", "pass"], args.repeat)
+    startup = best_time([sys.executable, "-m", "pdf_annotation_extractor", "--help"], args.repeat)
+    imported = subprocess.run(
+        [sys.executable, "-c", CHECK_IMPORTS.format(modules=HEAVY_MODULES)],
+        check=True, capture_output=True, text=True
+    ).stdout.split()
+
+    print(f"interpreter: {interpreter * 1000:7.1f} ms")
+    print(f"--help:      {startup * 1000:7.1f} ms (budget {args.budget:.0f} ms)")
+    print(f"heavy modules imported: {', '.join(imported) or 'none'}")
+
+    ok = startup * 1000 <= args.budget and not imported
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark: text lookup per markup annotation, get_textbox vs. word index.
+
+Builds pages with a growing number of highlights and measures the time per
+annotation for page.get_textbox(annot.rect) and for the per-page
+PageWordIndex used by PDFProcessor.
+
+    PYTHONPATH=src python benchmarks/bench_text_lookup.py
+"""
+
+import argparse
+import time
+
+import fitz
+
+from pdf_annotation_extractor.text_index import PageWordIndex, annotation_rects
+
+LINE_TEXT = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor"
+
+
+def make_page(doc, highlights: int):
+    page = doc.new_page()
+    lines = int((page.rect.height - 100) // 12)
+    for line in range(lines):
+        page.insert_text((40, 60 + line * 12), LINE_TEXT, fontsize=9)
+    for index in range(highlights):
+        y = 60 + (index % lines) * 12
+        page.add_highlight_annot(fitz.Rect(40, y - 9, 300, y + 3))
+    return page
+
+
+def time_textbox(page) -> float:
+    start = time.perf_counter()
+    for annot in page.annots():
+        page.get_textbox(annot.rect)
+    return time.perf_counter() - start
+
+
+def time_index(page) -> float:
+    start = time.perf_counter()
+    index = PageWordIndex.from_page(page)
+    for annot in page.annots():
+        index.text_in(annotation_rects(annot))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--counts", default="1,5,10,20,40,80",
+                        help="comma-separated numbers of highlights per page")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'highlights':>10} {'get_textbox':>14} {'word index':>14} {'speed-up':>9}")
+    for count in (int(value) for value in args.counts.split(",")):
+        doc = fitz.open()
+        page = make_page(doc, count)
+        textbox = min(time_textbox(page) for _run in range(args.repeat)) / count
+        index = min(time_index(page) for _run in range(args.repeat)) / count
+        print(f"{count:>10} {textbox * 1e6:>11.1f} us {index * 1e6:>11.1f} us {textbox / index:>8.1f}x")
+        doc.close()
+
+
+if __name__ == "__main__":
+    main()
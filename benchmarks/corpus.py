@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Synthetic annotated PDFs for the benchmarks.
+
+Generates documents with a configurable number of pages, lines of text per
+page and annotation mix. Printed page numbers are placed in the footer,
+starting after a few unnumbered front-matter pages, so that page offset
+detection has something to find. The output only depends on the seed.
+
+    python benchmarks/corpus.py out.pdf --pages 500 --annotations 8 \
+        --mix highlight=4,note=2,underline=1,ink=1
+"""
+
+import argparse
+import random
+from typing import Dict
+
+import fitz
+
+DEFAULT_MIX = {"highlight": 4, "note": 2, "underline": 1, "ink": 1}
+AUTHORS = ("Alice Example", "Bob Example", "Carol Example")
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud "
+         "exercitation ullamco laboris nisi aliquip ex ea commodo consequat").split()
+
+TOP = 60
+LINE_HEIGHT = 12
+FONT_SIZE = 9
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for item in text.split(","):
+        kind, _sep, weight = item.partition("=")
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f"unknown annotation kind: {kind}")
+        mix[kind] = int(weight or 1)
+    return mix
+
+
+def _line_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _word in range(words))
+
+
+def _add_annotation(page, kind: str, rng: random.Random, line: int, index: int):
+    y = TOP + line * LINE_HEIGHT
+    rect = fitz.Rect(40, y - FONT_SIZE, 40 + rng.randint(80, 400), y + 3)
+    if kind == "highlight":
+        annot = page.add_highlight_annot(rect)
+    elif kind == "underline":
+        annot = page.add_underline_annot(rect)
+    elif kind == "ink":
+        points = [(rect.x0 + step * 10, y + rng.uniform(-4, 4)) for step in range(12)]
+        annot = page.add_ink_annot([points])
+    else:
+        annot = page.add_text_annot((20, y - FONT_SIZE), "")
+    content = f"Comment {page.number + 1}.{index}" if kind == "note" or rng.random() < 0.3 else ""
+    month = rng.randint(1, 12)
+    annot.set_info(
+        title=rng.choice(AUTHORS),
+        content=content,
+        modDate=f"D:2024{month:02d}{rng.randint(1, 28):02d}120000+01'00'"
+    )
+    annot.update()
+
+
+def make_document(path: str,
+                  pages: int = 100,
+                  lines: int = 50,
+                  words_per_line: int = 14,
+                  annotations: float = 4,
+                  mix: Dict[str, int] = DEFAULT_MIX,
+                  front_matter: int = 2,
+                  seed: int = 1) -> int:
+    """
+    Write a synthetic PDF and return the number of annotations in it.
+
+    annotations is the average number per page; values below one leave
+    pages without annotations.
+    """
+    rng = random.Random(seed)
+    kinds = [kind for kind, weight in mix.items() for _weight in range(weight)]
+    doc = fitz.open()
+    total = 0
+    for page_num in range(pages):
+        page = doc.new_page()
+        for line in range(lines):
+            page.insert_text((40, TOP + line * LINE_HEIGHT), _line_text(rng, words_per_line),
+                             fontsize=FONT_SIZE)
+        if page_num >= front_matter:
+            page.insert_text((page.rect.width / 2, page.rect.height - 30),
+                             str(page_num + 1 - front_matter), fontsize=FONT_SIZE)
+
+        count = int(annotations)
+        if rng.random() < annotations - count:
+            count += 1
+        for index in range(count if kinds else 0):
+            _add_annotation(page, rng.choice(kinds), rng, rng.randrange(lines), index)
+        total += count if kinds else 0
+    doc.save(path, garbage=1, deflate=True)
+    doc.close()
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("output", help="PDF file to write")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--lines", type=int, default=50, help="lines of text per page")
+    parser.add_argument("--words", type=int, default=14, help="words per line")
+    parser.add_argument("--annotations", type=float, default=4,
+                        help="average number of annotations per page")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="annotation kinds and weights (default: highlight=4,note=2,underline=1,ink=1)")
+    parser.add_argument("--front-matter", type=int, default=2,
+                        help="unnumbered pages before page 1")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    count = make_document(args.output, args.pages, args.lines, args.words, args.annotations,
+                          args.mix, args.front_matter, args.seed)
+    print(f"{args.output}: {args.pages} pages, {count} annotations")
+
+
+if __name__ == "__main__":
+    main()
@@ -33,7 +33,10 @@ setup(
     install_requires=requirements,
     entry_points={
         "console_scripts": [
-            "pdf-annotation-extractor=pdf_annotation_extractor.main:main",
+            "pdf-annotation-extractor=pdf_annotation_extractor.cli:main",
+        ],
+        "gui_scripts": [
+            "pdf-annotation-extractor-gui=pdf_annotation_extractor.main:main",
         ],
     },
 )
\ No newline at end of file
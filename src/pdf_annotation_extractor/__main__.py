@@ -1,4 +1,6 @@
-from .main import main
+import sys
+
+from .cli import main
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - asyncio interface
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Coroutines for event loops that must not block on an extraction:
+
+    output = await aextract(pdf_bytes, output=io.BytesIO(), output_format="jsonl")
+
+    job = extractor.start("book.pdf")
+    async for event in job:         # ProgressEvents
+        ...
+    output = await job
+
+The PyMuPDF work runs in an AsyncExtractor's executor, a process pool by
+default. MuPDF holds the GIL, so extractions in threads neither run in
+parallel nor leave the event loop alone for long.
+"""
+
+import asyncio
+import contextlib
+import io
+import itertools
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import (TYPE_CHECKING, Any, AsyncIterator, Dict, Iterable, List, Optional,
+                    Sequence)
+
+from .export import DEFAULT_FORMAT, Output, is_stream, output_stream
+from .filters import AnnotationFilter
+from .pdf_utils import PDFProcessingError, extract_pdf_annotations
+from .progress import ProgressEvent, ProgressReporter
+from .sources import PDFSource, document_source
+from .translations import _, translation_manager
+
+if TYPE_CHECKING:
+    from .cache import ExtractionCache
+
+# Seconds to wait for the last progress events of a finished job that
+# travel from a worker process through the manager
+RELAY_TIMEOUT = 1.0
+
+
+def _run_job(job_id: int, source: PDFSource, output: Optional[Output], render: bool,
+             options: Dict[str, Any], language: Optional[str], cancel_event, events) -> Any:
+    # Runs in an executor thread or a worker process. events receives
+    # (job_id, event) tuples and (job_id, None) once the job is done.
+    if language:
+        translation_manager.change_language(language)
+    reporter = None
+    if events is not None:
+        reporter = ProgressReporter(lambda event: events.put((job_id, event)))
+    try:
+        if render:
+            # Streams can't be passed to another process; the export is
+            # returned as text and written by the caller.
+            buffer = io.StringIO()
+            extract_pdf_annotations(source, progress_callback=reporter,
+                                    cancel_event=cancel_event, output=buffer, **options)
+            return buffer.getvalue()
+        return extract_pdf_annotations(source, progress_callback=reporter,
+                                       cancel_event=cancel_event, output=output, **options)
+    finally:
+        if events is not None:
+            events.put((job_id, None))
+
+
+class _LocalEvents:
+    # The events sink of a job that runs in a thread of this process.
+
+    def __init__(self, extractor: "AsyncExtractor"):
+        self.extractor = extractor
+
+    def put(self, item) -> None:
+        self.extractor._dispatch(*item)
+
+
+class ExtractionJob:
+    """
+    An extraction started with AsyncExtractor.start().
+
+    Await the job for its result. async for over the job yields its
+    ProgressEvents (rate-limited, see ProgressReporter) and ends when the
+    job is done; the result or error is only raised by awaiting it.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._events: "asyncio.Queue[ProgressEvent]" = asyncio.Queue()
+        self._finished = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _deliver(self, event: Optional[ProgressEvent]) -> None:
+        # Called in the event loop.
+        if event is None:
+            self._finished.set()
+        else:
+            self._events.put_nowait(event)
+
+    def __await__(self):
+        return self._task.__await__()
+
+    def __aiter__(self) -> AsyncIterator[ProgressEvent]:
+        return self.events()
+
+    async def events(self) -> AsyncIterator[ProgressEvent]:
+        while not (self._task.done() and self._events.empty()):
+            if not self._events.empty():
+                yield self._events.get_nowait()
+                continue
+            getter = asyncio.ensure_future(self._events.get())
+            try:
+                await asyncio.wait((getter, self._task), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                if not getter.done():
+                    getter.cancel()
+            if getter.done() and not getter.cancelled():
+                yield getter.result()
+
+    def cancel(self) -> bool:
+        """
+        Stop the job. A running extraction stops before its next page with
+        ExtractionCancelled and leaves no output file behind.
+        """
+        return self._task.cancel()
+
+    def done(self) -> bool:
+        return self._task.done()
+
+
+class AsyncExtractor:
+    """
+    Runs extractions for an event loop with at most max_concurrency at a time.
+
+    With processes (the default) every extraction runs in a worker process
+    of a pool that is started on first use; otherwise in a thread pool.
+    Jobs beyond the limit wait in the event loop, not in the executor, so
+    cancelling them costs nothing. A cancelled job keeps its slot until the
+    worker has stopped. An extractor belongs to the event loop it is first
+    used in; close it with aclose() or use it as an async context manager.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None, processes: bool = True):
+        self.max_concurrency = max_concurrency or os.cpu_count() or 1
+        self.processes = processes
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._jobs: Dict[int, ExtractionJob] = {}
+        self._job_ids = itertools.count()
+        # Process pools only: cancel events and progress go through a
+        # multiprocessing manager, and a thread relays the progress.
+        self._manager = None
+        self._relay_queue = None
+        self._relay: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_concurrency)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                                    thread_name_prefix="pdf-extract")
+        return self._executor
+
+    def _restart_pool(self, broken: Executor) -> None:
+        if self._executor is broken:
+            self._executor = None
+            broken.shutdown(wait=False)
+
+    def _start_manager(self) -> None:
+        from multiprocessing import Manager
+
+        with self._lock:
+            if self._manager is not None:
+                return
+            manager = Manager()
+            self._relay_queue = manager.Queue()
+            self._relay = threading.Thread(target=self._relay_events, args=(self._relay_queue,),
+                                           name="pdf-extract-progress", daemon=True)
+            self._relay.start()
+            self._manager = manager
+
+    def _relay_events(self, queue) -> None:
+        while True:
+            try:
+                item = queue.get()
+            except (EOFError, OSError):
+                return
+            if item is None:
+                return
+            self._dispatch(*item)
+
+    def _dispatch(self, job_id: int, event: Optional[ProgressEvent]) -> None:
+        # Called from worker and relay threads.
+        job = self._jobs.get(job_id)
+        if job is not None:
+            with contextlib.suppress(RuntimeError):
+                # The loop may be closed already.
+                job._loop.call_soon_threadsafe(job._deliver, event)
+
+    def _slot_released(self, future: asyncio.Future) -> None:
+        self._semaphore.release()
+        if not future.cancelled():
+            # Retrieved here so that the error of an abandoned job is not
+            # reported as never retrieved.
+            future.exception()
+
+    def start(self, pdf_path: PDFSource, page_offset: int = -1, workers: int = 1,
+              cache: Optional["ExtractionCache"] = None,
+              output_format: str = DEFAULT_FORMAT,
+              memory_budget: Optional[int] = None,
+              output: Optional[Output] = None,
+              annotation_filter: Optional[AnnotationFilter] = None,
+              progress: bool = True) -> ExtractionJob:
+        """
+        Start an extraction and return its job; the arguments are those of
+        extract_pdf_annotations(). Must be called in the event loop. Without
+        progress the job reports no events.
+        """
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        job_id = next(self._job_ids)
+        job = ExtractionJob(loop)
+        options = dict(page_offset=page_offset, workers=workers, cache=cache,
+                       output_format=output_format, memory_budget=memory_budget,
+                       annotation_filter=annotation_filter)
+        job._task = loop.create_task(self._run(job, job_id, pdf_path, output, options, progress))
+        self._jobs[job_id] = job
+        job._task.add_done_callback(lambda task: self._jobs.pop(job_id, None))
+        return job
+
+    async def _run(self, job: ExtractionJob, job_id: int, source: PDFSource,
+                   output: Optional[Output], options: Dict[str, Any], progress: bool) -> Output:
+        loop = asyncio.get_running_loop()
+        await self._semaphore.acquire()
+        try:
+            render = False
+            language = None
+            if self.processes:
+                if self._manager is None:
+                    await loop.run_in_executor(None, self._start_manager)
+                cancel_event = self._manager.Event()
+                events = self._relay_queue if progress else None
+                if not isinstance(source, (str, os.PathLike, bytes)):
+                    # File objects and buffers can't be sent to a worker process;
+                    # reading them may block, so it is done in a thread.
+                    source = await loop.run_in_executor(None, document_source, source)
+                render = output is not None and is_stream(output)
+                language = translation_manager.get_current_language()
+            else:
+                cancel_event = threading.Event()
+                events = _LocalEvents(self) if progress else None
+            executor = self._get_executor()
+            future = loop.run_in_executor(executor, _run_job, job_id, source,
+                                          None if render else output, render, options, language,
+                                          cancel_event, events)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        future.add_done_callback(self._slot_released)
+
+        try:
+            result = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+        except BrokenProcessPool:
+            self._restart_pool(executor)
+            raise PDFProcessingError(_("The worker process terminated unexpectedly"))
+        finally:
+            if (progress and self.processes and future.done() and not future.cancelled()
+                    and not isinstance(future.exception(), BrokenProcessPool)):
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(job._finished.wait(), RELAY_TIMEOUT)
+
+        if render:
+            with output_stream(output) as f:
+                f.write(result)
+            return output
+        return result
+
+    async def aextract(self, pdf_path: PDFSource, page_offset: int = -1, workers: int = 1,
+                       cache: Optional["ExtractionCache"] = None,
+                       output_format: str = DEFAULT_FORMAT,
+                       memory_budget: Optional[int] = None,
+                       output: Optional[Output] = None,
+                       annotation_filter: Optional[AnnotationFilter] = None) -> Output:
+        return await self.start(pdf_path, page_offset, workers, cache, output_format,
+                                memory_budget, output, annotation_filter, progress=False)
+
+    def close(self) -> None:
+        """Wait for running extractions and stop the workers."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            if self._manager is not None:
+                self._relay_queue.put(None)
+                self._relay.join()
+                self._manager.shutdown()
+                self._manager = None
+
+    async def aclose(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def __aenter__(self) -> "AsyncExtractor":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.aclose()
+
+
+_default_extractor: Optional[AsyncExtractor] = None
+
+
+def default_extractor() -> AsyncExtractor:
+    """The process-wide extractor used when none is given, one job per CPU."""
+    global _default_extractor
+    if _default_extractor is None:
+        _default_extractor = AsyncExtractor()
+    return _default_extractor
+
+
+async def aextract(pdf_path: PDFSource, page_offset: int = -1, workers: int = 1,
+                   cache: Optional["ExtractionCache"] = None,
+                   output_format: str = DEFAULT_FORMAT,
+                   memory_budget: Optional[int] = None,
+                   output: Optional[Output] = None,
+                   annotation_filter: Optional[AnnotationFilter] = None,
+                   extractor: Optional[AsyncExtractor] = None) -> Output:
+    """
+    The coroutine version of extract_pdf_annotations(). Returns the output
+    path or stream.
+
+    The extraction runs in extractor, by default default_extractor().
+    Cancelling the coroutine stops the extraction with the next page.
+    """
+    extractor = extractor or default_extractor()
+    return await extractor.aextract(pdf_path, page_offset, workers, cache, output_format,
+                                    memory_budget, output, annotation_filter)
+
+
+async def aextract_many(pdf_paths: Iterable[PDFSource], page_offset: int = -1,
+                        cache: Optional["ExtractionCache"] = None,
+                        output_format: str = DEFAULT_FORMAT,
+                        memory_budget: Optional[int] = None,
+                        outputs: Optional[Sequence[Optional[Output]]] = None,
+                        annotation_filter: Optional[AnnotationFilter] = None,
+                        extractor: Optional[AsyncExtractor] = None,
+                        max_concurrency: Optional[int] = None,
+                        return_exceptions: bool = False) -> List[Any]:
+    """
+    Extract several documents concurrently and return their outputs in order.
+
+    outputs gives the output for each document (by default next to the
+    PDF). max_concurrency limits these documents further than the
+    extractor does. Like asyncio.gather(), the first error is raised unless
+    return_exceptions is set, in which case errors are returned in place of
+    the outputs; cancelling the coroutine cancels all extractions.
+    """
+    extractor = extractor or default_extractor()
+    pdf_paths = list(pdf_paths)
+    outputs = list(outputs) if outputs is not None else [None] * len(pdf_paths)
+    if len(outputs) != len(pdf_paths):
+        raise ValueError("outputs must have one entry per document")
+    limit = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+    async def run(pdf_path: PDFSource, output: Optional[Output]) -> Output:
+        if limit is None:
+            return await extractor.aextract(pdf_path, page_offset, 1, cache, output_format,
+                                            memory_budget, output, annotation_filter)
+        async with limit:
+            return await extractor.aextract(pdf_path, page_offset, 1, cache, output_format,
+                                            memory_budget, output, annotation_filter)
+
+    return await asyncio.gather(*(run(pdf_path, output)
+                                  for pdf_path, output in zip(pdf_paths, outputs)),
+                                return_exceptions=return_exceptions)
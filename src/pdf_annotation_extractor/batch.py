@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - Batch processing
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+"""
+
+import glob
+import os
+import time
+from collections import deque
+from functools import partial
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Optional
+
+from .cache import ExtractionCache
+from .incremental import extract_incremental
+from .export import DEFAULT_FORMAT
+from .filters import GLOB_CHARACTERS, AnnotationFilter
+from .pdf_utils import PDFProcessor, _file_size, default_output_path, extract_with_stats
+from .progress import STAGE_FILES, ProgressCallback, as_reporter
+from .stats import ExtractionStats, profile_paths
+from .translations import _
+
+MANIFEST_EXTENSIONS = (".txt", ".lst")
+
+
+class BatchResult:
+    def __init__(self, pdf_path: str,
+                 output_path: Optional[str] = None,
+                 annotation_count: int = 0,
+                 duration: float = 0.0,
+                 error: Optional[str] = None,
+                 stats: Optional[ExtractionStats] = None):
+        self.pdf_path = pdf_path
+        self.output_path = output_path
+        self.annotation_count = annotation_count
+        self.duration = duration
+        self.error = error
+        self.stats = stats
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __str__(self) -> str:
+        if self.ok:
+            return f"[OK] {self.pdf_path} -> {self.output_path} ({self.annotation_count})"
+        return f"[FAILED] {self.pdf_path}: {self.error}"
+
+
+def _is_pdf(path: str) -> bool:
+    return path.lower().endswith(".pdf")
+
+
+def _read_manifest(manifest_path: str) -> List[str]:
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    entries = []
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entries.append(line if os.path.isabs(line) else os.path.join(base_dir, line))
+    return entries
+
+
+def collect_pdf_paths(sources: Iterable[str]) -> List[str]:
+    """
+    Expand directories, glob patterns and manifest files into a list of PDF paths.
+
+    A manifest is a text file with one source per line, or any file given
+    with a leading "@". Relative entries are resolved against the manifest.
+    """
+    paths: List[str] = []
+    seen = set()
+
+    def add(path: str) -> None:
+        path = os.path.normpath(path)
+        if path not in seen:
+            seen.add(path)
+            paths.append(path)
+
+    def expand(source: str) -> None:
+        if source.startswith("@"):
+            for entry in _read_manifest(source[1:]):
+                expand(entry)
+        elif os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if _is_pdf(name):
+                        add(os.path.join(root, name))
+        elif any(char in source for char in GLOB_CHARACTERS):
+            for match in sorted(glob.glob(source, recursive=True)):
+                if os.path.isfile(match) and _is_pdf(match):
+                    add(match)
+        elif source.lower().endswith(MANIFEST_EXTENSIONS) and os.path.isfile(source):
+            for entry in _read_manifest(source):
+                expand(entry)
+        else:
+            # Missing files are kept so that they show up as failures in the summary.
+            add(source)
+
+    for source in sources:
+        expand(source)
+    return paths
+
+
+def _output_path_for(pdf_path: str, output_dir: Optional[str],
+                     output_format: str = DEFAULT_FORMAT, compress: bool = False) -> str:
+    output_path = default_output_path(pdf_path, output_format, compress)
+    if not output_dir:
+        return output_path
+    return os.path.join(output_dir, os.path.basename(output_path))
+
+
+def process_file(pdf_path: str, page_offset: int = -1,
+                 output_dir: Optional[str] = None,
+                 cache: Optional[ExtractionCache] = None,
+                 incremental: bool = False,
+                 output_format: str = DEFAULT_FORMAT,
+                 compress: bool = False,
+                 profile_dir: Optional[str] = None,
+                 memory_budget: Optional[int] = None,
+                 annotation_filter: Optional[AnnotationFilter] = None) -> BatchResult:
+    """
+    Extract and save the annotations of a single file, reporting errors in the result.
+
+    With profile_dir, the file is extracted without cache and incremental
+    state, and its cProfile and stats files are written to profile_dir.
+    annotation_filter selects the annotations, see filters.AnnotationFilter.
+    """
+    start = time.perf_counter()
+    try:
+        output_path = _output_path_for(pdf_path, output_dir, output_format, compress)
+        if profile_dir:
+            profile_path, stats_path = profile_paths(pdf_path, profile_dir)
+            output_path, stats = extract_with_stats(pdf_path, output_path, page_offset,
+                                                    output_format=output_format,
+                                                    profile_path=profile_path,
+                                                    memory_budget=memory_budget,
+                                                    annotation_filter=annotation_filter)
+            stats.save(stats_path)
+            return BatchResult(pdf_path, output_path, stats.counters["annotations_written"],
+                               time.perf_counter() - start, stats=stats)
+        if incremental:
+            output_path, count, _pages = extract_incremental(pdf_path, output_path, page_offset,
+                                                             output_format=output_format,
+                                                             annotation_filter=annotation_filter)
+        elif cache is not None:
+            output_path, count = cache.extract_and_save(pdf_path, output_path, page_offset,
+                                                        output_format=output_format,
+                                                        memory_budget=memory_budget,
+                                                        annotation_filter=annotation_filter)
+        else:
+            with PDFProcessor(pdf_path, memory_budget=memory_budget,
+                              annotation_filter=annotation_filter) as processor:
+                output_path = processor.write_annotations(output_path, page_offset,
+                                                          output_format=output_format)
+            count = processor.annotation_count
+        return BatchResult(pdf_path, output_path, count, time.perf_counter() - start)
+    except Exception as e:
+        return BatchResult(pdf_path, duration=time.perf_counter() - start, error=str(e))
+
+
+def run_batch(sources: Iterable[str],
+              workers: Optional[int] = None,
+              page_offset: int = -1,
+              output_dir: Optional[str] = None,
+              progress_callback: Optional[ProgressCallback] = None,
+              cache: Optional[ExtractionCache] = None,
+              incremental: bool = False,
+              output_format: str = DEFAULT_FORMAT,
+              compress: bool = False,
+              profile_dir: Optional[str] = None,
+              memory_budget: Optional[int] = None,
+              annotation_filter: Optional[AnnotationFilter] = None) -> List[BatchResult]:
+    """
+    Process many PDF files in a process pool and return one result per file.
+
+    The largest files are scheduled first so that a single big file does not
+    keep the pool busy at the end of the run. Results are returned in the
+    order in which the files were collected. With incremental, each file is
+    processed with extract_incremental() instead of the cache. With compress,
+    the outputs are written gzip-compressed. With profile_dir, every file is
+    profiled (see process_file()) and the results carry its stats.
+    memory_budget (bytes) applies to every worker, see PDFProcessor, and
+    annotation_filter to every file.
+    """
+    paths = collect_pdf_paths(sources)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+
+    results: Dict[str, BatchResult] = {}
+    reporter = as_reporter(progress_callback)
+    if reporter:
+        reporter.start(STAGE_FILES, len(paths))
+
+    def report(result: BatchResult) -> None:
+        results[result.pdf_path] = result
+        if reporter:
+            reporter.update(len(results), annotations=reporter.annotations + result.annotation_count)
+
+    job = partial(process_file, page_offset=page_offset, output_dir=output_dir,
+                  cache=cache, incremental=incremental, output_format=output_format,
+                  compress=compress, profile_dir=profile_dir, memory_budget=memory_budget,
+                  annotation_filter=annotation_filter)
+    pending = deque(sorted(paths, key=_file_size, reverse=True))
+    workers = workers or os.cpu_count() or 1
+    suspects: List[str] = []
+
+    # Only as many files as there are workers are submitted at a time, so
+    # the files in flight are exactly those that are being processed. A
+    # worker that dies (e.g. a crash inside MuPDF) breaks the whole pool:
+    # the files that were running are set aside and the rest of the run
+    # continues in a new pool of full size.
+    while pending:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        running: Dict[Future, str] = {}
+        broken = False
+        try:
+            while pending or running:
+                while pending and len(running) < workers:
+                    path = pending.popleft()
+                    running[executor.submit(job, path)] = path
+                done, _running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = running.pop(future)
+                    try:
+                        report(future.result())
+                    except BrokenProcessPool:
+                        suspects.append(path)
+                        broken = True
+                if broken:
+                    suspects.extend(running.values())
+                    break
+        finally:
+            executor.shutdown(wait=not broken)
+
+    # Retry the files that were running during a crash one by one in a
+    # single worker, so that only the culprit is reported as failed.
+    executor = None
+    try:
+        for path in suspects:
+            if executor is None:
+                executor = ProcessPoolExecutor(max_workers=1)
+            try:
+                report(executor.submit(job, path).result())
+            except BrokenProcessPool:
+                report(BatchResult(path, error=_("The worker process terminated unexpectedly")))
+                executor.shutdown(wait=False)
+                executor = None
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if reporter:
+        reporter.finish()
+
+    return [results[path] for path in paths]
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - Persistent extraction cache
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from .columns import AnnotationColumns
+from .export import DEFAULT_FORMAT, Output, save_annotation_file
+from .filters import AnnotationFilter
+from .pdf_utils import PDFProcessor, default_output_path
+from .translations import translation_manager
+
+if TYPE_CHECKING:
+    import threading
+
+CACHE_FORMAT_VERSION = 4
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+ENTRY_SUFFIX = ".json"
+TEMP_SUFFIX = ".tmp"
+# A full scan of the directory is made at least every so many puts, so that
+# entries written by other processes are accounted for.
+EVICT_INTERVAL = 64
+# Temporary files older than this (seconds) were left behind by a writer
+# that was killed and are removed on eviction.
+STALE_TEMP_AGE = 3600
+DIGEST_CHUNK_SIZE = 1024 * 1024
+
+
+def default_cache_dir() -> str:
+    base_dir = (
+        os.environ.get("XDG_CACHE_HOME")
+        or os.environ.get("LOCALAPPDATA")
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    )
+    return os.path.join(base_dir, "pdf-annotation-extractor")
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DIGEST_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    On-disk cache of extraction results keyed by file content and options.
+
+    Entries are written to a temporary file and moved into place atomically,
+    so several processes can share one cache directory. The modification
+    time of an entry is refreshed on every hit and the least recently used
+    entries are evicted once the directory grows beyond max_bytes. The size
+    of the directory is tracked across puts, so it is only scanned when it
+    may have grown too large, or every EVICT_INTERVAL puts.
+    """
+
+    def __init__(self, directory: Optional[str] = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Size of the directory as of the last scan plus our own puts
+        self._size: Optional[int] = None
+        self._puts = 0
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ENTRY_SUFFIX)
+
+    def key(self, pdf_path: str, **options: Any) -> str:
+        options["language"] = options.get("language") or translation_manager.get_current_language()
+        payload = json.dumps(
+            {"version": CACHE_FORMAT_VERSION, "file": file_digest(pdf_path), "options": options},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError):
+            # Unreadable or truncated entry: drop it and extract again.
+            self._remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=TEMP_SUFFIX)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            written = os.path.getsize(tmp_path)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+        self._puts += 1
+        if self._size is None or self._puts % EVICT_INTERVAL == 0:
+            self.evict()
+        else:
+            self._size += written - replaced
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def _entries(self, temp_files: bool = False) -> List[Tuple[float, int, str]]:
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        suffixes = (ENTRY_SUFFIX, TEMP_SUFFIX) if temp_files else ENTRY_SUFFIX
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith(suffixes):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def size(self) -> int:
+        """The size of the entries and temporary files in bytes."""
+        return sum(size for _mtime, size, _path in self._entries(temp_files=True))
+
+    def evict(self) -> int:
+        """
+        Remove stale temporary files, then the least recently used entries
+        until the directory fits into max_bytes. Returns the number of files
+        removed.
+        """
+        entries = []
+        total = 0
+        removed = 0
+        stale = time.time() - STALE_TEMP_AGE
+        for mtime, size, path in self._entries(temp_files=True):
+            if not path.endswith(TEMP_SUFFIX):
+                entries.append((mtime, size, path))
+            elif mtime < stale:
+                self._remove(path)
+                removed += 1
+                continue
+            total += size
+
+        for _mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            # Another process may have evicted the same entry already.
+            self._remove(path)
+            total -= size
+            removed += 1
+        self._size = total
+        return removed
+
+    def purge(self) -> int:
+        """Remove all entries and stale temporary files."""
+        removed = 0
+        stale = time.time() - STALE_TEMP_AGE
+        for mtime, _size, path in self._entries(temp_files=True):
+            if path.endswith(TEMP_SUFFIX) and mtime >= stale:
+                # Still being written
+                continue
+            self._remove(path)
+            removed += 1
+        self._size = None
+        return removed
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def extract_and_save(self, pdf_path: str,
+                         output_path: Optional[Output] = None,
+                         page_offset: int = -1,
+                         progress_callback: Optional[Callable[[str], None]] = None,
+                         workers: int = 1,
+                         output_format: str = DEFAULT_FORMAT,
+                         cancel_event: Optional["threading.Event"] = None,
+                         memory_budget: Optional[int] = None,
+                         annotation_filter: Optional[AnnotationFilter] = None
+                         ) -> Tuple[Output, int]:
+        """
+        Write the export for pdf_path, extracting only on a cache miss.
+
+        The cached result does not depend on the output format, so one entry
+        serves all formats, but every annotation_filter has its own entry.
+        output_path may also be a writable stream.
+        Returns the output path or stream and the number of annotations.
+        """
+        if not output_path:
+            output_path = default_output_path(pdf_path, output_format)
+
+        options: Dict[str, Any] = {"page_offset": page_offset}
+        if annotation_filter:
+            # Unfiltered entries keep their keys.
+            options["filter"] = annotation_filter.to_dict()
+        key = self.key(pdf_path, **options)
+        entry = self.get(key)
+        if entry is None:
+            # The export is streamed while the entry is collected in columns.
+            columns = AnnotationColumns()
+            with PDFProcessor(pdf_path, cancel_event, memory_budget,
+                              annotation_filter=annotation_filter) as processor:
+                processor.write_annotations(output_path, page_offset, progress_callback,
+                                            workers, output_format, collect=columns.append)
+                self.put(key, {
+                    "page_count": processor.doc.page_count,
+                    "page_offset": processor.page_offset,
+                    "annotations": columns.to_dict(),
+                })
+            return output_path, len(columns)
+
+        count = save_annotation_file(
+            output_path, pdf_path, entry["page_count"], entry["page_offset"],
+            AnnotationColumns.from_dict(entry["annotations"]), output_format
+        )
+        return output_path, count
@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - Command line interface
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Only the standard library is imported at module level. PyMuPDF, the
+translations and tkinter are imported by the commands that need them, so
+that short-lived invocations and --help start quickly.
+"""
+
+import argparse
+import sys
+from typing import List, Optional
+
+
+# File name for stdin and stdout
+STDIO = "-"
+
+
+def _print_progress(event) -> None:
+    from .progress import STAGE_FILES, STAGE_PAGES
+
+    line = event.format()
+    if event.stage in (STAGE_PAGES, STAGE_FILES) and event.current:
+        unit = "pages/s" if event.stage == STAGE_PAGES else "files/s"
+        line += f" {event.rate:.1f} {unit}, {event.annotations} annotations"
+        if event.eta is not None:
+            line += f", ETA {event.eta:.0f} s"
+    print(line, file=sys.stderr)
+
+
+def _progress_reporter(args: argparse.Namespace):
+    if args.quiet:
+        return None
+    from .progress import ProgressReporter
+
+    return ProgressReporter(_print_progress)
+
+
+def _open_cache(args: argparse.Namespace):
+    from .cache import ExtractionCache
+
+    cache = ExtractionCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    if args.purge_cache:
+        removed = cache.purge()
+        print(f"Removed {removed} cache entries from {cache.directory}", file=sys.stderr)
+    return None if args.no_cache else cache
+
+
+def _print_stats(pdf_path: str, stats) -> None:
+    print(f"{pdf_path}:", file=sys.stderr)
+    for line in stats.format().splitlines():
+        print(f"  {line}", file=sys.stderr)
+
+
+def _memory_budget(args: argparse.Namespace):
+    return args.memory_budget * 1024 * 1024 if args.memory_budget else None
+
+
+def _annotation_filter(args: argparse.Namespace):
+    # Raises ValueError for invalid filter options.
+    from .filters import AnnotationFilter, parse_page_range
+
+    types = [value for values in args.type or () for value in values.split(",") if value.strip()]
+    annotation_filter = AnnotationFilter(types, parse_page_range(args.pages), args.author,
+                                         args.since, args.until)
+    return annotation_filter or None
+
+
+def _extract(args: argparse.Namespace, source, output) -> int:
+    import os
+    from .pdf_utils import PDFProcessor, extract_with_stats
+
+    progress_callback = _progress_reporter(args)
+    annotation_filter = _annotation_filter(args)
+    from_stdin = args.pdf_file == STDIO
+    if args.profile:
+        from .stats import profile_paths
+
+        os.makedirs(args.profile, exist_ok=True)
+        profile_path, stats_path = profile_paths("stdin" if from_stdin else args.pdf_file,
+                                                 args.profile)
+        _output, stats = extract_with_stats(
+            source, output, args.page_offset, progress_callback,
+            args.workers, args.format, profile_path, _memory_budget(args), annotation_filter
+        )
+        stats.save(stats_path)
+        _print_stats(args.pdf_file, stats)
+        return stats.counters["annotations_written"]
+
+    # The cache is keyed by file content, so it only serves files.
+    cache = _open_cache(args)
+    if cache is not None and not from_stdin:
+        return cache.extract_and_save(
+            source, output, args.page_offset, progress_callback,
+            args.workers, args.format, memory_budget=_memory_budget(args),
+            annotation_filter=annotation_filter
+        )[1]
+    with PDFProcessor(source, memory_budget=_memory_budget(args),
+                      annotation_filter=annotation_filter) as processor:
+        processor.write_annotations(output, args.page_offset, progress_callback,
+                                    args.workers, args.format)
+    return processor.annotation_count
+
+
+def run_extract_command(args: argparse.Namespace) -> int:
+    import gzip
+    from .export import GZIP_SUFFIX
+    from .pdf_utils import PDFProcessingError, default_output_path
+
+    # "-" reads the PDF from stdin and writes the export to stdout; a PDF
+    # from stdin is exported to stdout unless -o is given.
+    source = sys.stdin.buffer if args.pdf_file == STDIO else args.pdf_file
+    to_stdout = args.output == STDIO or (args.output is None and args.pdf_file == STDIO)
+    if args.gzip and args.output and not to_stdout and not args.output.endswith(GZIP_SUFFIX):
+        # Files are compressed by their name, see export.open_output().
+        print(f"--gzip requires an output file ending in {GZIP_SUFFIX}: {args.output}",
+              file=sys.stderr)
+        return 2
+    try:
+        if to_stdout and args.gzip:
+            with gzip.GzipFile(fileobj=sys.stdout.buffer, mode="wb") as output:
+                count = _extract(args, source, output)
+            output_path = "stdout"
+        elif to_stdout:
+            count = _extract(args, source, sys.stdout.buffer)
+            output_path = "stdout"
+        else:
+            output_path = args.output or default_output_path(args.pdf_file, args.format,
+                                                             args.gzip)
+            count = _extract(args, source, output_path)
+    except (PDFProcessingError, OSError, ValueError) as e:
+        print(f"{args.pdf_file}: {e}", file=sys.stderr)
+        return 1
+    # Keep stdout for the export.
+    print(f"{args.pdf_file} -> {output_path} ({count})",
+          file=sys.stderr if to_stdout else sys.stdout)
+    return 0
+
+
+def run_gui_command(args: argparse.Namespace) -> int:
+    from .main import main as gui_main
+
+    gui_main()
+    return 0
+
+
+def run_batch_command(args: argparse.Namespace) -> int:
+    from .batch import run_batch
+
+    cache = _open_cache(args)
+    if not args.sources:
+        return 0
+    try:
+        annotation_filter = _annotation_filter(args)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    results = run_batch(
+        args.sources,
+        workers=args.workers,
+        page_offset=args.page_offset,
+        output_dir=args.output_dir,
+        progress_callback=_progress_reporter(args),
+        cache=cache,
+        incremental=args.incremental,
+        output_format=args.format,
+        compress=args.gzip,
+        profile_dir=args.profile,
+        memory_budget=_memory_budget(args),
+        annotation_filter=annotation_filter
+    )
+    failed = 0
+    for result in results:
+        print(result)
+        if result.stats is not None:
+            _print_stats(result.pdf_path, result.stats)
+        if not result.ok:
+            failed += 1
+    print(f"{len(results) - failed}/{len(results)} OK", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def run_store_import_command(args: argparse.Namespace) -> int:
+    from .store import AnnotationStore, import_sources
+
+    with AnnotationStore(args.database) as store:
+        results = import_sources(store, args.sources, workers=args.workers,
+                                 page_offset=args.page_offset)
+    failed = 0
+    for document, result in sorted(results.items()):
+        if isinstance(result, str):
+            print(f"[FAILED] {document}: {result}")
+            failed += 1
+        else:
+            print(f"[OK] {document} ({result})")
+    print(f"{len(results) - failed}/{len(results)} OK", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def run_store_query_command(args: argparse.Namespace) -> int:
+    import json
+    from .store import AnnotationStore
+
+    conditions = dict(document=args.document, page=args.page, type_code=args.type,
+                      author=args.author, since=args.since, until=args.until, limit=args.limit)
+    with AnnotationStore(args.database) as store:
+        if args.explain:
+            for line in store.explain(**conditions):
+                print(line)
+            return 0
+        for record in store.query(**conditions):
+            if args.json:
+                print(json.dumps(record, ensure_ascii=False))
+                continue
+            text = record["content"] or record["highlighted_text"] or ""
+            print(f"{record['document']}:{record['page_num']}\t{record['subtype']}\t"
+                  f"{record['author'] or ''}\t{record['modified'] or ''}\t"
+                  f"{' '.join(text.split())}")
+    return 0
+
+
+def run_store_search_command(args: argparse.Namespace) -> int:
+    import json
+    from .store import AnnotationStore, StoreError
+
+    with AnnotationStore(args.database) as store:
+        try:
+            for record in store.search(" ".join(args.query), document=args.document,
+                                       limit=args.limit, raw=args.raw):
+                if args.json:
+                    print(json.dumps(record, ensure_ascii=False))
+                    continue
+                print(f"{record['document']}:{record['page_num']}\t{record['subtype']}\t"
+                      f"{' '.join(record['snippet'].split())}")
+        except StoreError as e:
+            print(e, file=sys.stderr)
+            return 2
+    return 0
+
+
+def _interrupt_on_sigterm() -> None:
+    # The long-running commands stop on SIGTERM as they do on Ctrl-C.
+    import signal
+
+    def interrupt(signum, frame) -> None:
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, interrupt)
+
+
+def run_watch_command(args: argparse.Namespace) -> int:
+    import os
+    from .watch import InotifyWatcher, watch
+
+    missing = [directory for directory in args.directories if not os.path.isdir(directory)]
+    if missing:
+        print(f"Not a directory: {', '.join(missing)}", file=sys.stderr)
+        return 2
+
+    def report(result) -> None:
+        print(result, flush=True)
+
+    if not args.quiet:
+        kind = "polling" if args.poll or not InotifyWatcher.available() else "inotify"
+        print(f"Watching {', '.join(args.directories)} ({kind})", file=sys.stderr)
+    # Workers reset it, see watch._init_worker().
+    _interrupt_on_sigterm()
+    try:
+        watch(args.directories, args.workers, args.page_offset, args.output_dir, args.format,
+              args.gzip, report, args.settle, args.poll, args.poll_interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def run_serve_command(args: argparse.Namespace) -> int:
+    from .server import serve
+
+    def started() -> None:
+        # The workers are running, so they keep the default handler.
+        _interrupt_on_sigterm()
+        if args.socket:
+            print(f"Listening on {args.socket}", file=sys.stderr)
+        else:
+            print(f"Listening on http://{args.host}:{args.port}", file=sys.stderr)
+
+    try:
+        serve(args.host, args.port, args.socket, args.workers, args.queue_size, args.language,
+              args.root, args.max_body_size * 1024 * 1024, started)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("cache")
+    group.add_argument("--no-cache", action="store_true",
+                       help="always extract, neither read nor update the cache")
+    group.add_argument("--purge-cache", action="store_true",
+                       help="remove all cached results before running")
+    group.add_argument("--cache-dir", default=None,
+                       help="cache directory (default: ~/.cache/pdf-annotation-extractor)")
+    group.add_argument("--cache-size", type=int, default=256,
+                       help="maximum cache size in MiB (default: 256)")
+
+
+def add_filter_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group(
+        "filter",
+        "extract only matching annotations; the page range is applied before pages are "
+        "loaded, the other conditions before the text under an annotation is read"
+    )
+    group.add_argument("--pages", default=None, metavar="FIRST-LAST",
+                       help="page range, e.g. 200-260, 200- or 7 (physical pages, from 1)")
+    group.add_argument("--type", action="append", default=None,
+                       help="annotation type codes or subtype names, e.g. Highlight,Text; "
+                            "may be repeated")
+    group.add_argument("--author", default=None, metavar="REGEX",
+                       help="regular expression searched for in the author")
+    group.add_argument("--since", default=None,
+                       help="modified on or after this date (YYYY-MM-DD, UTC)")
+    group.add_argument("--until", default=None,
+                       help="modified before this date (YYYY-MM-DD, UTC)")
+
+
+def add_output_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--page-offset", type=int, default=-1,
+                        help="page offset, -1 for automatic detection")
+    parser.add_argument("-f", "--format", choices=("markdown", "jsonl"), default="markdown",
+                        help="output format: localized Markdown or JSON Lines (default: markdown)")
+    parser.add_argument("--gzip", action="store_true",
+                        help="write gzip-compressed output files (.gz)")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="do not report progress")
+    parser.add_argument("--memory-budget", metavar="MIB", type=int, default=None,
+                        help="keep each process below about this many MiB by releasing "
+                             "and reopening the document as needed")
+    parser.add_argument("--profile", metavar="DIR", default=None,
+                        help="extract without the cache, print per-stage timings and write "
+                             "<name>.prof (cProfile) and <name>.stats.json to DIR")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="pdf-annotation-extractor",
+        description="Extract annotations from PDF files. "
+                    "Without a command the graphical interface is started."
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    extract = subparsers.add_parser(
+        "extract",
+        help="extract the annotations of one PDF file"
+    )
+    extract.add_argument("pdf_file", help="PDF file, - to read it from stdin")
+    extract.add_argument("-o", "--output", default=None,
+                         help="output file, - for stdout (default: <name>_annotations.md next "
+                              "to the PDF, stdout for stdin)")
+    extract.add_argument("-j", "--workers", type=int, default=1,
+                         help="number of worker processes for the pages (default: 1)")
+    add_output_arguments(extract)
+    add_filter_arguments(extract)
+    add_cache_arguments(extract)
+    extract.set_defaults(func=run_extract_command)
+
+    batch = subparsers.add_parser(
+        "batch",
+        help="extract the annotations of many PDF files in parallel"
+    )
+    batch.add_argument(
+        "sources", nargs="*",
+        help="PDF files, directories, glob patterns or manifest files (@list.txt)"
+    )
+    batch.add_argument("-j", "--workers", type=int, default=None,
+                       help="number of worker processes (default: number of CPUs)")
+    batch.add_argument("-o", "--output-dir", default=None,
+                       help="directory for the output files (default: next to each PDF)")
+    batch.add_argument("--incremental", action="store_true",
+                       help="re-extract only pages whose annotations changed since the last run")
+    add_output_arguments(batch)
+    add_filter_arguments(batch)
+    add_cache_arguments(batch)
+    batch.set_defaults(func=run_batch_command)
+
+    store = subparsers.add_parser(
+        "store",
+        help="collect annotations of many documents in an SQLite database and query them"
+    )
+    store_commands = store.add_subparsers(dest="store_command", required=True)
+
+    store_import = store_commands.add_parser(
+        "import",
+        help="add PDF files or JSON Lines exports to the database"
+    )
+    store_import.add_argument("database", help="SQLite database file")
+    store_import.add_argument(
+        "sources", nargs="+",
+        help="PDF files, directories, glob patterns, manifest files or .jsonl(.gz) exports"
+    )
+    store_import.add_argument("-j", "--workers", type=int, default=None,
+                              help="number of worker processes (default: number of CPUs)")
+    store_import.add_argument("--page-offset", type=int, default=-1,
+                              help="page offset, -1 for automatic detection")
+    store_import.set_defaults(func=run_store_import_command)
+
+    store_query = store_commands.add_parser("query", help="list matching annotations")
+    store_query.add_argument("database", help="SQLite database file")
+    store_query.add_argument("--document", default=None,
+                             help="document path, may contain glob wildcards")
+    store_query.add_argument("--page", type=int, default=None, help="page number")
+    store_query.add_argument("--type", default=None,
+                             help="annotation type code or subtype name, e.g. Highlight")
+    store_query.add_argument("--author", default=None, help="author")
+    store_query.add_argument("--since", default=None,
+                             help="modified on or after this date (YYYY-MM-DD, UTC)")
+    store_query.add_argument("--until", default=None,
+                             help="modified before this date (YYYY-MM-DD, UTC)")
+    store_query.add_argument("--limit", type=int, default=None, help="maximum number of results")
+    store_query.add_argument("--json", action="store_true", help="print JSON Lines records")
+    store_query.add_argument("--explain", action="store_true",
+                             help="print the query plan instead of the results")
+    store_query.set_defaults(func=run_store_query_command)
+
+    store_search = store_commands.add_parser(
+        "search",
+        help="full-text search in comments and highlighted text, best matches first"
+    )
+    store_search.add_argument("database", help="SQLite database file")
+    store_search.add_argument("query", nargs="+", help="words that must all occur; word* for prefixes")
+    store_search.add_argument("--document", default=None,
+                              help="document path, may contain glob wildcards")
+    store_search.add_argument("--limit", type=int, default=20,
+                              help="maximum number of results (default: 20)")
+    store_search.add_argument("--raw", action="store_true",
+                              help="pass the query to SQLite FTS5 unchanged (phrases, OR, NEAR)")
+    store_search.add_argument("--json", action="store_true", help="print JSON Lines records")
+    store_search.set_defaults(func=run_store_search_command)
+
+    watch = subparsers.add_parser(
+        "watch",
+        help="extract new and modified PDFs in directories as they appear"
+    )
+    watch.add_argument("directories", nargs="+", help="directories to watch, including subdirectories")
+    watch.add_argument("-j", "--workers", type=int, default=None,
+                       help="number of files extracted at the same time (default: number of CPUs)")
+    watch.add_argument("-o", "--output-dir", default=None,
+                       help="directory for the output files (default: next to each PDF)")
+    watch.add_argument("--settle", type=float, default=2.0,
+                       help="seconds a file must stay unchanged before it is extracted (default: 2)")
+    watch.add_argument("--poll", action="store_true",
+                       help="scan the directories periodically instead of using inotify")
+    watch.add_argument("--poll-interval", type=float, default=2.0,
+                       help="seconds between two scans when polling (default: 2)")
+    watch.add_argument("--page-offset", type=int, default=-1,
+                       help="page offset, -1 for automatic detection")
+    watch.add_argument("-f", "--format", choices=("markdown", "jsonl"), default="markdown",
+                       help="output format: localized Markdown or JSON Lines (default: markdown)")
+    watch.add_argument("--gzip", action="store_true",
+                       help="write gzip-compressed output files (.gz)")
+    watch.add_argument("-q", "--quiet", action="store_true",
+                       help="do not report which watcher is used")
+    watch.set_defaults(func=run_watch_command)
+
+    serve = subparsers.add_parser(
+        "serve",
+        help="run an extraction daemon with a warm worker pool on localhost or a Unix socket"
+    )
+    serve.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8765, help="TCP port (default: 8765)")
+    serve.add_argument("--socket", default=None, help="listen on this Unix socket instead of TCP")
+    serve.add_argument("-j", "--workers", type=int, default=None,
+                       help="number of worker processes (default: number of CPUs)")
+    serve.add_argument("--queue-size", type=int, default=None,
+                       help="jobs that may wait for a worker before requests are rejected "
+                            "(default: 4 per worker)")
+    serve.add_argument("--language", default=None,
+                       help="default language of the Markdown output (default: system language)")
+    serve.add_argument("--root", default=None,
+                       help="only accept path jobs for files below this directory; required "
+                            "for addresses other than loopback")
+    serve.add_argument("--max-body-size", metavar="MIB", type=int, default=64,
+                       help="largest accepted upload in MiB (default: 64)")
+    serve.set_defaults(func=run_serve_command)
+
+    gui = subparsers.add_parser("gui", help="start the graphical interface")
+    gui.set_defaults(func=run_gui_command)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        return run_gui_command(args)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
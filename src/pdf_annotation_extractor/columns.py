@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - Columnar annotation storage
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+"""
+
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .pdf_utils import PDFAnnotation
+
+
+class StringTable:
+    """
+    Stores each distinct string once; rows refer to it by index, -1 is None.
+    """
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.values: List[str] = []
+        self._index: Dict[str, int] = {}
+        for value in values:
+            self.add(value)
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        index = self._index.get(value)
+        if index is None:
+            index = len(self.values)
+            self.values.append(value)
+            self._index[value] = index
+        return index
+
+    def get(self, index: int) -> Optional[str]:
+        return None if index < 0 else self.values[index]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class AnnotationColumns:
+    """
+    Column-oriented container for many annotations.
+
+    Numbers live in typed arrays and repeated strings (type, author, page
+    heading, dates) in string tables, so no object is kept per annotation.
+    Rows can be appended from field values directly and are only turned back
+    into PDFAnnotation objects when iterated.
+    """
+
+    NUMERIC_COLUMNS = (("page_num", "i"), ("x0", "d"), ("y0", "d"), ("x1", "d"), ("y1", "d"),
+                       ("type_code", "i"))
+    TABLE_COLUMNS = ("type", "title", "creation_date", "modified_date", "internal_page_num",
+                     "page_label")
+    TEXT_COLUMNS = ("content", "highlighted_text")
+
+    def __init__(self, annotations: Iterable[PDFAnnotation] = ()):
+        self.page_num = array("i")
+        self.x0 = array("d")
+        self.y0 = array("d")
+        self.x1 = array("d")
+        self.y1 = array("d")
+        # -1 if the type code is unknown
+        self.type_code = array("i")
+        self.strings = StringTable()
+        # Indices into self.strings
+        self.type = array("i")
+        self.title = array("i")
+        self.creation_date = array("i")
+        self.modified_date = array("i")
+        self.internal_page_num = array("i")
+        self.page_label = array("i")
+        self.content: List[str] = []
+        self.highlighted_text: List[Optional[str]] = []
+        self.extend(annotations)
+
+    def append_values(self, page_num: int, content: str, type: str, rect: Sequence[float],
+                      title: Optional[str] = None,
+                      creation_date: Optional[str] = None,
+                      modified_date: Optional[str] = None,
+                      internal_page_num: Optional[str] = None,
+                      highlighted_text: Optional[str] = None,
+                      type_code: Optional[int] = None,
+                      page_label: Optional[str] = None) -> None:
+        add = self.strings.add
+        self.page_num.append(page_num)
+        x0, y0, x1, y1 = rect
+        self.x0.append(x0)
+        self.y0.append(y0)
+        self.x1.append(x1)
+        self.y1.append(y1)
+        self.type_code.append(-1 if type_code is None else type_code)
+        self.type.append(add(type))
+        self.title.append(add(title))
+        self.creation_date.append(add(creation_date))
+        self.modified_date.append(add(modified_date))
+        self.internal_page_num.append(add(internal_page_num))
+        self.page_label.append(add(page_label))
+        self.content.append(content)
+        self.highlighted_text.append(highlighted_text)
+
+    def append(self, annotation: PDFAnnotation) -> None:
+        self.append_values(
+            annotation.page_num, annotation.content, annotation.type, annotation.rect,
+            annotation.title, annotation.creation_date, annotation.modified_date,
+            annotation.internal_page_num, annotation.highlighted_text,
+            annotation.type_code, annotation.page_label
+        )
+
+    def extend(self, annotations: Iterable[PDFAnnotation]) -> None:
+        for annotation in annotations:
+            self.append(annotation)
+
+    def __len__(self) -> int:
+        return len(self.page_num)
+
+    def row(self, index: int) -> PDFAnnotation:
+        get = self.strings.get
+        type_code = self.type_code[index]
+        return PDFAnnotation(
+            self.page_num[index],
+            self.content[index],
+            get(self.type[index]),
+            (self.x0[index], self.y0[index], self.x1[index], self.y1[index]),
+            get(self.title[index]),
+            get(self.creation_date[index]),
+            get(self.modified_date[index]),
+            get(self.internal_page_num[index]),
+            self.highlighted_text[index],
+            None if type_code < 0 else type_code,
+            get(self.page_label[index])
+        )
+
+    def __iter__(self) -> Iterator[PDFAnnotation]:
+        for index in range(len(self)):
+            yield self.row(index)
+
+    def column(self, name: str) -> Sequence[Any]:
+        """
+        The values of one field for all rows, with table strings resolved.
+        """
+        if name in self.TABLE_COLUMNS:
+            get = self.strings.get
+            return [get(index) for index in getattr(self, name)]
+        return getattr(self, name)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"strings": self.strings.values}
+        for name, _typecode in self.NUMERIC_COLUMNS:
+            data[name] = getattr(self, name).tolist()
+        for name in self.TABLE_COLUMNS:
+            data[name] = getattr(self, name).tolist()
+        for name in self.TEXT_COLUMNS:
+            data[name] = getattr(self, name)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AnnotationColumns":
+        columns = cls()
+        columns.strings = StringTable(data["strings"])
+        for name, typecode in cls.NUMERIC_COLUMNS:
+            setattr(columns, name, array(typecode, data[name]))
+        for name in cls.TABLE_COLUMNS:
+            setattr(columns, name, array("i", data[name]))
+        for name in cls.TEXT_COLUMNS:
+            setattr(columns, name, list(data[name]))
+        return columns
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - PDF date strings
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+# D:YYYYMMDDHHmmSSOHH'mm' where everything after the year is optional
+PDF_DATE = re.compile(
+    r"(?:D:)?(\d{4})(\d{2})?(\d{2})?(\d{2})?(\d{2})?(\d{2})?"
+    r"(?:([Zz+-])(?:(\d{2})'?(?:(\d{2})'?)?)?)?"
+)
+
+
+def parse_pdf_date(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parse a PDF date string such as "D:20240131143000+01'00'".
+
+    Returns None for empty or malformed values. Dates without a time zone
+    are returned as naive datetimes.
+    """
+    if not value:
+        return None
+    match = PDF_DATE.match(value.strip())
+    if not match:
+        return None
+    year, month, day, hour, minute, second, sign, tz_hours, tz_minutes = match.groups()
+    try:
+        tzinfo = None
+        if sign in ("Z", "z"):
+            tzinfo = timezone.utc
+        elif sign:
+            delta = timedelta(hours=int(tz_hours or 0), minutes=int(tz_minutes or 0))
+            tzinfo = timezone(-delta if sign == "-" else delta)
+        return datetime(int(year), int(month or 1), int(day or 1),
+                        int(hour or 0), int(minute or 0), int(second or 0), tzinfo=tzinfo)
+    except ValueError:
+        return None
+
+
+def pdf_date_to_iso(value: Optional[str]) -> Optional[str]:
+    parsed = parse_pdf_date(value)
+    return parsed.isoformat() if parsed is not None else None
+
+
+def sortable_timestamp(value: Optional[datetime]) -> Optional[str]:
+    """
+    ISO 8601 timestamp in UTC without offset, so that timestamps compare
+    correctly as strings. Naive datetimes are taken as they are.
+    """
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+
+def parse_iso_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - Output formats
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+"""
+
+import gzip
+import io
+import os
+from contextlib import contextmanager
+from typing import BinaryIO, Iterable, Iterator, List, Optional, TextIO, Union
+
+from .translations import _
+
+# File extension per output format; the writers build on BufferedWriter and
+# are imported when they are needed, see _format().
+OUTPUT_FORMATS = {
+    "markdown": ".md",
+    "jsonl": ".jsonl",
+}
+DEFAULT_FORMAT = "markdown"
+GZIP_SUFFIX = ".gz"
+
+# Buffered output is handed to the file in chunks of about this many characters.
+CHUNK_SIZE = 64 * 1024
+
+# An output path or an open text or binary stream
+Output = Union[str, "os.PathLike[str]", TextIO, BinaryIO]
+
+
+class BufferedWriter:
+    """
+    Base class of the output writers.
+
+    The output is collected in memory and written in chunks of about
+    CHUNK_SIZE characters. Subclasses implement write_header() and
+    write_annotation(); with flush_pages they flush whenever a new page
+    starts. Call flush() after the last annotation.
+    """
+
+    def __init__(self, f: TextIO, flush_pages: bool = False):
+        self.f = f
+        self.flush_pages = flush_pages
+        self.current_page: Optional[int] = None
+        self.count = 0
+        self._buffer: List[str] = []
+        self._buffered = 0
+
+    def _write(self, text: str) -> None:
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= CHUNK_SIZE:
+            self._drain()
+
+    def _drain(self) -> None:
+        if self._buffer:
+            self.f.write("".join(self._buffer))
+            self._buffer.clear()
+            self._buffered = 0
+
+    def flush(self) -> None:
+        self._drain()
+        self.f.flush()
+
+
+def _format(output_format: str):
+    """The writer class and file extension of an output format."""
+    try:
+        extension = OUTPUT_FORMATS[output_format]
+    except KeyError:
+        raise ValueError(_("Unknown output format: {format}").format(format=output_format))
+    if output_format == "jsonl":
+        from .jsonl import JsonLinesWriter as writer_class
+    else:
+        from .markdown import MarkdownWriter as writer_class
+    return writer_class, extension
+
+
+def format_extension(output_format: str, compress: bool = False) -> str:
+    extension = _format(output_format)[1]
+    return extension + GZIP_SUFFIX if compress else extension
+
+
+def open_output(output_path: str) -> TextIO:
+    """
+    Open an output file for writing text, gzip-compressed if the name ends in .gz.
+    """
+    if output_path.endswith(GZIP_SUFFIX):
+        return gzip.open(output_path, 'wt', encoding='utf-8')
+    return open(output_path, 'w', encoding='utf-8')
+
+
+def is_stream(output: Output) -> bool:
+    return hasattr(output, "write")
+
+
+@contextmanager
+def output_stream(output: Output) -> Iterator[TextIO]:
+    """
+    A text stream for an output path or an open stream.
+
+    Paths are opened with open_output() and closed afterwards. Streams are
+    left open; binary streams (e.g. sys.stdout.buffer or a socket file) are
+    written as UTF-8.
+    """
+    if not is_stream(output):
+        with open_output(os.fspath(output)) as f:
+            yield f
+    elif isinstance(output, io.TextIOBase):
+        yield output
+    else:
+        wrapper = io.TextIOWrapper(output, encoding="utf-8")
+        try:
+            yield wrapper
+            wrapper.flush()
+        finally:
+            # Keep the caller's stream open.
+            wrapper.detach()
+
+
+def create_writer(f: TextIO, output_format: str = DEFAULT_FORMAT, flush_pages: bool = False):
+    return _format(output_format)[0](f, flush_pages=flush_pages)
+
+
+def save_annotation_file(output_path: Output, pdf_path: str, page_count: int, page_offset: int,
+                         annotations: Iterable, output_format: str = DEFAULT_FORMAT) -> int:
+    """
+    Write annotations that are already extracted in the given format to a
+    path or stream.
+
+    Returns the number of annotations written.
+    """
+    writer_class = _format(output_format)[0]
+    with output_stream(output_path) as f:
+        writer = writer_class(f)
+        writer.write_header(pdf_path, page_count, page_offset)
+        for annotation in annotations:
+            writer.write_annotation(annotation)
+        writer.flush()
+    return writer.count
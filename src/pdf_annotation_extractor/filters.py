@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - Annotation filters
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+"""
+
+import re
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Tuple, Union
+
+from .dates import parse_iso_date, parse_pdf_date, sortable_timestamp
+from .jsonl import SUBTYPES
+from .translations import _
+
+PageRange = Tuple[int, Optional[int]]
+
+# Characters that make a path a glob pattern, in batch sources and in the
+# document condition of store queries
+GLOB_CHARACTERS = "*?["
+
+
+def type_code_for(value: Union[int, str]) -> int:
+    """
+    Accept a type code or a PDF subtype name such as "Highlight".
+    """
+    if isinstance(value, int) or value.strip().isdigit():
+        return int(value)
+    for code, name in enumerate(SUBTYPES):
+        if name.lower() == value.strip().lower():
+            return code
+    raise ValueError(_("Unknown annotation type: {type}").format(type=value))
+
+
+def parse_page_range(text: Optional[str]) -> Optional[PageRange]:
+    """
+    Parse "200-260", "200-" or "7" into first and last page (1-based,
+    inclusive; None for an open end).
+    """
+    if not text:
+        return None
+    match = re.fullmatch(r"\s*(\d+)\s*(?:(-)\s*(\d+)?)?\s*", text)
+    if not match or int(match.group(1)) < 1:
+        raise ValueError(_("Invalid page range: {pages}").format(pages=text))
+    first = int(match.group(1))
+    if match.group(2) is None:
+        return first, first
+    last = int(match.group(3)) if match.group(3) else None
+    if last is not None and last < first:
+        raise ValueError(_("Invalid page range: {pages}").format(pages=text))
+    return first, last
+
+
+def _timestamp(value: Optional[Union[str, datetime]]) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    parsed = parse_iso_date(value) if isinstance(value, str) else value
+    if parsed is None:
+        raise ValueError(_("Invalid date: {date}").format(date=value))
+    return sortable_timestamp(parsed)
+
+
+class AnnotationFilter:
+    """
+    Which annotations to extract: type codes, a page range, an author
+    regular expression and a window of modification dates.
+
+    Pages are physical page numbers (1-based, as page_num in the exports).
+    author is searched for in the annotation's author (title); since is
+    inclusive and until exclusive, naive dates are taken as UTC, like
+    AnnotationStore.query(). With a date window, annotations without a
+    modification date are left out.
+
+    PDFProcessor applies the page range before any page is loaded and the
+    other conditions before the text under an annotation is looked up.
+    """
+
+    __slots__ = ("type_codes", "pages", "author", "since", "until", "_author_pattern")
+
+    def __init__(self, types: Optional[Iterable[Union[int, str]]] = None,
+                 pages: Optional[PageRange] = None,
+                 author: Optional[str] = None,
+                 since: Optional[Union[str, datetime]] = None,
+                 until: Optional[Union[str, datetime]] = None):
+        self.type_codes: Optional[FrozenSet[int]] = (
+            frozenset(type_code_for(value) for value in types) if types else None
+        )
+        self.pages = pages
+        self.author = author or None
+        try:
+            self._author_pattern = re.compile(author) if author else None
+        except re.error as e:
+            raise ValueError(_("Invalid author pattern: {error}").format(error=str(e)))
+        self.since = _timestamp(since)
+        self.until = _timestamp(until)
+
+    def __bool__(self) -> bool:
+        return any(value is not None for value in
+                   (self.type_codes, self.pages, self.author, self.since, self.until))
+
+    def __reduce__(self):
+        return (AnnotationFilter.from_dict, (self.to_dict(),))
+
+    def page_range(self, page_count: int) -> range:
+        """The zero-based numbers of the pages to extract."""
+        if self.pages is None:
+            return range(page_count)
+        first, last = self.pages
+        stop = page_count if last is None else min(last, page_count)
+        return range(min(first - 1, stop), stop)
+
+    def accepts_any_type(self, type_codes: Optional[Iterable[int]]) -> bool:
+        """
+        Whether annotations with these type codes, e.g. those of one page,
+        may pass. None stands for unknown types and is accepted.
+        """
+        return (self.type_codes is None or type_codes is None
+                or not self.type_codes.isdisjoint(type_codes))
+
+    def accepts(self, type_code: int, author: Optional[str], modified: Optional[str]) -> bool:
+        """
+        Check an annotation by its type code, author and PDF modification
+        date string, which are all available without reading its text.
+        """
+        if self.type_codes is not None and type_code not in self.type_codes:
+            return False
+        if self._author_pattern is not None and not self._author_pattern.search(author or ""):
+            return False
+        if self.since is not None or self.until is not None:
+            timestamp = sortable_timestamp(parse_pdf_date(modified))
+            if timestamp is None:
+                return False
+            if self.since is not None and timestamp < self.since:
+                return False
+            if self.until is not None and timestamp >= self.until:
+                return False
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        """A plain, stable representation, e.g. for cache keys."""
+        return {
+            "types": sorted(self.type_codes) if self.type_codes is not None else None,
+            "pages": list(self.pages) if self.pages is not None else None,
+            "author": self.author,
+            "since": self.since,
+            "until": self.until,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AnnotationFilter":
+        pages = data.get("pages")
+        return cls(data.get("types"), tuple(pages) if pages else None,
+                   data.get("author"), data.get("since"), data.get("until"))
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, AnnotationFilter) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        options = ", ".join(f"{key}={value!r}" for key, value in self.to_dict().items()
+                            if value is not None)
+        return f"AnnotationFilter({options})"
@@ -19,15 +19,24 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 from __future__ import annotations
 
 import os
+import queue
+import threading
+import time
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
 
 from . import translations
-from .pdf_utils import extract_pdf_annotations, PDFProcessingError
+from .pdf_utils import extract_pdf_annotations, ExtractionCancelled
+from .progress import STAGE_MESSAGE, STAGE_PAGES, ProgressEvent, ProgressReporter
 
 translation_manager = translations.translation_manager
 _ = translations._
 
+# Interval in milliseconds at which the window picks up worker progress.
+POLL_INTERVAL = 100
+# Seconds for which a warning stays in the status bar before progress replaces it.
+MESSAGE_DURATION = 3.0
+
 
 def get_messages() -> dict[str, str]:
     return translations.MESSAGES
@@ -46,7 +55,15 @@ class PDFAnnotationExtractor(tk.Tk):
         self.offset_label: ttk.Label | None = None
         self.offset_hint_label: ttk.Label | None = None
 
+        # Background extraction: the worker thread only talks to the window
+        # through this queue, which is polled with after().
+        self.worker: threading.Thread | None = None
+        self.cancel_event = threading.Event()
+        self.worker_queue: queue.Queue = queue.Queue()
+        self.message_until = 0.0
+
         translation_manager.add_observer(self.update_ui_texts)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
 
         self.title(self.get_text('title'))
         self.geometry("600x400")
@@ -73,7 +90,15 @@ class PDFAnnotationExtractor(tk.Tk):
             text=self.get_text('extract_comments'),
             command=self.start_extraction
         )
-        self.start_button.grid(row=4, column=0, columnspan=2, pady=10)
+        self.start_button.grid(row=4, column=0, pady=10, sticky=tk.E, padx=5)
+
+        self.cancel_button = ttk.Button(
+            self.main_frame,
+            text=self.get_text('cancel'),
+            command=self.cancel_extraction,
+            state='disabled'
+        )
+        self.cancel_button.grid(row=4, column=1, pady=10, sticky=tk.W, padx=5)
 
     def get_text(self, key: str) -> str:
         return get_messages()[key]
@@ -198,6 +223,7 @@ class PDFAnnotationExtractor(tk.Tk):
             self.offset_hint_label.configure(text=_("(-1 for automatic detection)"))
 
         self.start_button.configure(text=self.get_text('extract_comments'))
+        self.cancel_button.configure(text=self.get_text('cancel'))
 
         if self.file_menu_index is not None:
             self.menubar.entryconfig(self.file_menu_index, label=self.get_text('file_menu'))
@@ -249,35 +275,97 @@ This program is licensed under GNU GPL v3.""")
             )
             return
 
-        try:
-            self.set_status_message('status_processing')
-            self.start_button.configure(state='disabled')
-            self.update_idletasks()
+        self.set_status_message('status_processing')
+        self.start_button.configure(state='disabled')
+        self.cancel_button.configure(state='normal')
+        self.cancel_event.clear()
+        self.worker = threading.Thread(
+            target=self.run_extraction,
+            args=(pdf_path, self.offset_var.get()),
+            daemon=True
+        )
+        self.worker.start()
+        self.after(POLL_INTERVAL, self.poll_worker)
 
+    def run_extraction(self, pdf_path: str, page_offset: int):
+        # Runs on the worker thread: no Tk calls here, only queue messages.
+        try:
             output_file = extract_pdf_annotations(
                 pdf_path,
-                self.offset_var.get(),
-                self.update_progress
+                page_offset,
+                ProgressReporter(lambda event: self.worker_queue.put(('progress', event))),
+                cancel_event=self.cancel_event
             )
+            self.worker_queue.put(('done', output_file))
+        except ExtractionCancelled:
+            self.worker_queue.put(('cancelled', None))
+        except Exception as e:
+            # Any failure has to reach the window, or it would wait forever.
+            self.worker_queue.put(('error', str(e)))
+
+    def poll_worker(self):
+        # Only the latest progress event and warning are shown; finishing
+        # messages end polling.
+        progress = None
+        message = None
+        while True:
+            try:
+                kind, value = self.worker_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                if value.stage == STAGE_MESSAGE:
+                    message = value
+                else:
+                    progress = value
+                continue
+            self.finish_extraction(kind, value)
+            return
+
+        if message is not None:
+            self.update_progress(message)
+            self.message_until = time.monotonic() + MESSAGE_DURATION
+        elif progress is not None and time.monotonic() >= self.message_until:
+            self.update_progress(progress)
+        self.after(POLL_INTERVAL, self.poll_worker)
 
-            self.set_status_message('status_done', output_file)
+    def finish_extraction(self, kind: str, value: str | None):
+        self.worker = None
+        self.start_button.configure(state='normal')
+        self.cancel_button.configure(state='disabled')
+
+        if kind == 'done':
+            self.set_status_message('status_done', value)
             messagebox.showinfo(
                 self.get_text('success'),
                 _("Annotations were successfully extracted.\n\n"
-                  "Output file: {0}").format(output_file)
+                  "Output file: {0}").format(value)
             )
-
-        except PDFProcessingError as e:
-            error_message = str(e)
+        elif kind == 'cancelled':
+            self.set_status_message('status_cancelled')
+        else:
             messagebox.showerror(
                 _("Error"),
-                self.get_text('error').format(error_message)
+                self.get_text('error').format(value)
             )
-            self.set_status_message('status_error', error_message)
-        finally:
-            self.start_button.configure(state='normal')
-
-    def update_progress(self, message: str):
+            self.set_status_message('status_error', value)
+
+    def cancel_extraction(self):
+        if self.worker is not None:
+            self.cancel_event.set()
+            self.cancel_button.configure(state='disabled')
+
+    def on_close(self):
+        # Stop the page loop and wait for the worker, which removes the
+        # partly written output file; it never calls Tk, so this cannot block.
+        self.cancel_event.set()
+        if self.worker is not None:
+            self.worker.join()
+        self.destroy()
+
+    def update_progress(self, event: ProgressEvent):
+        message = event.format()
+        if event.stage == STAGE_PAGES and event.eta is not None:
+            message += _(" (about {seconds} s left)").format(seconds=round(event.eta))
         self.clear_status_tracking()
         self.status_var.set(message)
-        self.update_idletasks()
\ No newline at end of file
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - Incremental re-extraction
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .cache import DIGEST_CHUNK_SIZE
+from .export import DEFAULT_FORMAT, save_annotation_file
+from .filters import AnnotationFilter
+from .pdf_utils import PDFAnnotation, PDFProcessor, default_output_path, page_annot_xrefs
+from .translations import translation_manager
+
+STATE_FORMAT_VERSION = 3
+STATE_SUFFIX = ".state.json"
+
+OBJECT_HEADER = re.compile(rb"(\d+)\s+\d+\s+obj\b")
+OBJECT_STREAM = re.compile(rb"/Type\s*/ObjStm\b")
+
+
+def state_path_for(output_path: str) -> str:
+    return os.path.splitext(output_path)[0] + STATE_SUFFIX
+
+
+def page_fingerprint(doc, page_num: int) -> Tuple[str, List[int]]:
+    """
+    Fingerprint a page from its annotation xrefs and their /M, /Rect and
+    /Contents entries; the comment text is included because not every
+    editor updates /M when only the text changes.
+
+    Returns the fingerprint and the xrefs whose modification affects it: the
+    annotations and, if the page refers to it indirectly, the /Annots array.
+    """
+    xrefs = page_annot_xrefs(doc, page_num)
+    digest = hashlib.sha1()
+    for xref in xrefs:
+        modified = doc.xref_get_key(xref, "M")[1]
+        rect = doc.xref_get_key(xref, "Rect")[1]
+        contents = doc.xref_get_key(xref, "Contents")[1]
+        digest.update(f"{xref}|{modified}|{rect}|{contents};".encode("utf-8", "replace"))
+
+    watched = list(xrefs)
+    kind, value = doc.xref_get_key(doc.page_xref(page_num), "Annots")
+    if kind == "xref":
+        watched.append(int(value.split()[0]))
+    return digest.hexdigest(), watched
+
+
+def _load_state(state_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("version") != STATE_FORMAT_VERSION:
+        return None
+    return state
+
+
+def _save_state(state_path: str, state: Dict[str, Any]) -> None:
+    directory = os.path.dirname(os.path.abspath(state_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, state_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _digest_file(pdf_path: str, prefix_size: int) -> Tuple[str, Optional[str]]:
+    """
+    Hash the whole file and, in the same pass, its first prefix_size bytes.
+    """
+    digest = hashlib.sha256()
+    prefix_digest = None
+    remaining = prefix_size
+    with open(pdf_path, "rb") as f:
+        while True:
+            chunk = f.read(DIGEST_CHUNK_SIZE if remaining <= 0 else min(DIGEST_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining > 0:
+                remaining -= len(chunk)
+                if remaining == 0:
+                    prefix_digest = digest.copy().hexdigest()
+    return digest.hexdigest(), prefix_digest
+
+
+def _appended_objects(pdf_path: str, offset: int) -> Optional[Set[int]]:
+    """
+    Object numbers (re)defined in an incremental update appended after offset.
+
+    Returns None when the update stores objects in object streams, whose
+    contents can't be identified without decompressing them.
+    """
+    with open(pdf_path, "rb") as f:
+        f.seek(offset)
+        tail = f.read()
+    if OBJECT_STREAM.search(tail):
+        return None
+    return {int(number) for number in OBJECT_HEADER.findall(tail)}
+
+
+def _candidate_pages(doc, state: Dict[str, Any], changed: Set[int]) -> Optional[Set[int]]:
+    # A modified page tree may have moved pages around: check everything.
+    for xref in changed:
+        if xref < doc.xref_length() and doc.xref_get_key(xref, "Type")[1] == "/Pages":
+            return None
+
+    candidates = set()
+    for page_key, page_state in state["pages"].items():
+        if changed.intersection(page_state["xrefs"]):
+            candidates.add(int(page_key))
+    for page_num, page_xref in enumerate(state["page_xrefs"]):
+        if page_xref in changed:
+            candidates.add(page_num)
+    return candidates
+
+
+def extract_incremental(pdf_path: str,
+                        output_path: Optional[str] = None,
+                        page_offset: int = -1,
+                        progress_callback: Optional[Callable[[str], None]] = None,
+                        state_path: Optional[str] = None,
+                        output_format: str = DEFAULT_FORMAT,
+                        annotation_filter: Optional[AnnotationFilter] = None
+                        ) -> Tuple[str, int, List[int]]:
+    """
+    Write the export, re-extracting only pages whose annotations changed.
+
+    Per-page fingerprints and annotations are kept in a state file next to the
+    output. On the next run only pages with a different fingerprint are
+    extracted again and spliced into the previous result. When the PDF was
+    saved with an incremental update, only the objects appended since the
+    last run are looked at to find the affected pages. Changing the
+    annotation_filter discards the state.
+
+    Returns the output path, the number of annotations and the zero-based
+    numbers of the pages that were extracted.
+    """
+    if not output_path:
+        output_path = default_output_path(pdf_path, output_format)
+    if not state_path:
+        state_path = state_path_for(output_path)
+
+    language = translation_manager.get_current_language()
+    filter_options = annotation_filter.to_dict() if annotation_filter else None
+    state = _load_state(state_path)
+    if state is not None and (state["language"] != language
+                              or state["requested_offset"] != page_offset
+                              or state.get("filter") != filter_options):
+        state = None
+
+    file_size = os.path.getsize(pdf_path)
+    previous_size = state["file_size"] if state is not None and state["file_size"] <= file_size else 0
+    digest, prefix_digest = _digest_file(pdf_path, previous_size)
+
+    with PDFProcessor(pdf_path, annotation_filter=annotation_filter) as processor:
+        doc = processor.doc
+        page_count = doc.page_count
+        if state is not None and state["page_count"] != page_count:
+            state = None
+
+        appended: Optional[Set[int]] = None
+        if state is not None and previous_size and prefix_digest == state["digest"]:
+            # The previous file is a prefix of this one: it is unchanged or was
+            # saved with an incremental update.
+            appended = _appended_objects(pdf_path, previous_size) if file_size > previous_size else set()
+
+        candidates = None
+        if state is not None and appended is not None:
+            processor.page_offset = state["page_offset"]
+            candidates = _candidate_pages(doc, state, appended)
+
+        if candidates is not None:
+            # The page tree is untouched, so the page objects are still the same.
+            page_xrefs = state["page_xrefs"]
+        else:
+            page_xrefs = [doc.page_xref(page_num) for page_num in range(page_count)]
+
+        if state is None or appended is None:
+            processor.resolve_page_offset(page_offset, progress_callback)
+            if state is not None and state["page_offset"] != processor.page_offset:
+                state = None
+
+        old_pages: Dict[str, Any] = state["pages"] if state is not None else {}
+        new_pages: Dict[str, Any] = {}
+        changed_pages: List[int] = []
+        check = range(page_count) if candidates is None else sorted(candidates)
+        checked = set(check)
+
+        for page_num in check:
+            fingerprint, xrefs = page_fingerprint(doc, page_num)
+            if not xrefs:
+                continue
+            page_key = str(page_num)
+            previous = old_pages.get(page_key)
+            if previous is not None and previous["fingerprint"] == fingerprint:
+                new_pages[page_key] = previous
+            else:
+                new_pages[page_key] = {"fingerprint": fingerprint, "xrefs": xrefs}
+                changed_pages.append(page_num)
+
+        for page_key, page_state in old_pages.items():
+            if int(page_key) not in checked:
+                new_pages[page_key] = page_state
+
+        extracted: Dict[int, List[Dict[str, Any]]] = {page_num: [] for page_num in changed_pages}
+        for annotation in processor.iter_annotations(processor.page_offset, progress_callback,
+                                                     pages=changed_pages):
+            extracted[annotation.page_num - 1].append(annotation.to_dict())
+        for page_num, annotations in extracted.items():
+            new_pages[str(page_num)]["annotations"] = annotations
+
+        page_keys = sorted(new_pages, key=int)
+        count = save_annotation_file(
+            output_path, pdf_path, page_count, processor.page_offset,
+            (PDFAnnotation.from_dict(data)
+             for page_key in page_keys
+             for data in new_pages[page_key]["annotations"]),
+            output_format
+        )
+
+        _save_state(state_path, {
+            "version": STATE_FORMAT_VERSION,
+            "language": language,
+            "requested_offset": page_offset,
+            "filter": filter_options,
+            "page_offset": processor.page_offset,
+            "page_count": page_count,
+            "page_xrefs": page_xrefs,
+            "file_size": file_size,
+            "digest": digest,
+            "pages": {page_key: new_pages[page_key] for page_key in page_keys},
+        })
+
+    return output_path, count, changed_pages
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - JSON Lines export
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+"""
+
+import json
+from typing import Any, Dict, Optional, TextIO
+
+from .dates import pdf_date_to_iso
+from .export import BufferedWriter
+
+# PDF /Subtype names by PyMuPDF annotation type code
+SUBTYPES = (
+    "Text", "Link", "FreeText", "Line", "Square", "Circle", "Polygon", "PolyLine",
+    "Highlight", "Underline", "Squiggly", "StrikeOut", "Redact", "Stamp", "Caret",
+    "Ink", "Popup", "FileAttachment", "Sound", "Movie", "RichMedia", "Widget",
+    "Screen", "PrinterMark", "TrapNet", "Watermark", "3D", "Projection",
+)
+
+
+def subtype_name(type_code: Optional[int]) -> Optional[str]:
+    if type_code is None or not 0 <= type_code < len(SUBTYPES):
+        return None
+    return SUBTYPES[type_code]
+
+
+def annotation_record(annotation, document: Optional[str] = None) -> Dict[str, Any]:
+    """
+    The JSON Lines record for one annotation.
+
+    Only language independent values are included: the subtype instead of
+    the localized type name, the printed page number instead of the page
+    heading and the dates in ISO 8601.
+    """
+    return {
+        "document": document,
+        "page_num": annotation.page_num,
+        "page_label": annotation.page_label,
+        "type_code": annotation.type_code,
+        "subtype": subtype_name(annotation.type_code),
+        "rect": list(annotation.rect),
+        "author": annotation.title,
+        "created": pdf_date_to_iso(annotation.creation_date),
+        "modified": pdf_date_to_iso(annotation.modified_date),
+        "content": annotation.content,
+        "highlighted_text": annotation.highlighted_text,
+    }
+
+
+class JsonLinesWriter(BufferedWriter):
+    """
+    Writes one JSON object per annotation and line.
+
+    The writer has the same interface as MarkdownWriter. There is no header
+    line; every record names its document, so the outputs of a batch run can
+    simply be concatenated.
+    """
+
+    def __init__(self, f: TextIO, flush_pages: bool = False):
+        super().__init__(f, flush_pages)
+        self.document: Optional[str] = None
+        self._encode = json.JSONEncoder(ensure_ascii=False).encode
+
+    def write_header(self, pdf_path: str, page_count: int, page_offset: int) -> None:
+        self.document = str(pdf_path)
+
+    def write_annotation(self, annotation) -> None:
+        if self.current_page != annotation.page_num:
+            if self.flush_pages:
+                self.flush()
+            self.current_page = annotation.page_num
+        self._write(self._encode(annotation_record(annotation, self.document)) + "\n")
+        self.count += 1
+
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - Markdown export
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+"""
+
+from datetime import datetime
+from typing import List, TextIO
+
+from .export import BufferedWriter
+from .translations import _
+
+# Stands in for the value while a localized template is pre-formatted.
+_VALUE_MARKER = "\x00"
+
+
+def _field_template(template: str, label: str) -> List[str]:
+    """
+    Pre-format a localized "**{label}:** {value}" template for one label.
+
+    Returns the parts around the value; joining them with a value gives the
+    same string as template.format(label=label, value=value).
+    """
+    return template.format(label=label, value=_VALUE_MARKER).split(_VALUE_MARKER)
+
+
+class MarkdownWriter(BufferedWriter):
+    """
+    Writes the Markdown export one annotation at a time.
+
+    All localized labels are resolved once when the writer is created and the
+    output is collected in memory and written in large chunks. Annotations
+    must arrive ordered by page. With flush_pages the buffer is written and
+    the stream flushed whenever a new page section starts. Call flush() after
+    the last annotation.
+    """
+
+    def __init__(self, f: TextIO, flush_pages: bool = False):
+        super().__init__(f, flush_pages)
+
+        line = _("**{label}:** {value}\n")
+        paragraph = _("**{label}:** {value}\n\n")
+        self._title = f"# {_('PDF Annotations Export')}\n\n"
+        self._file = _field_template(line, _("File"))
+        self._export_date = _field_template(line, _("Date"))
+        self._total_pages = _field_template(line, _("Total Pages"))
+        self._numbering_start = _field_template(line, _("Page Numbering Starts At"))
+        self._highlighted_text = _field_template(paragraph, _("Highlighted Text"))
+        self._comment = _field_template(paragraph, _("Comment"))
+        self._author = _field_template(line, _("Author"))
+        self._date = _field_template(line, _("Date"))
+
+    def write_header(self, pdf_path: str, page_count: int, page_offset: int) -> None:
+        write = self._write
+        write(self._title)
+        write(str(pdf_path).join(self._file))
+        write(datetime.now().strftime('%Y-%m-%d %H:%M:%S').join(self._export_date))
+        write(str(page_count).join(self._total_pages))
+        write(str(1 + page_offset).join(self._numbering_start))
+        write("\n---\n\n")
+
+    def write_annotation(self, annotation) -> None:
+        write = self._write
+        if self.current_page != annotation.internal_page_num:
+            if self.flush_pages:
+                self.flush()
+            self.current_page = annotation.internal_page_num
+            write(f"\n## {self.current_page}\n\n")
+
+        write(f"### {annotation.type}\n\n")
+
+        if annotation.highlighted_text:
+            write(annotation.highlighted_text.join(self._highlighted_text))
+
+        if annotation.content:
+            write(annotation.content.join(self._comment))
+
+        if annotation.title:
+            write(annotation.title.join(self._author))
+
+        if annotation.modified_date:
+            write(annotation.modified_date.join(self._date))
+
+        write("\n---\n\n")
+        self.count += 1
+
@@ -9,12 +9,59 @@ the Free Software Foundation, either version 3 of the License, or
 (at your option) any later version.
 """
 
+import multiprocessing
 import os
+import sys
+import time
 import fitz
-from typing import Callable, Optional, List
-from datetime import datetime
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Iterable, Iterator, Optional, List, Set, Tuple
 import re
-from .translations import _
+from .export import (DEFAULT_FORMAT, Output, create_writer, format_extension, is_stream,
+                     output_stream, save_annotation_file)
+from .filters import AnnotationFilter
+from .jsonl import SUBTYPES
+from .progress import STAGE_OFFSET, STAGE_PAGES, ProgressReporter, as_reporter
+from .sources import PDFSource, document_source
+from .stats import ExtractionStats
+from .text_index import PageWordIndex, annotation_rects
+from .translations import _, translation_manager
+
+if TYPE_CHECKING:
+    import threading
+
+    from .cache import ExtractionCache
+
+# Shards per worker; more shards than workers keeps progress reports flowing
+# and evens out pages with many annotations.
+SHARDS_PER_WORKER = 4
+# Seconds between checks of the cancel event while waiting for a shard
+CANCEL_POLL_INTERVAL = 0.1
+
+XREF_REFERENCE = re.compile(r"(\d+)\s+\d+\s+R")
+SUBTYPE_CODES = {"/" + name: code for code, name in enumerate(SUBTYPES)}
+
+# Page offset detection: pages sampled for header/footer numbers, the share of
+# the page height scanned at the top and bottom, and the number of documents
+# whose detected offset is remembered per process.
+OFFSET_SAMPLE_PAGES = 12
+MARGIN_FRACTION = 0.1
+OFFSET_CACHE_SIZE = 256
+
+# Memory budget: pages between two RSS checks, the share of the budget the
+# MuPDF store may use, the growth since the last reopen (as a share of the
+# budget) that triggers the next one, and pages between two reopens where
+# RSS is unknown.
+MEMORY_CHECK_PAGES = 32
+STORE_BUDGET_FRACTION = 0.25
+REOPEN_GROWTH_FRACTION = 0.1
+REOPEN_PAGES = 1000
+
+_detected_offsets: Dict[Tuple[str, int, int], int] = {}
+_malloc_trim: Optional[Callable[[int], int]] = None
+_annotation_type_names: Dict[str, Dict[int, str]] = {}
 
 
 class PDFProcessingError(Exception):
@@ -22,99 +69,415 @@ class PDFProcessingError(Exception):
     pass
 
 
+class ExtractionCancelled(PDFProcessingError):
+    """Raised when an extraction is stopped through its cancel event"""
+    pass
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
 class PDFAnnotation:
+    """
+    Immutable annotation record.
+
+    type and internal_page_num are the localized type name and page heading
+    used in the Markdown export; type_code is the PDF annotation type number
+    and page_label the printed page number, if the page has one.
+
+    The rect is kept as four floats and the strings that repeat across
+    annotations (type, author, page heading) are interned, so large numbers
+    of annotations stay small. Use AnnotationColumns to aggregate many of them.
+    """
+
+    __slots__ = ("page_num", "content", "type", "x0", "y0", "x1", "y1", "title",
+                 "creation_date", "modified_date", "internal_page_num", "highlighted_text",
+                 "type_code", "page_label")
+
     def __init__(self, page_num: int, content: str, type: str, rect: tuple,
                  title: Optional[str] = None,
                  creation_date: Optional[str] = None,
                  modified_date: Optional[str] = None,
                  internal_page_num: Optional[str] = None,
-                 highlighted_text: Optional[str] = None):
-        self.page_num = page_num
-        self.content = content
-        self.type = type
-        self.rect = rect
-        self.title = title
-        self.creation_date = creation_date
-        self.modified_date = modified_date
-        self.internal_page_num = internal_page_num
-        self.highlighted_text = highlighted_text
+                 highlighted_text: Optional[str] = None,
+                 type_code: Optional[int] = None,
+                 page_label: Optional[str] = None):
+        x0, y0, x1, y1 = rect
+        setattr_ = object.__setattr__
+        setattr_(self, "page_num", page_num)
+        setattr_(self, "content", content)
+        setattr_(self, "type", _intern(type))
+        setattr_(self, "x0", float(x0))
+        setattr_(self, "y0", float(y0))
+        setattr_(self, "x1", float(x1))
+        setattr_(self, "y1", float(y1))
+        setattr_(self, "title", _intern(title))
+        setattr_(self, "creation_date", creation_date)
+        setattr_(self, "modified_date", modified_date)
+        setattr_(self, "internal_page_num", _intern(internal_page_num))
+        setattr_(self, "highlighted_text", highlighted_text)
+        setattr_(self, "type_code", type_code)
+        setattr_(self, "page_label", _intern(page_label))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    @property
+    def rect(self) -> Tuple[float, float, float, float]:
+        return self.x0, self.y0, self.x1, self.y1
+
+    def _values(self) -> tuple:
+        return (self.page_num, self.content, self.type, self.rect, self.title,
+                self.creation_date, self.modified_date, self.internal_page_num,
+                self.highlighted_text, self.type_code, self.page_label)
+
+    def __reduce__(self):
+        return type(self), self._values()
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PDFAnnotation):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __hash__(self) -> int:
+        return hash(self._values())
+
+    def __repr__(self) -> str:
+        return f"PDFAnnotation(page_num={self.page_num!r}, type={self.type!r}, content={self.content!r})"
 
     def __str__(self) -> str:
         return f"[{self.type}] {self.content}"
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "page_num": self.page_num,
+            "content": self.content,
+            "type": self.type,
+            "rect": list(self.rect),
+            "title": self.title,
+            "creation_date": self.creation_date,
+            "modified_date": self.modified_date,
+            "internal_page_num": self.internal_page_num,
+            "highlighted_text": self.highlighted_text,
+            "type_code": self.type_code,
+            "page_label": self.page_label,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PDFAnnotation":
+        return cls(
+            data["page_num"],
+            data["content"],
+            data["type"],
+            tuple(data["rect"]),
+            data.get("title"),
+            data.get("creation_date"),
+            data.get("modified_date"),
+            data.get("internal_page_num"),
+            data.get("highlighted_text"),
+            data.get("type_code"),
+            data.get("page_label")
+        )
+
+
+def annotation_type_names() -> Dict[int, str]:
+    """
+    Localized annotation type names for the current language.
+
+    The names are translated once per language instead of at import time, so
+    they follow language changes and cost nothing until they are needed.
+    """
+    language = translation_manager.get_current_language()
+    names = _annotation_type_names.get(language)
+    if names is None:
+        names = {
+            0: _("Highlight"),
+            1: _("Underline"),
+            2: _("StrikeOut"),
+            3: _("Squiggly"),
+            4: _("Rectangle/Square"),
+            5: _("Circle/Ellipse"),
+            6: _("Line"),
+            7: _("Polyline"),
+            8: _("Text/Sticky Note/Highlight"),
+            9: _("Strike Out"),
+            10: _("Stamp"),
+            11: _("Caret"),
+            12: _("Ink"),
+            13: _("Popup"),
+            14: _("FileAttachment"),
+            15: _("Sound"),
+            16: _("Movie"),
+            17: _("Widget"),
+            18: _("Screen"),
+            19: _("PrinterMark"),
+            20: _("TrapNet"),
+            21: _("Watermark"),
+            22: _("3D"),
+            23: _("Redact")
+        }
+        _annotation_type_names[language] = names
+    return names
+
+
+class _AnnotationTypeNames:
+    """Class attribute that returns annotation_type_names() when read"""
+
+    def __get__(self, instance: Any, owner: type) -> Dict[int, str]:
+        return annotation_type_names()
+
+
+def current_rss() -> Optional[int]:
+    """
+    Resident set size of this process in bytes, None where it can't be read cheaply.
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def release_heap() -> None:
+    """
+    Return freed heap memory to the operating system where the C library
+    supports it (glibc's malloc_trim); elsewhere it stays reusable.
+    """
+    global _malloc_trim
+    if _malloc_trim is None:
+        _malloc_trim = lambda pad: 0
+        if sys.platform.startswith("linux"):
+            import ctypes
+            import ctypes.util
+
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6")
+                _malloc_trim = libc.malloc_trim
+            except (OSError, AttributeError):
+                pass
+    _malloc_trim(0)
+
 
 class PDFProcessor:
-    ANNOTATION_TYPES = {
-        0: _("Highlight"),
-        1: _("Underline"),
-        2: _("StrikeOut"),
-        3: _("Squiggly"),
-        4: _("Rectangle/Square"),
-        5: _("Circle/Ellipse"),
-        6: _("Line"),
-        7: _("Polyline"),
-        8: _("Text/Sticky Note/Highlight"),
-        9: _("Strike Out"),
-        10: _("Stamp"),
-        11: _("Caret"),
-        12: _("Ink"),
-        13: _("Popup"),
-        14: _("FileAttachment"),
-        15: _("Sound"),
-        16: _("Movie"),
-        17: _("Widget"),
-        18: _("Screen"),
-        19: _("PrinterMark"),
-        20: _("TrapNet"),
-        21: _("Watermark"),
-        22: _("3D"),
-        23: _("Redact")
-    }
-
-    def __init__(self, pdf_path: str):
-        if not os.path.exists(pdf_path):
+    # Kept for callers of the former class attribute; follows the current
+    # language like annotation_type_names().
+    ANNOTATION_TYPES = _AnnotationTypeNames()
+
+    def __init__(self, pdf_path: PDFSource, cancel_event: Optional["threading.Event"] = None,
+                 memory_budget: Optional[int] = None, name: Optional[str] = None,
+                 annotation_filter: Optional[AnnotationFilter] = None):
+        # pdf_path may also be PDF bytes, a buffer or a binary file object
+        # (see sources.document_source); name replaces the file name shown
+        # in the export.
+        try:
+            self.source = document_source(pdf_path, name)
+        except TypeError as e:
+            raise PDFProcessingError(str(e))
+        if self.source.is_file and not os.path.exists(self.source.path):
             raise PDFProcessingError(
-                _("The PDF file does not exist: {path}").format(path=pdf_path)
+                _("The PDF file does not exist: {path}").format(path=self.source.path)
             )
-        self.pdf_path = pdf_path
+        self.pdf_path = self.source.name
         self.doc = None
         self.page_offset = 0
         self.annotations: List[PDFAnnotation] = []
+        self.annotation_count = 0
+        self._word_index: Optional[PageWordIndex] = None
+        self._word_index_page: Optional[int] = None
+        self._detected_offset: Optional[int] = None
+        self._annotated_pages: Optional[List[int]] = None
+        self._page_labels: Dict[int, str] = {}
+        self._page_labels_offset: Optional[int] = None
+        # Checked before every page; once it is set the extraction stops
+        # with ExtractionCancelled.
+        self.cancel_event = cancel_event
+        # Stage timers and counters, see stats.ExtractionStats
+        self.stats = ExtractionStats()
+        # Memory budget in bytes. MuPDF keeps every object it has parsed
+        # until the document is closed, so with a budget the store is kept
+        # small, per-page data is dropped after each page and the document is
+        # reopened whenever the process grows beyond the budget.
+        self.memory_budget = memory_budget
+        self._pages_since_open = 0
+        self._rss_after_reopen = 0
+        # Only annotations that pass the filter are extracted; pages outside
+        # its range are never loaded and rejected annotations cost no text
+        # lookup.
+        self.annotation_filter = annotation_filter or None
 
     def __enter__(self):
         try:
-            self.doc = fitz.open(self.pdf_path)
+            with self.stats.timer("open"):
+                self.doc = self.source.open()
             return self
         except Exception as e:
             raise PDFProcessingError(
                 _("Could not open PDF file: {error}").format(error=str(e))
             )
 
+    def reopen(self) -> None:
+        """
+        Close and reopen the document, freeing all objects MuPDF has parsed so far.
+        """
+        self._word_index = None
+        self._word_index_page = None
+        self.doc.close()
+        fitz.TOOLS.store_shrink(100)
+        fitz.TOOLS.glyph_cache_empty()
+        release_heap()
+        with self.stats.timer("open"):
+            self.doc = self.source.open()
+        self._pages_since_open = 0
+        self._rss_after_reopen = current_rss() or 0
+        self.stats.count("document_reopens")
+
+    def _check_memory(self) -> None:
+        # Called before a page is loaded when there is a memory budget.
+        if fitz.TOOLS.store_size > self.memory_budget * STORE_BUDGET_FRACTION:
+            fitz.TOOLS.store_shrink(50)
+        self._pages_since_open += 1
+        if self._pages_since_open % MEMORY_CHECK_PAGES:
+            return
+        rss = current_rss()
+        if rss is None:
+            if self._pages_since_open >= REOPEN_PAGES:
+                self.reopen()
+        elif rss > max(self.memory_budget,
+                       self._rss_after_reopen + self.memory_budget * REOPEN_GROWTH_FRACTION):
+            # Memory freed by a reopen that the heap keeps is reused first, so
+            # only growth beyond that calls for another one.
+            self.reopen()
+
     def __exit__(self, exc_type, exc_val, exc_tb):
+        self._word_index = None
+        self._word_index_page = None
         if self.doc:
             self.doc.close()
 
+    def _offset_from_page_labels(self) -> Optional[int]:
+        # The decimal /PageLabels range that covers most pages is the main matter.
+        try:
+            rules = sorted(self.doc.get_page_labels(), key=lambda rule: rule["startpage"])
+        except Exception:
+            return None
+
+        best = None
+        best_length = 0
+        for index, rule in enumerate(rules):
+            if rule.get("style") != "D" or rule.get("prefix"):
+                continue
+            end = rules[index + 1]["startpage"] if index + 1 < len(rules) else self.doc.page_count
+            if end - rule["startpage"] > best_length:
+                best = rule
+                best_length = end - rule["startpage"]
+
+        if best is None:
+            return None
+        return best.get("firstpagenum", 1) - (best["startpage"] + 1)
+
+    def _offset_from_margins(self) -> Optional[int]:
+        # Page numbers sit in the header or footer. Every number found there
+        # votes for an offset; numbers in running heads (years, chapter
+        # numbers) don't agree across pages, real page numbers do.
+        page_count = self.doc.page_count
+        step = max(1, page_count // OFFSET_SAMPLE_PAGES)
+        sample = range(0, min(page_count, step * OFFSET_SAMPLE_PAGES), step)
+
+        votes: Dict[int, int] = {}
+        for page_num in sample:
+            page = self.doc[page_num]
+            rect = page.rect
+            height = rect.height * MARGIN_FRACTION
+            strips = (
+                fitz.Rect(rect.x0, rect.y0, rect.x1, rect.y0 + height),
+                fitz.Rect(rect.x0, rect.y1 - height, rect.x1, rect.y1),
+            )
+            offsets = set()
+            for strip in strips:
+                for word in page.get_text("words", clip=strip):
+                    if word[4].isdecimal():
+                        offsets.add(int(word[4]) - (page_num + 1))
+            for offset in offsets:
+                votes[offset] = votes.get(offset, 0) + 1
+
+        if not votes:
+            return None
+        offset, count = max(votes.items(), key=lambda item: (item[1], -abs(item[0])))
+        if count < min(2, len(sample)):
+            return None
+        return offset
+
+    def _document_key(self) -> Optional[Tuple[str, int, int]]:
+        if not self.source.is_file:
+            return None
+        try:
+            stat = os.stat(self.source.path)
+        except (OSError, TypeError):
+            return None
+        return os.path.abspath(self.source.path), stat.st_size, stat.st_mtime_ns
+
     def detect_page_offset(self) -> int:
+        """
+        Detect the offset between absolute and printed page numbers.
+
+        The /PageLabels of the document are used if present, otherwise the
+        numbers in the header and footer strips of a sample of pages. The
+        result is cached per document; -1 is returned if nothing was found.
+        """
         if not self.doc:
             raise PDFProcessingError(_("No PDF document loaded"))
 
-        for page_num in range(min(10, self.doc.page_count)):
-            page = self.doc[page_num]
-            text = page.get_text()
-
-            numbers = re.findall(r'\b\d+\b', text)
-            for number in numbers:
-                try:
-                    doc_page_num = int(number)
-                    if doc_page_num > 0 and abs(doc_page_num - (page_num + 1)) <= 2:
-                        return doc_page_num - (page_num + 1)
-                except ValueError:
-                    continue
-
-        return -1
+        if self._detected_offset is not None:
+            return self._detected_offset
+
+        with self.stats.timer("offset"):
+            key = self._document_key()
+            offset = _detected_offsets.get(key) if key else None
+            if offset is None:
+                offset = self._offset_from_page_labels()
+                if offset is None:
+                    offset = self._offset_from_margins()
+                if offset is None:
+                    offset = -1
+                if key:
+                    if len(_detected_offsets) >= OFFSET_CACHE_SIZE:
+                        _detected_offsets.clear()
+                    _detected_offsets[key] = offset
+
+        self._detected_offset = offset
+        return offset
 
     def get_page_numbers(self, page) -> str:
-        absolute_number = page.number + 1
+        # Labels are built once per page and offset, not on every call.
+        if self._page_labels_offset != self.page_offset:
+            self._page_labels = {}
+            self._page_labels_offset = self.page_offset
+
+        label = self._page_labels.get(page.number)
+        if label is None:
+            label = self._format_page_label(page.number)
+            self._page_labels[page.number] = label
+        return label
+
+    def page_label_table(self) -> List[str]:
+        """
+        The page headings used in the export for every page of the document.
+        """
+        return [self.get_page_numbers(page) for page in self.doc]
+
+    def internal_page_number(self, page_num: int) -> Optional[int]:
+        """
+        The printed number of a zero-based page, None for the front matter.
+        """
+        internal_number = page_num + 1 + self.page_offset
+        return internal_number if internal_number > 0 else None
+
+    def _format_page_label(self, page_num: int) -> str:
+        absolute_number = page_num + 1
         internal_number = absolute_number + self.page_offset
 
         if internal_number <= 0:
@@ -129,172 +492,529 @@ class PDFProcessor:
                 internal=internal_number
             )
 
+    def check_cancelled(self) -> None:
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ExtractionCancelled(_("The extraction was cancelled"))
+
+    def word_index(self, page) -> PageWordIndex:
+        # The words of a page are extracted once and shared by all of its annotations.
+        if self._word_index_page != page.number:
+            self._word_index = PageWordIndex.from_page(page)
+            self._word_index_page = page.number
+        return self._word_index
+
     def extract_text_from_annotation(self, page, annot, page_num) -> str:
+        start = time.perf_counter()
         try:
-            text = page.get_textbox(annot.rect)
+            text = self.word_index(page).text_in(annotation_rects(annot))
             if text.strip():
                 return text.strip()
         except (AttributeError, ValueError) as e:
             message = _("Could not extract text for annotation on page {page}: {error}")
             print(message.format(page=page_num + 1, error=str(e)))
+        finally:
+            self.stats.add_time("text_lookup", time.perf_counter() - start)
+            self.stats.count("text_lookups")
         return ""
 
-    def extract_annotations(self,
-                            page_offset: int = -1,
-                            progress_callback: Optional[Callable[[str], None]] = None) -> List[PDFAnnotation]:
+    def _load_page(self, page_num: int):
+        if self.memory_budget is not None:
+            self._word_index = None
+            self._word_index_page = None
+            self._check_memory()
+        start = time.perf_counter()
+        page = self.doc[page_num]
+        self.stats.add_time("load_page", time.perf_counter() - start)
+        self.stats.count("pages_loaded")
+        return page
+
+    def _extract_page_annotations(self, page,
+                                  progress_callback: Optional[Callable[[str], None]] = None
+                                  ) -> List[PDFAnnotation]:
+        stats = self.stats
+        start = time.perf_counter()
+        lookup_seconds = stats.seconds["text_lookup"]
+        page_num = page.number
+        internal_page = self.get_page_numbers(page)
+        internal_number = self.internal_page_number(page_num)
+        page_label = str(internal_number) if internal_number is not None else None
+        annotations: List[PDFAnnotation] = []
+        type_names = annotation_type_names()
+        unknown_type = _("Unknown Type")
+        annotation_filter = self.annotation_filter
+
+        seen = 0
+        for annot in page.annots():
+            seen += 1
+            try:
+                info = annot.info
+                title = info.get("title")
+                modified_date = info.get("modDate")
+                if (annotation_filter is not None
+                        and not annotation_filter.accepts(annot.type[0], title, modified_date)):
+                    continue
+                content = info.get("content", "").strip()
+                annot_type = type_names.get(annot.type[0], unknown_type)
+                rect = annot.rect
+                creation_date = info.get("creationDate")
+                highlighted_text = None
+
+                if annot.type[0] in [0, 8]:  # Highlight or Text/Sticky Note/Highlight
+                    highlighted_text = self.extract_text_from_annotation(page, annot, page_num)
+                elif not content and annot.type[0] in [1, 2, 3, 9]:  # Underline, StrikeOut, etc.
+                    highlighted_text = self.extract_text_from_annotation(page, annot, page_num)
+
+                if content or highlighted_text:
+                    annotation = PDFAnnotation(
+                        page_num + 1,
+                        content,
+                        annot_type,
+                        rect,
+                        title,
+                        creation_date,
+                        modified_date,
+                        internal_page,
+                        highlighted_text,
+                        annot.type[0],
+                        page_label
+                    )
+                    annotations.append(annotation)
+
+            except Exception as e:
+                if progress_callback:
+                    progress_callback(
+                        _("Warning: Could not process annotation on page {page}: {error}").format(
+                            page=page_num + 1,
+                            error=str(e)
+                        )
+                    )
+
+        # The text lookups of this page are already counted as text_lookup.
+        lookup_seconds = stats.seconds["text_lookup"] - lookup_seconds
+        stats.add_time("annotations", time.perf_counter() - start - lookup_seconds)
+        stats.count("annotations_seen", seen)
+        return annotations
+
+    def _iter_sharded(self, workers: int, pages: List[int],
+                      reporter: Optional[ProgressReporter] = None
+                      ) -> Iterator[PDFAnnotation]:
+        shards = iter(page_shards(len(pages), workers * SHARDS_PER_WORKER))
+        language = translation_manager.get_current_language()
+
+        cancel_event = self.cancel_event
+        pool_options: Dict[str, Any] = {}
+        if cancel_event is not None:
+            # The workers check a process-shared copy of the cancel event
+            # before every page, so cancelling does not wait for whole shards.
+            shard_cancel_event = multiprocessing.Event()
+            pool_options = {"initializer": _init_shard_worker,
+                            "initargs": (shard_cancel_event,)}
+            poll_interval: Optional[float] = CANCEL_POLL_INTERVAL
+        else:
+            poll_interval = None
+
+        with ProcessPoolExecutor(max_workers=workers, **pool_options) as executor:
+            # Only a window of shards is in flight, so finished shards don't pile
+            # up in the parent while an earlier one is still being processed.
+            in_flight: Deque[Tuple[int, Future]] = deque()
+            done = 0
+            found = 0
+
+            def submit_next() -> None:
+                shard = next(shards, None)
+                if shard is not None:
+                    start, stop = shard
+                    future = executor.submit(_extract_pages, self.source.path, pages[start:stop],
+                                             self.page_offset, language, self.memory_budget,
+                                             self.annotation_filter)
+                    in_flight.append((stop, future))
+
+            for slot in range(workers * 2):
+                submit_next()
+
+            # Futures are consumed in submission order, so the annotations come
+            # out in page order exactly like the serial loop.
+            while in_flight:
+                done, future = in_flight[0]
+                while True:
+                    if cancel_event is not None and cancel_event.is_set():
+                        # Running shards stop at their next page, queued ones
+                        # are dropped.
+                        shard_cancel_event.set()
+                        for _current, pending in in_flight:
+                            pending.cancel()
+                        self.check_cancelled()
+                    try:
+                        annotations, messages, stats = future.result(poll_interval)
+                        break
+                    except FutureTimeoutError:
+                        pass
+                in_flight.popleft()
+                submit_next()
+                self.stats.merge(stats)
+                found += len(annotations)
+                if reporter:
+                    for message in messages:
+                        reporter.message(message)
+                    reporter.update(done, pages[done - 1] + 1, found)
+                yield from annotations
+
+    def annotated_pages(self, page_range: Optional[range] = None) -> List[int]:
+        """
+        Zero-based numbers of the pages that have annotations, within
+        page_range if given.
+
+        Found from each page's /Annots entry in the xref table without
+        loading the pages, so pages without annotations are never parsed.
+        """
+        if page_range is not None and self._annotated_pages is None:
+            return [page_num for page_num in page_range if page_has_annots(self.doc, page_num)]
+        if self._annotated_pages is None:
+            self._annotated_pages = [
+                page_num for page_num in range(self.doc.page_count)
+                if page_has_annots(self.doc, page_num)
+            ]
+        if page_range is not None:
+            return [page_num for page_num in self._annotated_pages if page_num in page_range]
+        return self._annotated_pages
+
+    def resolve_page_offset(self, page_offset: int = -1,
+                            progress_callback: Optional[Callable[[str], None]] = None) -> int:
         if not self.doc:
             raise PDFProcessingError(_("No PDF document loaded"))
 
         if page_offset == -1:
-            if progress_callback:
-                progress_callback(_("Detecting page offset..."))
+            reporter = as_reporter(progress_callback)
+            if reporter:
+                reporter.start(STAGE_OFFSET)
+                reporter.update(0)
             self.page_offset = self.detect_page_offset()
         else:
             self.page_offset = page_offset
+        return self.page_offset
+
+    def iter_annotations(self,
+                         page_offset: int = -1,
+                         progress_callback: Optional[Callable[[str], None]] = None,
+                         workers: int = 1,
+                         pages: Optional[Iterable[int]] = None) -> Iterator[PDFAnnotation]:
+        """
+        Yield the annotations page by page without keeping them in memory.
+
+        Only pages with annotations are loaded. pages restricts the extraction
+        further to the given zero-based page numbers, as does the page range
+        of annotation_filter. Documents that are not read from a file are
+        always processed in this process.
+
+        progress_callback is a ProgressReporter, which receives rate-limited
+        ProgressEvents, or a function taking the formatted progress messages.
+        """
+        reporter = as_reporter(progress_callback)
+        self.resolve_page_offset(page_offset, reporter)
+        self.check_cancelled()
+
+        annotation_filter = self.annotation_filter
+        annotated = self.annotated_pages(
+            annotation_filter.page_range(self.doc.page_count)
+            if annotation_filter is not None and annotation_filter.pages is not None else None
+        )
+        if annotation_filter is not None and annotation_filter.type_codes is not None:
+            # Pages without an annotation of a wanted type are not loaded.
+            annotated = [page_num for page_num in annotated
+                         if annotation_filter.accepts_any_type(
+                             page_annot_type_codes(self.doc, page_num))]
+        if pages is not None:
+            annotated = sorted(set(pages).intersection(annotated))
+        pages = annotated
+        if reporter:
+            reporter.start(STAGE_PAGES, len(pages), self.doc.page_count)
+
+        if workers > 1 and len(pages) > 1 and self.source.is_file:
+            yield from self._iter_sharded(workers, pages, reporter)
+        else:
+            found = 0
+            for done, page_num in enumerate(pages):
+                self.check_cancelled()
+                if reporter:
+                    reporter.update(done, page_num + 1, found)
 
-        self.annotations.clear()
-
-        for page_num in range(self.doc.page_count):
-            if progress_callback:
-                progress_callback(
-                    _("Processing page {current} of {total}...").format(
-                        current=page_num + 1,
-                        total=self.doc.page_count
-                    )
-                )
+                annotations = self._extract_page_annotations(self._load_page(page_num), reporter)
+                found += len(annotations)
+                yield from annotations
+            if reporter:
+                reporter.annotations = found
 
-            page = self.doc[page_num]
-            internal_page = self.get_page_numbers(page)
-
-            for annot in page.annots():
-                try:
-                    content = annot.info.get("content", "").strip()
-                    annot_type = self.ANNOTATION_TYPES.get(annot.type[0], _("Unknown Type"))
-                    rect = annot.rect
-                    title = annot.info.get("title")
-                    creation_date = annot.info.get("creationDate")
-                    modified_date = annot.info.get("modDate")
-                    highlighted_text = None
-
-                    if annot.type[0] in [0, 8]:  # Highlight or Text/Sticky Note/Highlight
-                        highlighted_text = self.extract_text_from_annotation(page, annot, page_num)
-                    elif not content and annot.type[0] in [1, 2, 3, 9]:  # Underline, StrikeOut, etc.
-                        highlighted_text = self.extract_text_from_annotation(page, annot, page_num)
-
-                    if content or highlighted_text:
-                        annotation = PDFAnnotation(
-                            page_num + 1,
-                            content,
-                            annot_type,
-                            rect,
-                            title,
-                            creation_date,
-                            modified_date,
-                            internal_page,
-                            highlighted_text
-                        )
-                        self.annotations.append(annotation)
-
-                except Exception as e:
-                    if progress_callback:
-                        progress_callback(
-                            _("Warning: Could not process annotation on page {page}: {error}").format(
-                                page=page_num + 1,
-                                error=str(e)
-                            )
-                        )
+        if reporter:
+            reporter.finish()
 
+    def extract_annotations(self,
+                            page_offset: int = -1,
+                            progress_callback: Optional[Callable[[str], None]] = None,
+                            workers: int = 1) -> List[PDFAnnotation]:
+        self.annotations.clear()
+        self.annotations.extend(self.iter_annotations(page_offset, progress_callback, workers))
+        self.annotation_count = len(self.annotations)
         return self.annotations
 
-    def save_annotations(self, output_path: Optional[str] = None) -> str:
-        if not output_path:
-            base_name = os.path.splitext(self.pdf_path)[0]
-            output_path = f"{base_name}_annotations.md"
-
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(f"# {_('PDF Annotations Export')}\n\n")
-            f.write(
-                _("**{label}:** {value}\n").format(
-                    label=_("File"),
-                    value=self.pdf_path
-                )
-            )
-            f.write(
-                _("**{label}:** {value}\n").format(
-                    label=_("Date"),
-                    value=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                )
-            )
-            f.write(
-                _("**{label}:** {value}\n").format(
-                    label=_("Total Pages"),
-                    value=self.doc.page_count
-                )
-            )
-            f.write(
-                _("**{label}:** {value}\n").format(
-                    label=_("Page Numbering Starts At"),
-                    value=1 + self.page_offset
-                )
+    def default_output_path(self, output_format: str = DEFAULT_FORMAT) -> str:
+        if not self.source.is_file:
+            raise PDFProcessingError(
+                _("An output file or stream is required for a document that is not read from a file")
             )
-            f.write("\n---\n\n")
+        return default_output_path(self.source.path, output_format)
+
+    def save_annotations(self, output_path: Optional[Output] = None,
+                         output_format: str = DEFAULT_FORMAT) -> Output:
+        """
+        Write the extracted annotations to output_path, which may also be an
+        open text or binary stream. Returns the path or stream.
+        """
+        if not output_path:
+            output_path = self.default_output_path(output_format)
+
+        with self.stats.timer("write"):
+            count = save_annotation_file(output_path, self.pdf_path, self.doc.page_count,
+                                         self.page_offset,
+                                         sorted(self.annotations, key=lambda x: x.page_num),
+                                         output_format)
+        self.stats.count("annotations_written", count)
+        if not is_stream(output_path):
+            self.stats.count("bytes_written", _file_size(output_path))
+        return output_path
 
-            current_page = None
-            for annotation in sorted(self.annotations, key=lambda x: x.page_num):
-                if current_page != annotation.internal_page_num:
-                    current_page = annotation.internal_page_num
-                    f.write(f"\n## {current_page}\n\n")
+    def write_annotations(self,
+                          output_path: Optional[Output] = None,
+                          page_offset: int = -1,
+                          progress_callback: Optional[Callable[[str], None]] = None,
+                          workers: int = 1,
+                          output_format: str = DEFAULT_FORMAT,
+                          collect: Optional[Callable[[PDFAnnotation], None]] = None) -> Output:
+        """
+        Extract and write the annotations in one pass.
+
+        Each page section is flushed as soon as the page is done, so the output
+        grows while the document is processed and memory use does not depend on
+        the number of annotations. The result is identical to
+        extract_annotations() followed by save_annotations(). Output paths
+        ending in .gz are written gzip-compressed; output_path may also be an
+        open text or binary stream, which is flushed but not closed. collect
+        is called with every annotation that is written.
+        """
+        if not output_path:
+            output_path = self.default_output_path(output_format)
 
-                f.write(f"### {annotation.type}\n\n")
+        self.resolve_page_offset(page_offset, progress_callback)
+        stats = self.stats
+        perf_counter = time.perf_counter
+        try:
+            start = perf_counter()
+            with output_stream(output_path) as f:
+                writer = create_writer(f, output_format, flush_pages=True)
+                writer.write_header(self.pdf_path, self.doc.page_count, self.page_offset)
+                write_seconds = perf_counter() - start
+                for annotation in self.iter_annotations(self.page_offset, progress_callback,
+                                                        workers):
+                    start = perf_counter()
+                    writer.write_annotation(annotation)
+                    write_seconds += perf_counter() - start
+                    if collect is not None:
+                        collect(annotation)
+                start = perf_counter()
+                writer.flush()
+            stats.add_time("write", write_seconds + perf_counter() - start)
+        except ExtractionCancelled:
+            # Don't leave a truncated export behind.
+            if not is_stream(output_path):
+                os.remove(output_path)
+            raise
+        self.annotation_count = writer.count
+        stats.count("annotations_written", writer.count)
+        if not is_stream(output_path):
+            stats.count("bytes_written", _file_size(output_path))
 
-                if annotation.highlighted_text:
-                    f.write(
-                        _("**{label}:** {value}\n\n").format(
-                            label=_("Highlighted Text"),
-                            value=annotation.highlighted_text
-                        )
-                    )
+        return output_path
 
-                if annotation.content:
-                    f.write(
-                        _("**{label}:** {value}\n\n").format(
-                            label=_("Comment"),
-                            value=annotation.content
-                        )
-                    )
 
-                if annotation.title:
-                    f.write(
-                        _("**{label}:** {value}\n").format(
-                            label=_("Author"),
-                            value=annotation.title
-                        )
-                    )
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
 
-                if annotation.modified_date:
-                    f.write(
-                        _("**{label}:** {value}\n").format(
-                            label=_("Date"),
-                            value=annotation.modified_date
-                        )
-                    )
 
-                f.write("\n---\n\n")
+def page_has_annots(doc, page_num: int) -> bool:
+    kind, value = doc.xref_get_key(doc.page_xref(page_num), "Annots")
+    if kind == "array":
+        return value.strip("[] ") != ""
+    if kind == "xref":
+        return bool(page_annot_xrefs(doc, page_num))
+    return False
 
-        return output_path
+
+def page_annot_xrefs(doc, page_num: int) -> List[int]:
+    """
+    Read the xrefs in a page's /Annots array straight from the object table.
+
+    The page itself is not loaded, so this is much cheaper than page.annots().
+    """
+    kind, value = doc.xref_get_key(doc.page_xref(page_num), "Annots")
+    if kind == "xref":
+        # Indirect /Annots array
+        value = doc.xref_object(int(value.split()[0]), compressed=True)
+    elif kind != "array":
+        return []
+    return [int(xref) for xref in XREF_REFERENCE.findall(value)]
+
+
+def page_annot_type_codes(doc, page_num: int) -> Optional[Set[int]]:
+    """
+    The type codes of a page's annotations, read from their /Subtype entries
+    without loading the page. None if they can't all be read this way.
+    """
+    xrefs = page_annot_xrefs(doc, page_num)
+    if not xrefs:
+        # Direct annotation dictionaries are not resolved here.
+        return None if page_has_annots(doc, page_num) else set()
+    type_codes = set()
+    for xref in xrefs:
+        kind, value = doc.xref_get_key(xref, "Subtype")
+        if kind != "name" or value not in SUBTYPE_CODES:
+            return None
+        type_codes.add(SUBTYPE_CODES[value])
+    return type_codes
+
+
+def default_output_path(pdf_path: str, output_format: str = DEFAULT_FORMAT,
+                        compress: bool = False) -> str:
+    base_name = os.path.splitext(pdf_path)[0]
+    return f"{base_name}_annotations{format_extension(output_format, compress)}"
+
+
+def page_shards(page_count: int, shard_count: int) -> List[Tuple[int, int]]:
+    """
+    Split the page range into at most shard_count contiguous (start, stop) ranges.
+    """
+    shard_count = max(1, min(shard_count, page_count))
+    size, remainder = divmod(page_count, shard_count)
+    shards = []
+    start = 0
+    for index in range(shard_count):
+        stop = start + size + (1 if index < remainder else 0)
+        shards.append((start, stop))
+        start = stop
+    return shards
+
+
+# Cancel event of a shard worker, see _init_shard_worker()
+_shard_cancel_event = None
+
+
+def _init_shard_worker(cancel_event) -> None:
+    global _shard_cancel_event
+    _shard_cancel_event = cancel_event
+
+
+def _extract_pages(pdf_path: str, pages: List[int], page_offset: int, language: str,
+                   memory_budget: Optional[int] = None,
+                   annotation_filter: Optional[AnnotationFilter] = None
+                   ) -> Tuple[List[PDFAnnotation], List[str], ExtractionStats]:
+    # Runs in a worker process: each worker opens its own document.
+    translation_manager.change_language(language)
+    messages: List[str] = []
+    with PDFProcessor(pdf_path, _shard_cancel_event, memory_budget,
+                      annotation_filter=annotation_filter) as processor:
+        processor.page_offset = page_offset
+        annotations: List[PDFAnnotation] = []
+        for page_num in pages:
+            processor.check_cancelled()
+            annotations.extend(
+                processor._extract_page_annotations(processor._load_page(page_num),
+                                                    messages.append)
+            )
+    return annotations, messages, processor.stats
 
 
 def extract_pdf_annotations(
-        pdf_path: str,
+        pdf_path: PDFSource,
         page_offset: int = -1,
-        progress_callback: Optional[Callable[[str], None]] = None
-) -> str:
+        progress_callback: Optional[Callable[[str], None]] = None,
+        workers: int = 1,
+        cache: Optional["ExtractionCache"] = None,
+        output_format: str = DEFAULT_FORMAT,
+        cancel_event: Optional["threading.Event"] = None,
+        memory_budget: Optional[int] = None,
+        output: Optional[Output] = None,
+        annotation_filter: Optional[AnnotationFilter] = None
+) -> Output:
     """
     Main function for extracting PDF annotations.
+
+    With workers > 1 the pages are split into shards that are extracted in
+    separate processes; the result is identical to the serial run. With a
+    cache, unchanged files are written from the stored result. Setting
+    cancel_event from another thread stops the extraction before the next
+    page with ExtractionCancelled; no output file is left behind.
+    memory_budget (bytes) bounds the memory of each process, see PDFProcessor.
+
+    pdf_path may also be PDF bytes, a buffer or a binary file object such as
+    sys.stdin.buffer, and output a path or a writable stream; by default the
+    export is written next to the PDF. Returns the output path or stream.
+    The cache is only used for files. annotation_filter selects the
+    annotations to extract, see filters.AnnotationFilter.
     """
     try:
-        with PDFProcessor(pdf_path) as processor:
-            processor.extract_annotations(page_offset, progress_callback)
-            return processor.save_annotations()
+        if cache is not None and isinstance(pdf_path, (str, os.PathLike)):
+            return cache.extract_and_save(os.fspath(pdf_path), output, page_offset,
+                                          progress_callback, workers, output_format,
+                                          cancel_event, memory_budget, annotation_filter)[0]
+        with PDFProcessor(pdf_path, cancel_event, memory_budget,
+                          annotation_filter=annotation_filter) as processor:
+            return processor.write_annotations(output, page_offset, progress_callback, workers,
+                                               output_format)
+    except PDFProcessingError:
+        raise
     except Exception as e:
         raise PDFProcessingError(str(e))
+
+
+def extract_with_stats(
+        pdf_path: PDFSource,
+        output_path: Optional[Output] = None,
+        page_offset: int = -1,
+        progress_callback: Optional[Callable[[str], None]] = None,
+        workers: int = 1,
+        output_format: str = DEFAULT_FORMAT,
+        profile_path: Optional[str] = None,
+        memory_budget: Optional[int] = None,
+        annotation_filter: Optional[AnnotationFilter] = None
+) -> Tuple[Output, ExtractionStats]:
+    """
+    Extract and write the annotations, returning the output path and the stats.
+
+    The cache is not used, so the stats always describe a real extraction.
+    With profile_path, the run is recorded with cProfile and the profile is
+    written there for pstats or snakeviz; worker processes are not profiled.
+    """
+    profiler = None
+    if profile_path:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        processor = PDFProcessor(pdf_path, memory_budget=memory_budget,
+                                 annotation_filter=annotation_filter)
+        with processor:
+            output_path = processor.write_annotations(output_path, page_offset,
+                                                      progress_callback, workers, output_format)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+    return output_path, processor.stats
+
+
+if __name__ == "__main__":
+    from .cli import main
+
+    sys.exit(main(["extract"] + sys.argv[1:]))
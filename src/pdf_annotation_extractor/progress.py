@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - Progress reporting
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+"""
+
+import time
+from typing import Callable, Optional, Union
+
+from .translations import _
+
+# Minimum time in seconds between two progress events of the same stage.
+DEFAULT_INTERVAL = 0.2
+
+STAGE_OFFSET = "offset"
+STAGE_PAGES = "pages"
+STAGE_FILES = "files"
+STAGE_MESSAGE = "message"
+
+
+class ProgressEvent:
+    """
+    A snapshot of a running extraction.
+
+    current and total count the work items of the stage (pages with
+    annotations, or files in a batch); page and page_count refer to the
+    document page that is being processed. Nothing is formatted or
+    translated until format() is called.
+    """
+
+    __slots__ = ("stage", "current", "total", "page", "page_count", "annotations",
+                 "elapsed", "message")
+
+    def __init__(self, stage: str, current: int = 0, total: int = 0,
+                 page: int = 0, page_count: int = 0, annotations: int = 0,
+                 elapsed: float = 0.0, message: Optional[str] = None):
+        self.stage = stage
+        self.current = current
+        self.total = total
+        self.page = page
+        self.page_count = page_count
+        self.annotations = annotations
+        self.elapsed = elapsed
+        self.message = message
+
+    @property
+    def rate(self) -> float:
+        """Work items (pages or files) per second."""
+        return self.current / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Estimated seconds until the stage is done, None while unknown."""
+        rate = self.rate
+        if rate <= 0 or self.total <= 0:
+            return None
+        return max(0.0, (self.total - self.current) / rate)
+
+    def format(self) -> str:
+        """The localized progress message of the string callback."""
+        if self.stage == STAGE_OFFSET:
+            return _("Detecting page offset...")
+        if self.stage == STAGE_PAGES:
+            return _("Processing page {current} of {total}...").format(
+                current=self.page,
+                total=self.page_count
+            )
+        if self.stage == STAGE_FILES:
+            return _("Processed {current} of {total} files...").format(
+                current=self.current,
+                total=self.total
+            )
+        return self.message or ""
+
+    def __repr__(self) -> str:
+        return (f"ProgressEvent({self.stage!r}, {self.current}/{self.total}, page={self.page}, "
+                f"annotations={self.annotations}, elapsed={self.elapsed:.3f})")
+
+
+class ProgressReporter:
+    """
+    Turns progress updates into ProgressEvents for a listener.
+
+    update() is cheap: an event is only built when interval seconds have
+    passed since the last one, so per-page calls on very large documents
+    don't flood the listener. The first update of a stage, finish() and
+    messages (warnings) are always delivered. A reporter can be passed
+    wherever a progress_callback is expected; called with a string it
+    reports a message.
+    """
+
+    def __init__(self, listener: Callable[[ProgressEvent], None],
+                 interval: float = DEFAULT_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.listener = listener
+        self.interval = interval
+        self.clock = clock
+        self.stage = STAGE_MESSAGE
+        self.total = 0
+        self.page_count = 0
+        self.current = 0
+        self.page = 0
+        self.annotations = 0
+        self._started = clock()
+        self._last_emit = float("-inf")
+        self._last_state: Optional[tuple] = None
+
+    def _emit(self, now: float) -> None:
+        self._last_emit = now
+        self._last_state = (self.current, self.annotations)
+        self.listener(ProgressEvent(self.stage, self.current, self.total, self.page,
+                                    self.page_count, self.annotations, now - self._started))
+
+    def start(self, stage: str, total: int = 0, page_count: int = 0) -> None:
+        self.stage = stage
+        self.total = total
+        self.page_count = page_count
+        self.current = 0
+        self.page = 0
+        self.annotations = 0
+        self._started = self.clock()
+        self._last_emit = float("-inf")
+        self._last_state = None
+
+    def update(self, current: int, page: int = 0, annotations: Optional[int] = None) -> None:
+        self.current = current
+        self.page = page
+        if annotations is not None:
+            self.annotations = annotations
+        now = self.clock()
+        if now - self._last_emit >= self.interval:
+            self._emit(now)
+
+    def finish(self, annotations: Optional[int] = None) -> None:
+        self.current = self.total
+        if annotations is not None:
+            self.annotations = annotations
+        # Skip it if the last update already reported the final state.
+        if self._last_state != (self.current, self.annotations):
+            self._emit(self.clock())
+
+    def message(self, text: str) -> None:
+        self.listener(ProgressEvent(STAGE_MESSAGE, self.current, self.total, self.page,
+                                    self.page_count, self.annotations,
+                                    self.clock() - self._started, text))
+
+    def __call__(self, text: str) -> None:
+        self.message(text)
+
+
+ProgressCallback = Union[ProgressReporter, Callable[[str], None]]
+
+
+def string_listener(callback: Callable[[str], None]) -> Callable[[ProgressEvent], None]:
+    """
+    Adapter for the string progress callbacks: passes event.format().
+    """
+    def listener(event: ProgressEvent) -> None:
+        callback(event.format())
+    return listener
+
+
+def as_reporter(progress_callback: Optional[ProgressCallback]) -> Optional[ProgressReporter]:
+    """
+    The reporter for a progress_callback argument: reporters are used as they
+    are, plain string callbacks are wrapped with string_listener().
+    """
+    if progress_callback is None or isinstance(progress_callback, ProgressReporter):
+        return progress_callback
+    return ProgressReporter(string_listener(progress_callback))
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - Extraction daemon
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+A long-running HTTP service on localhost or a Unix socket. The worker
+processes are started once and keep PyMuPDF and the translation catalogs
+loaded, so a request only pays for the extraction itself.
+
+    POST /extract?format=json&page_offset=-1&language=en
+        Content-Type: application/json   {"path": "/abs/file.pdf", ...options}
+        Content-Type: application/pdf    the PDF itself; ?name= sets the document name
+    GET /status
+
+Options are taken from the query string and, for JSON bodies, from the body.
+format is json (default), jsonl or markdown. When all workers are busy and
+the queue is full, requests are rejected with 503 before their body is
+read, instead of piling up.
+
+A path job makes the daemon open a file on behalf of the client. With a
+root, only files below it are accepted; without one the daemon only listens
+on loopback addresses and Unix sockets.
+"""
+
+import io
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+from urllib.parse import parse_qsl, urlsplit
+
+from .export import OUTPUT_FORMATS, create_writer
+from .jsonl import annotation_record
+from .pdf_utils import PDFProcessingError, PDFProcessor
+from .translations import LANGUAGES, _, translation_manager
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Jobs that may wait for a worker, per worker
+QUEUE_PER_WORKER = 4
+# Default limit of a request body (an uploaded PDF) in bytes
+MAX_BODY_SIZE = 64 * 1024 * 1024
+
+JSON_FORMAT = "json"
+CONTENT_TYPES = {
+    JSON_FORMAT: "application/json",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+    "markdown": "text/markdown; charset=utf-8",
+}
+PDF_CONTENT_TYPES = ("application/pdf", "application/octet-stream")
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at its limit"""
+    pass
+
+
+def _init_worker(language: str) -> None:
+    # Runs once per worker process; the module imports have loaded PyMuPDF.
+    translation_manager.change_language(language)
+    translation_manager.get_messages()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _render(processor: PDFProcessor, annotations, document: str, output_format: str) -> str:
+    if output_format == JSON_FORMAT:
+        return json.dumps({
+            "document": document,
+            "page_count": processor.doc.page_count,
+            "page_offset": processor.page_offset,
+            "annotations": [annotation_record(annotation, document) for annotation in annotations],
+        }, ensure_ascii=False)
+
+    f = io.StringIO()
+    writer = create_writer(f, output_format)
+    writer.write_header(document, processor.doc.page_count, processor.page_offset)
+    for annotation in annotations:
+        writer.write_annotation(annotation)
+    writer.flush()
+    return f.getvalue()
+
+
+def run_job(source: Union[str, bytes], name: Optional[str] = None, page_offset: int = -1,
+            output_format: str = JSON_FORMAT, language: Optional[str] = None) -> str:
+    """
+    Extract the annotations of a PDF path or PDF bytes and return the rendered result.
+
+    Runs in a worker process.
+    """
+    if language:
+        translation_manager.change_language(language)
+    with PDFProcessor(source, name=name) as processor:
+        annotations = processor.extract_annotations(page_offset)
+        return _render(processor, annotations, processor.pdf_path, output_format)
+
+
+class ExtractionService:
+    """
+    A warm process pool with admission control.
+
+    At most workers + queue_size jobs are accepted at a time; submit() raises
+    QueueFull beyond that. A place can also be reserved before the job is
+    known, see reserve(). If a worker dies, the pool is replaced so that
+    later jobs are not affected.
+    """
+
+    def __init__(self, workers: Optional[int] = None, queue_size: Optional[int] = None,
+                 language: Optional[str] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = QUEUE_PER_WORKER * self.workers if queue_size is None else queue_size
+        self.language = language or translation_manager.get_current_language()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._executor = self._start_pool()
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    def _start_pool(self) -> ProcessPoolExecutor:
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                       initargs=(self.language,))
+        # Start the workers now rather than on the first request.
+        for future in [executor.submit(_ping) for _worker in range(self.workers)]:
+            future.result()
+        return executor
+
+    def _job_done(self, future: Future) -> None:
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    def reserve(self) -> None:
+        """
+        Take a place in the queue or raise QueueFull. The place is used by
+        the next submit(..., reserved=True) or given back with release().
+        """
+        with self._lock:
+            if self.pending >= self.capacity:
+                self.rejected += 1
+                raise QueueFull(_("The extraction queue is full"))
+            self.pending += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    def submit(self, source: Union[str, bytes], name: Optional[str] = None,
+               page_offset: int = -1, output_format: str = JSON_FORMAT,
+               language: Optional[str] = None, reserved: bool = False) -> Future:
+        if not reserved:
+            self.reserve()
+        executor = self._executor
+        try:
+            future = executor.submit(run_job, source, name, page_offset, output_format,
+                                     language or self.language)
+        except BaseException:
+            self.release()
+            raise
+        future.add_done_callback(self._job_done)
+        return future
+
+    def restart_pool(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = self._start_pool()
+        broken.shutdown(wait=False)
+
+    def extract(self, *args: Any, **kwargs: Any) -> str:
+        executor = self._executor
+        try:
+            return self.submit(*args, **kwargs).result()
+        except BrokenProcessPool:
+            self.restart_pool(executor)
+            raise PDFProcessingError(_("The worker process terminated unexpectedly"))
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "language": self.language,
+            }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    server_version = "pdf-annotation-extractor"
+
+    @property
+    def service(self) -> ExtractionService:
+        return self.server.service
+
+    def address_string(self) -> str:
+        # Unix socket clients have no address.
+        if isinstance(self.client_address, tuple):
+            return super().address_string()
+        return "unix"
+
+    def _send(self, status: int, body: str, content_type: str,
+              headers: Optional[Dict[str, str]] = None) -> None:
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status: int, value: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        self._send(status, json.dumps(value, ensure_ascii=False), CONTENT_TYPES[JSON_FORMAT],
+                   headers)
+
+    def _send_error(self, status: int, message: str,
+                    headers: Optional[Dict[str, str]] = None) -> None:
+        self._send_json(status, {"error": message}, headers)
+
+    def do_GET(self) -> None:
+        if urlsplit(self.path).path == "/status":
+            self._send_json(200, self.service.status())
+        else:
+            self._send_error(404, _("Not found"))
+
+    def _check_path(self, path: str) -> str:
+        root = self.server.root
+        if root is None:
+            return path
+        real_path = os.path.realpath(path)
+        if os.path.commonpath([real_path, root]) != root:
+            raise PermissionError(_("The path is outside of the served directory"))
+        return real_path
+
+    def _read_job(self, length: int) -> Tuple[Union[str, bytes], Optional[str], int, str,
+                                              Optional[str]]:
+        """The source, name, page offset, format and language of a job."""
+        url = urlsplit(self.path)
+        options: Dict[str, Any] = dict(parse_qsl(url.query))
+        body = self.rfile.read(length)
+
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip()
+        if content_type in PDF_CONTENT_TYPES:
+            source: Union[str, bytes] = body
+        else:
+            request = json.loads(body or b"{}")
+            if not isinstance(request, dict) or not isinstance(request.get("path"), str):
+                raise ValueError(_("Expected a JSON object with a path"))
+            options.update(request)
+            source = self._check_path(options.pop("path"))
+
+        output_format = options.get("format", JSON_FORMAT)
+        if output_format != JSON_FORMAT and output_format not in OUTPUT_FORMATS:
+            raise ValueError(_("Unknown output format: {format}").format(format=output_format))
+        language = options.get("language")
+        if language and language not in LANGUAGES:
+            raise ValueError(_("Unknown language: {language}").format(language=language))
+        name = options.get("name")
+        if name is not None and not isinstance(name, str):
+            raise ValueError(_("The name must be a string"))
+        page_offset = int(options.get("page_offset", -1))
+        return source, name, page_offset, output_format, language
+
+    def do_POST(self) -> None:
+        if urlsplit(self.path).path != "/extract":
+            self._send_error(404, _("Not found"))
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            self._send_error(400, _("Invalid Content-Length"))
+            return
+        if length > self.server.max_body_size:
+            self.close_connection = True
+            self._send_error(413, _("The request body is too large"))
+            return
+
+        # A place in the queue is taken before the body is read, so an
+        # overloaded daemon does not buffer uploads it cannot process.
+        try:
+            self.service.reserve()
+        except QueueFull as e:
+            self.close_connection = True
+            self._send_error(503, str(e), {"Retry-After": "1"})
+            return
+
+        try:
+            source, name, page_offset, output_format, language = self._read_job(length)
+        except BaseException as e:
+            # The job is not submitted.
+            self.service.release()
+            if isinstance(e, PermissionError):
+                self._send_error(403, str(e))
+            elif isinstance(e, (TypeError, ValueError)):
+                # E.g. a list where a number or string is expected
+                self._send_error(400, str(e))
+            else:
+                raise
+            return
+
+        try:
+            result = self.service.extract(source, name, page_offset, output_format, language,
+                                          reserved=True)
+        except PDFProcessingError as e:
+            self._send_error(422, str(e))
+            return
+        except Exception as e:
+            self._send_error(500, str(e))
+            return
+        self._send(200, result, CONTENT_TYPES[output_format])
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+else:
+    # Windows
+    UnixHTTPServer = None
+
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _remove_stale_socket(socket_path: str) -> None:
+    # Only a socket that nobody listens on is replaced, never a file that
+    # happens to be there or the socket of a running daemon.
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(_("Not a socket, refusing to replace it: {path}").format(
+            path=socket_path))
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except ConnectionRefusedError:
+        os.remove(socket_path)
+        return
+    except FileNotFoundError:
+        return
+    finally:
+        probe.close()
+    raise FileExistsError(_("Another server is listening on {path}").format(path=socket_path))
+
+
+def check_address(host: str = DEFAULT_HOST, socket_path: Optional[str] = None,
+                  root: Optional[str] = None) -> None:
+    """
+    Raise ValueError if the server must not listen on host.
+
+    Path jobs let clients read any file the daemon can read, so without a
+    root only loopback addresses and Unix sockets are allowed.
+    """
+    if not socket_path and root is None and not is_loopback(host):
+        raise ValueError(_("Listening on {host} requires a root directory for path jobs").format(
+            host=host))
+
+
+def create_server(service: ExtractionService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                  socket_path: Optional[str] = None,
+                  root: Optional[str] = None,
+                  max_body_size: int = MAX_BODY_SIZE) -> socketserver.BaseServer:
+    """
+    An HTTP server for the service on a Unix socket if socket_path is given,
+    otherwise on host:port. With root, path jobs are limited to files below
+    that directory. Larger request bodies than max_body_size bytes are
+    rejected with 413.
+
+    A stale socket at socket_path is replaced; FileExistsError is raised if
+    another file is there or a server is still listening on it.
+    """
+    check_address(host, socket_path, root)
+    if socket_path:
+        if UnixHTTPServer is None:
+            raise OSError(_("Unix sockets are not supported on this system"))
+        _remove_stale_socket(socket_path)
+        server = UnixHTTPServer(socket_path, RequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), RequestHandler)
+        server.daemon_threads = True
+    server.service = service
+    server.root = os.path.realpath(root) if root else None
+    server.max_body_size = max_body_size
+    return server
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+          socket_path: Optional[str] = None, workers: Optional[int] = None,
+          queue_size: Optional[int] = None, language: Optional[str] = None,
+          root: Optional[str] = None, max_body_size: int = MAX_BODY_SIZE,
+          started: Optional[Callable[[], None]] = None) -> None:
+    """
+    Run the daemon until it is interrupted (KeyboardInterrupt).
+
+    started is called once the workers run and the server listens, e.g. to
+    install signal handlers that the workers must not inherit. Raises
+    ValueError or OSError if it cannot listen at the address, see
+    create_server().
+    """
+    service = ExtractionService(workers, queue_size, language)
+    try:
+        server = create_server(service, host, port, socket_path, root, max_body_size)
+    except BaseException:
+        service.close()
+        raise
+    try:
+        if started:
+            started()
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path:
+            # Our own socket
+            try:
+                os.remove(socket_path)
+            except FileNotFoundError:
+                pass
+        service.close()
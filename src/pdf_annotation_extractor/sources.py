@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - Document sources
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+"""
+
+import io
+import mmap
+import os
+import stat
+from typing import BinaryIO, Optional, Union
+
+import fitz
+
+# What PDFProcessor and extract_pdf_annotations accept as a document
+PDFSource = Union[str, "os.PathLike[str]", bytes, bytearray, memoryview, mmap.mmap, BinaryIO,
+                  "DocumentSource"]
+
+# Shown in the export when an in-memory document has no name
+DEFAULT_STREAM_NAME = "document.pdf"
+
+
+class DocumentSource:
+    """
+    A document to be opened with PyMuPDF: a file path or PDF bytes.
+
+    name is what the export shows as the file; it is the path for files.
+    """
+
+    __slots__ = ("path", "stream", "name")
+
+    def __init__(self, path: Optional[str] = None, stream: Optional[bytes] = None,
+                 name: Optional[str] = None):
+        self.path = path
+        self.stream = stream
+        self.name = name or path or DEFAULT_STREAM_NAME
+
+    @property
+    def is_file(self) -> bool:
+        return self.stream is None
+
+    def open(self) -> fitz.Document:
+        if self.stream is None:
+            return fitz.open(self.path)
+        return fitz.open(stream=self.stream, filetype="pdf")
+
+
+def _named_file(f) -> Optional[str]:
+    # The path of a file object that refers to a regular file by name.
+    name = getattr(f, "name", None)
+    if not isinstance(name, str):
+        return None
+    try:
+        file_stat = os.fstat(f.fileno())
+        if stat.S_ISREG(file_stat.st_mode) and os.path.samestat(file_stat, os.stat(name)):
+            return name
+    except (OSError, ValueError, io.UnsupportedOperation):
+        pass
+    return None
+
+
+def document_source(source: PDFSource, name: Optional[str] = None) -> DocumentSource:
+    """
+    Resolve a path, buffer or binary file object into a DocumentSource.
+
+    PyMuPDF only reads from paths and bytes objects. Paths, bytes, memoryviews
+    spanning a whole bytes object and file objects of named regular files are
+    used without copying the document; other buffers (bytearray, mmap, partial
+    memoryviews) and streams such as pipes or stdin are copied once.
+    """
+    if isinstance(source, DocumentSource):
+        return source if not name else DocumentSource(source.path, source.stream, name)
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        return DocumentSource(path=path, name=name or path)
+
+    if isinstance(source, bytes):
+        data = source
+    elif (isinstance(source, memoryview) and isinstance(source.obj, bytes)
+          and source.contiguous and source.nbytes == len(source.obj)):
+        data = source.obj
+    elif isinstance(source, (bytearray, memoryview, mmap.mmap)):
+        data = bytes(source)
+    elif isinstance(source, io.BytesIO):
+        # Shares the buffer as long as it is not modified afterwards.
+        data = source.getvalue()
+    elif hasattr(source, "read"):
+        path = _named_file(source)
+        if path is not None:
+            return DocumentSource(path=path, name=name or path)
+        data = source.read()
+        if not isinstance(data, bytes):
+            raise TypeError("PDF streams must be opened in binary mode")
+        stream_name = getattr(source, "name", None)
+        name = name or (stream_name if isinstance(stream_name, str) else None)
+    else:
+        raise TypeError(f"Unsupported PDF source: {type(source).__name__}")
+    return DocumentSource(stream=data, name=name)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - Extraction statistics
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Tuple
+
+# Stages in pipeline order. "annotations" is the page.annots() loop without
+# the text lookups, which are timed separately as "text_lookup".
+STAGES = ("open", "offset", "load_page", "annotations", "text_lookup", "write")
+COUNTERS = ("pages_loaded", "annotations_seen", "text_lookups", "annotations_written",
+            "bytes_written", "document_reopens")
+
+PROFILE_SUFFIX = ".prof"
+STATS_SUFFIX = ".stats.json"
+
+
+def profile_paths(pdf_path: str, profile_dir: str) -> Tuple[str, str]:
+    """
+    The cProfile and stats file of a document in profile_dir.
+    """
+    base_name = os.path.join(profile_dir, os.path.splitext(os.path.basename(pdf_path))[0])
+    return base_name + PROFILE_SUFFIX, base_name + STATS_SUFFIX
+
+
+class ExtractionStats:
+    """
+    Time spent per stage and work counters of one extraction.
+
+    The timers are plain perf_counter differences added up by the code that
+    does the work, so recording them costs next to nothing. Stats of worker
+    processes are merged into the parent's, which makes the stage times of a
+    parallel run the sum over all workers rather than wall time.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def count(self, counter: str, amount: int = 1) -> None:
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def merge(self, other: "ExtractionStats") -> None:
+        for stage, seconds in other.seconds.items():
+            self.add_time(stage, seconds)
+        for counter, amount in other.counters.items():
+            self.count(counter, amount)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.seconds.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"seconds": dict(self.seconds), "counters": dict(self.counters)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ExtractionStats":
+        stats = cls()
+        stats.seconds.update(data.get("seconds", {}))
+        stats.counters.update(data.get("counters", {}))
+        return stats
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def format(self) -> str:
+        total = self.total_seconds
+        lines = []
+        for stage, seconds in self.seconds.items():
+            share = seconds / total * 100 if total else 0.0
+            lines.append(f"{stage:<14}{seconds * 1000:>10.1f} ms {share:>5.1f}%")
+        lines.append(f"{'total':<14}{total * 1000:>10.1f} ms")
+        for counter, amount in self.counters.items():
+            lines.append(f"{counter:<18}{amount:>10}")
+        return "\n".join(lines)
+
+    def __repr__(self) -> str:
+        return f"ExtractionStats(total={self.total_seconds:.3f}s, counters={self.counters!r})"
@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - SQLite annotation store
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from . import filters
+from .dates import parse_iso_date, parse_pdf_date, sortable_timestamp
+from .jsonl import subtype_name
+from .translations import _
+
+# Rows handed to executemany() at once, and rows inserted before a commit.
+INSERT_BATCH_SIZE = 1000
+COMMIT_ROWS = 50000
+# Documents extracted for import_sources() that may be waiting to be stored,
+# per worker
+IMPORTS_PER_WORKER = 2
+
+# Schema migrations; the schema version is the number of applied steps and is
+# kept in PRAGMA user_version.
+MIGRATIONS = (
+    """
+    CREATE TABLE documents (
+        id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL UNIQUE,
+        page_count INTEGER,
+        page_offset INTEGER,
+        imported TEXT NOT NULL
+    );
+    CREATE TABLE annotations (
+        id INTEGER PRIMARY KEY,
+        document_id INTEGER NOT NULL REFERENCES documents(id),
+        page_num INTEGER NOT NULL,
+        page_label TEXT,
+        type_code INTEGER,
+        x0 REAL, y0 REAL, x1 REAL, y1 REAL,
+        author TEXT,
+        created TEXT,
+        modified TEXT,
+        content TEXT,
+        highlighted_text TEXT
+    );
+    CREATE INDEX annotations_document ON annotations(document_id, page_num);
+    CREATE INDEX annotations_page ON annotations(page_num);
+    CREATE INDEX annotations_type ON annotations(type_code);
+    CREATE INDEX annotations_author ON annotations(author, modified);
+    CREATE INDEX annotations_modified ON annotations(modified);
+    """,
+    # Full-text index over the comments and highlighted text. It refers to
+    # the rows of annotations and is kept up to date by triggers, so
+    # re-importing a document updates only that document's entries.
+    """
+    CREATE VIRTUAL TABLE annotations_fts USING fts5(
+        content, highlighted_text,
+        content='annotations', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    );
+    CREATE TRIGGER annotations_fts_insert AFTER INSERT ON annotations BEGIN
+        INSERT INTO annotations_fts (rowid, content, highlighted_text)
+        VALUES (new.id, new.content, new.highlighted_text);
+    END;
+    CREATE TRIGGER annotations_fts_delete AFTER DELETE ON annotations BEGIN
+        INSERT INTO annotations_fts (annotations_fts, rowid, content, highlighted_text)
+        VALUES ('delete', old.id, old.content, old.highlighted_text);
+    END;
+    CREATE TRIGGER annotations_fts_update AFTER UPDATE ON annotations BEGIN
+        INSERT INTO annotations_fts (annotations_fts, rowid, content, highlighted_text)
+        VALUES ('delete', old.id, old.content, old.highlighted_text);
+        INSERT INTO annotations_fts (rowid, content, highlighted_text)
+        VALUES (new.id, new.content, new.highlighted_text);
+    END;
+    INSERT INTO annotations_fts (annotations_fts) VALUES ('rebuild');
+    """,
+)
+SCHEMA_VERSION = len(MIGRATIONS)
+# The migration that creates the full-text index. SQLite may be built without
+# FTS5; the store then stays at the version before it and only search() fails.
+FTS_MIGRATION = 1
+
+INSERT_ANNOTATION = (
+    "INSERT INTO annotations (document_id, page_num, page_label, type_code, x0, y0, x1, y1,"
+    " author, created, modified, content, highlighted_text)"
+    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+SELECT_ANNOTATIONS = (
+    "SELECT d.path, a.page_num, a.page_label, a.type_code, a.x0, a.y0, a.x1, a.y1,"
+    " a.author, a.created, a.modified, a.content, a.highlighted_text"
+)
+
+# Words of context around the matches in search snippets
+SNIPPET_WORDS = 12
+
+Row = Tuple[Any, ...]
+
+
+class StoreError(Exception):
+    pass
+
+
+def _annotation_row(document_id: int, annotation) -> Row:
+    return (
+        document_id, annotation.page_num, annotation.page_label, annotation.type_code,
+        annotation.x0, annotation.y0, annotation.x1, annotation.y1, annotation.title,
+        sortable_timestamp(parse_pdf_date(annotation.creation_date)),
+        sortable_timestamp(parse_pdf_date(annotation.modified_date)),
+        annotation.content, annotation.highlighted_text
+    )
+
+
+def _record_row(document_id: int, record: Dict[str, Any]) -> Row:
+    x0, y0, x1, y1 = record["rect"]
+    return (
+        document_id, record["page_num"], record.get("page_label"), record.get("type_code"),
+        x0, y0, x1, y1, record.get("author"),
+        sortable_timestamp(parse_iso_date(record.get("created"))),
+        sortable_timestamp(parse_iso_date(record.get("modified"))),
+        record.get("content"), record.get("highlighted_text")
+    )
+
+
+def type_code_for(value: Union[int, str]) -> int:
+    """
+    Accept a type code or a PDF subtype name such as "Highlight".
+    """
+    try:
+        return filters.type_code_for(value)
+    except ValueError as e:
+        raise StoreError(str(e))
+
+
+def _date_bound(value: Optional[Union[str, datetime]]) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return sortable_timestamp(value)
+
+
+def document_path(path: str) -> str:
+    """
+    The name a document is stored and reported under: its absolute path.
+    """
+    return os.path.abspath(path)
+
+
+def match_expression(text: str) -> str:
+    """
+    Turn free text into an FTS5 query that matches all of its words.
+
+    Each word becomes a quoted string, so characters with a meaning in the
+    FTS5 query syntax are searched for literally; a trailing "*" on a word
+    is kept as a prefix search.
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*")
+        if word:
+            terms.append('"' + word.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def _document_condition(document: str) -> str:
+    if any(char in document for char in filters.GLOB_CHARACTERS):
+        return "d.path GLOB ?"
+    return "d.path = ?"
+
+
+def _open_records(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+class AnnotationStore:
+    """
+    SQLite database with the annotations of many documents.
+
+    Rows are inserted with executemany() in batches and committed every
+    COMMIT_ROWS rows, so importing thousands of small documents does not
+    pay for one transaction each. Adding a document again replaces its
+    annotations. Dates are stored as UTC ISO 8601 strings, which keeps
+    date ranges indexable.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._pending_rows = 0
+        self._in_source = False
+        self._search_error: Optional[str] = None
+        self._migrate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.commit()
+        self.close()
+
+    def _migrate(self) -> None:
+        version = self.schema_version()
+        if version > SCHEMA_VERSION:
+            raise StoreError(
+                _("Database {path} has schema version {version}, "
+                  "this program supports {supported}").format(
+                    path=self.path, version=version, supported=SCHEMA_VERSION
+                )
+            )
+        for script in MIGRATIONS[version:]:
+            try:
+                self.conn.executescript(script)
+            except sqlite3.OperationalError as e:
+                if version == FTS_MIGRATION:
+                    self._search_error = str(e)
+                    break
+                raise StoreError(
+                    _("Could not upgrade database {path}: {error}").format(path=self.path, error=str(e))
+                )
+            version += 1
+            self.conn.execute(f"PRAGMA user_version={version}")
+            self.conn.commit()
+
+    def schema_version(self) -> int:
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def commit(self) -> None:
+        self.conn.commit()
+        self._pending_rows = 0
+
+    def close(self) -> None:
+        self.conn.close()
+
+    @contextmanager
+    def _source(self):
+        # One document or import file is stored completely or not at all: its
+        # changes are made in a savepoint that is rolled back on errors. The
+        # rows are committed with the others, after the source is complete.
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+        self.conn.execute("SAVEPOINT import_source")
+        self._in_source = True
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK TO import_source")
+            raise
+        finally:
+            self._in_source = False
+            self.conn.execute("RELEASE import_source")
+        if self._pending_rows >= COMMIT_ROWS:
+            self.commit()
+
+    def _replace_document(self, document: str, page_count: Optional[int],
+                          page_offset: Optional[int]) -> int:
+        row = self.conn.execute("SELECT id FROM documents WHERE path = ?", (document,)).fetchone()
+        imported = datetime.now().isoformat(timespec="seconds")
+        if row is None:
+            cursor = self.conn.execute(
+                "INSERT INTO documents (path, page_count, page_offset, imported) VALUES (?, ?, ?, ?)",
+                (document, page_count, page_offset, imported)
+            )
+            return cursor.lastrowid
+        self.conn.execute("DELETE FROM annotations WHERE document_id = ?", (row[0],))
+        self.conn.execute(
+            "UPDATE documents SET page_count = ?, page_offset = ?, imported = ? WHERE id = ?",
+            (page_count, page_offset, imported, row[0])
+        )
+        return row[0]
+
+    def _insert(self, rows: Iterator[Row]) -> int:
+        count = 0
+        while True:
+            batch = list(islice(rows, INSERT_BATCH_SIZE))
+            if not batch:
+                break
+            self.conn.executemany(INSERT_ANNOTATION, batch)
+            count += len(batch)
+            self._pending_rows += len(batch)
+            if self._pending_rows >= COMMIT_ROWS and not self._in_source:
+                self.commit()
+        return count
+
+    def add_document(self, document: str, annotations: Iterable,
+                     page_count: Optional[int] = None,
+                     page_offset: Optional[int] = None) -> int:
+        """
+        Store the PDFAnnotation records of one document, replacing earlier ones.
+
+        Returns the number of annotations stored.
+        """
+        with self._source():
+            document_id = self._replace_document(document, page_count, page_offset)
+            return self._insert(_annotation_row(document_id, annotation)
+                                for annotation in annotations)
+
+    def import_jsonl(self, path: str) -> Dict[str, int]:
+        """
+        Import a JSON Lines export, optionally gzip-compressed.
+
+        Returns the number of annotations stored per document. If the file
+        can't be read completely, nothing of it is stored and documents it
+        contains keep their earlier annotations.
+        """
+        with self._source():
+            return self._import_jsonl(path)
+
+    def _import_jsonl(self, path: str) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        document_ids: Dict[str, int] = {}
+        batch: List[Row] = []
+        with _open_records(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                document = document_path(record.get("document") or path)
+                if document not in document_ids:
+                    document_ids[document] = self._replace_document(document, None, None)
+                    counts[document] = 0
+                batch.append(_record_row(document_ids[document], record))
+                counts[document] += 1
+                if len(batch) >= INSERT_BATCH_SIZE:
+                    self._insert(iter(batch))
+                    batch.clear()
+        self._insert(iter(batch))
+        return counts
+
+    def remove_document(self, document: str) -> bool:
+        row = self.conn.execute("SELECT id FROM documents WHERE path = ?", (document,)).fetchone()
+        if row is None:
+            return False
+        self.conn.execute("DELETE FROM annotations WHERE document_id = ?", (row[0],))
+        self.conn.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+        return True
+
+    def documents(self) -> List[str]:
+        return [row[0] for row in self.conn.execute("SELECT path FROM documents ORDER BY path")]
+
+    def _select(self,
+                document: Optional[str] = None,
+                page: Optional[int] = None,
+                type_code: Optional[Union[int, str]] = None,
+                author: Optional[str] = None,
+                since: Optional[Union[str, datetime]] = None,
+                until: Optional[Union[str, datetime]] = None,
+                limit: Optional[int] = None) -> Tuple[str, List[Any]]:
+        conditions: List[str] = []
+        params: List[Any] = []
+        if document is not None:
+            conditions.append(_document_condition(document))
+            params.append(document)
+        if page is not None:
+            conditions.append("a.page_num = ?")
+            params.append(page)
+        if type_code is not None:
+            conditions.append("a.type_code = ?")
+            params.append(type_code_for(type_code))
+        if author is not None:
+            conditions.append("a.author = ?")
+            params.append(author)
+        if since is not None:
+            conditions.append("a.modified >= ?")
+            params.append(_date_bound(since))
+        if until is not None:
+            conditions.append("a.modified < ?")
+            params.append(_date_bound(until))
+
+        sql = SELECT_ANNOTATIONS + " FROM annotations a JOIN documents d ON d.id = a.document_id"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY d.path, a.page_num, a.id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return sql, params
+
+    def query(self, **conditions: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Annotations matching all given conditions, ordered by document and page.
+
+        Conditions are document (may contain glob wildcards), page, type_code
+        (code or subtype name), author, since and until (bounds of the
+        modification date; strings are ISO 8601 dates or timestamps in UTC)
+        and limit.
+        """
+        sql, params = self._select(**conditions)
+        for row in self.conn.execute(sql, params):
+            yield _result(row)
+
+    def explain(self, **conditions: Any) -> List[str]:
+        """
+        SQLite's query plan for query(**conditions), to check index use.
+        """
+        sql, params = self._select(**conditions)
+        return [row[-1] for row in self.conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+    def search(self, text: str,
+               document: Optional[str] = None,
+               limit: int = 20,
+               raw: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Annotations whose comment or highlighted text contain all words of
+        text, best matches first.
+
+        The records have a score (BM25, lower is better) and a snippet with
+        the matches in [brackets]. With raw, text is passed to FTS5 as a query
+        expression, e.g. '"exact phrase" OR other'.
+        """
+        if self._search_error is not None:
+            raise StoreError(
+                _("Full-text search is not available, SQLite lacks FTS5: {error}").format(
+                    error=self._search_error
+                )
+            )
+        expression = text if raw else match_expression(text)
+        if not expression:
+            return
+        sql = (
+            SELECT_ANNOTATIONS + ", bm25(annotations_fts) AS score,"
+            " snippet(annotations_fts, -1, '[', ']', '...', ?)"
+            " FROM annotations_fts"
+            " JOIN annotations a ON a.id = annotations_fts.rowid"
+            " JOIN documents d ON d.id = a.document_id"
+            " WHERE annotations_fts MATCH ?"
+        )
+        params: List[Any] = [SNIPPET_WORDS, expression]
+        if document is not None:
+            sql += " AND " + _document_condition(document)
+            params.append(document)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+
+        try:
+            rows = self.conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            raise StoreError(_("Invalid search query: {error}").format(error=str(e)))
+        for row in rows:
+            record = _result(row[:-2])
+            record["score"] = row[-2]
+            record["snippet"] = row[-1]
+            yield record
+
+
+def _result(row: Row) -> Dict[str, Any]:
+    (document, page_num, page_label, type_code, x0, y0, x1, y1,
+     author, created, modified, content, highlighted_text) = row
+    return {
+        "document": document,
+        "page_num": page_num,
+        "page_label": page_label,
+        "type_code": type_code,
+        "subtype": subtype_name(type_code),
+        "rect": [x0, y0, x1, y1],
+        "author": author,
+        "created": created,
+        "modified": modified,
+        "content": content,
+        "highlighted_text": highlighted_text,
+    }
+
+
+def _extract_document(pdf_path: str, page_offset: int,
+                      language: str) -> Tuple[str, int, int, list]:
+    # Runs in a worker process.
+    from .pdf_utils import PDFProcessor
+    from .translations import translation_manager
+
+    translation_manager.change_language(language)
+    with PDFProcessor(pdf_path) as processor:
+        annotations = processor.extract_annotations(page_offset)
+        return pdf_path, processor.doc.page_count, processor.page_offset, annotations
+
+
+def is_jsonl_path(path: str) -> bool:
+    return path.lower().endswith((".jsonl", ".jsonl.gz", ".ndjson", ".ndjson.gz"))
+
+
+def import_sources(store: AnnotationStore, sources: Iterable[str],
+                   workers: Optional[int] = None,
+                   page_offset: int = -1) -> Dict[str, Union[int, str]]:
+    """
+    Import JSON Lines exports and PDF files into store.
+
+    PDFs are extracted in a process pool; the rows are written by the calling
+    process only, as SQLite allows one writer at a time. Returns the number of
+    annotations per document, or the error message for documents that failed,
+    keyed by document_path() like the stored documents.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    from .batch import collect_pdf_paths
+    from .translations import translation_manager
+
+    sources = list(sources)
+    results: Dict[str, Union[int, str]] = {}
+    for source in sources:
+        if is_jsonl_path(source):
+            try:
+                results.update(store.import_jsonl(source))
+            except (OSError, EOFError, ValueError, KeyError) as e:
+                results[document_path(source)] = str(e)
+
+    pdf_paths = [document_path(path) for path in
+                 collect_pdf_paths(source for source in sources if not is_jsonl_path(source))]
+    if pdf_paths:
+        language = translation_manager.get_current_language()
+        workers = workers or os.cpu_count() or 1
+        pending = iter(pdf_paths)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Only a few documents are in flight, and each is dropped once it
+            # is stored, so memory does not grow with the number of documents.
+            futures = {}
+            while True:
+                for path in islice(pending, IMPORTS_PER_WORKER * workers - len(futures)):
+                    futures[executor.submit(_extract_document, path, page_offset,
+                                            language)] = path
+                if not futures:
+                    break
+                done, _pending = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = futures.pop(future)
+                    try:
+                        _pdf_path, page_count, offset, annotations = future.result()
+                    except Exception as e:
+                        results[path] = str(e)
+                        continue
+                    results[path] = store.add_document(path, annotations, page_count, offset)
+    store.commit()
+    return results
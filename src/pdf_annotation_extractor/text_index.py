@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - Word-level spatial index
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+"""
+
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Height of an index band in points, a little more than one line of body text.
+BAND_HEIGHT = 16.0
+
+Rect = Tuple[float, float, float, float]
+
+
+def annotation_rects(annot) -> List[Rect]:
+    """
+    The areas covered by an annotation: one rect per quad for text markup
+    annotations, so multi-line highlights don't pick up neighbouring lines,
+    otherwise the annotation rect.
+    """
+    vertices = annot.vertices
+    if vertices and len(vertices) >= 4 and len(vertices) % 4 == 0:
+        rects = []
+        for index in range(0, len(vertices), 4):
+            xs = [point[0] for point in vertices[index:index + 4]]
+            ys = [point[1] for point in vertices[index:index + 4]]
+            rects.append((min(xs), min(ys), max(xs), max(ys)))
+        return rects
+    rect = annot.rect
+    return [(rect.x0, rect.y0, rect.x1, rect.y1)]
+
+
+class PageWordIndex:
+    """
+    Spatial index over the words of one page.
+
+    The words are extracted once per page and bucketed into horizontal bands
+    by their vertical centre. A lookup only looks at the bands touched by the
+    requested area instead of running a new text extraction for the whole
+    page.
+    """
+
+    def __init__(self, words: Sequence[tuple], band_height: float = BAND_HEIGHT):
+        self.words = words
+        self.band_height = band_height
+        self.bands: Dict[int, List[int]] = {}
+        for index, word in enumerate(words):
+            band = int((word[1] + word[3]) / 2 // band_height)
+            self.bands.setdefault(band, []).append(index)
+
+    @classmethod
+    def from_page(cls, page) -> "PageWordIndex":
+        return cls(page.get_text("words"))
+
+    def words_in(self, rect: Rect) -> List[int]:
+        """
+        Indices of the words inside rect.
+
+        A word counts as inside if its vertical centre lies in the rect and at
+        least half of its width is covered.
+        """
+        x0, y0, x1, y1 = rect
+        words = self.words
+        found = []
+        for band in range(int(y0 // self.band_height), int(y1 // self.band_height) + 1):
+            for index in self.bands.get(band, ()):
+                wx0, wy0, wx1, wy1 = words[index][:4]
+                if not y0 <= (wy0 + wy1) / 2 <= y1:
+                    continue
+                overlap = min(x1, wx1) - max(x0, wx0)
+                if overlap > 0 and overlap * 2 >= wx1 - wx0:
+                    found.append(index)
+        return found
+
+    def text_in(self, rects: Iterable[Rect]) -> str:
+        """
+        The text of the words inside any of rects in reading order, one line
+        of text per output line.
+        """
+        indices = set()
+        for rect in rects:
+            indices.update(self.words_in(rect))
+
+        lines: List[str] = []
+        current_line = None
+        # Words are (x0, y0, x1, y1, text, block_no, line_no, word_no)
+        for word in sorted((self.words[index] for index in indices),
+                           key=lambda word: (word[5], word[6], word[7])):
+            line = (word[5], word[6])
+            if line != current_line:
+                lines.append(word[4])
+                current_line = line
+            else:
+                lines[-1] += " " + word[4]
+        return "\n".join(lines)
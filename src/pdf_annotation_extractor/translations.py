@@ -1,14 +1,11 @@
 import os
-import gettext
-import locale
-from typing import Callable, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 
-# Platzhalter-_ für die Extraktion durch Babel/xgettext
-try:
-    from gettext import gettext as _  # type: ignore
-except ImportError:
-    def _(message: str) -> str:
-        return message
+
+# Platzhalter-_ für die Extraktion durch Babel/xgettext. gettext und locale
+# werden erst beim Laden eines Katalogs importiert.
+def _(message: str) -> str:
+    return message
 
 
 SEARCH_PATHS = [
@@ -19,16 +16,22 @@ SEARCH_PATHS = [
     os.path.join(os.environ.get('FLATPAK_APP_DIR', '/app'), 'share', 'pdf-annotation-extractor', 'locale')
 ]
 
-LOCALE_DIR = ""
-for path in SEARCH_PATHS:
-    if os.path.isdir(path):
-        LOCALE_DIR = path
-        break
+_locale_dir: Optional[str] = None
+
 
-if not LOCALE_DIR:
-    # Fallback mit einer Warnung, falls nichts gefunden wird
-    print("Warning: Locale directory not found. Falling back to default.")
-    LOCALE_DIR = os.path.join(os.path.dirname(__file__), "locale")
+def get_locale_dir() -> str:
+    # Wird erst beim ersten Laden eines Katalogs gesucht, nicht beim Import.
+    global _locale_dir
+    if _locale_dir is None:
+        for path in SEARCH_PATHS:
+            if os.path.isdir(path):
+                _locale_dir = path
+                break
+        else:
+            # Fallback mit einer Warnung, falls nichts gefunden wird
+            print("Warning: Locale directory not found. Falling back to default.")
+            _locale_dir = os.path.join(os.path.dirname(__file__), "locale")
+    return _locale_dir
 
 LANGUAGES: Dict[str, str] = {
     "en": "English",
@@ -61,6 +64,8 @@ DEFAULT_MESSAGES: Dict[str, str] = {
     "status_processing": _("Processing..."),
     "status_done": _("Done!"),
     "status_error": _("Error: {}"),
+    "status_cancelled": _("Cancelled"),
+    "cancel": _("Cancel"),
     "select_file": _("Select File"),
     "extract_comments": _("Extract Comments"),
     "save_comments": _("Save Comments"),
@@ -69,7 +74,53 @@ DEFAULT_MESSAGES: Dict[str, str] = {
     "all_files": _("All Files"),
 }
 
-MESSAGES: Dict[str, str] = DEFAULT_MESSAGES.copy()
+# Geladene Kataloge je Sprache: msgid -> Übersetzung
+_catalogs: Dict[str, Dict[str, str]] = {}
+_messages: Dict[str, Dict[str, str]] = {}
+
+
+def get_catalog(language: str) -> Dict[str, str]:
+    """
+    The translations of a language as a plain dict, loaded on first use.
+
+    Messages missing from the catalog are not in the dict; look them up with
+    catalog.get(message, message).
+    """
+    catalog = _catalogs.get(language)
+    if catalog is None:
+        import gettext
+
+        translation = gettext.translation(
+            "messages",
+            localedir=get_locale_dir(),
+            languages=[language],
+            fallback=True,
+        )
+        catalog = {
+            msgid: msgstr
+            for msgid, msgstr in getattr(translation, "_catalog", {}).items()
+            # Ohne Header ("") und Pluralformen (Tupel als Schlüssel)
+            if isinstance(msgid, str) and msgid and msgstr
+        }
+        _catalogs[language] = catalog
+    return catalog
+
+
+def translator(language: str) -> Callable[[str], str]:
+    """
+    A gettext function bound to one language, independent of the current language.
+    """
+    lookup = get_catalog(language).get
+    return lambda message: lookup(message, message)
+
+
+def __getattr__(name: str) -> Any:
+    # MESSAGES wird bei jedem Zugriff für die aktuelle Sprache geliefert.
+    if name == "MESSAGES":
+        return translation_manager.get_messages()
+    if name == "LOCALE_DIR":
+        return get_locale_dir()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class TranslationManager:
@@ -83,40 +134,47 @@ class TranslationManager:
 
     def __init__(self) -> None:
         if not getattr(self, "_initialized", False):
-            self.current_language: str = "en"
+            self._language: Optional[str] = None
             self.observers: List[Callable[[], None]] = []
-            self._translator: Callable[[str], str] = gettext.gettext
-            self._initialize_translations()
+            self._lookup: Callable[[str, str], str] = self._load_and_lookup
             self._initialized = True  # type: ignore[attr-defined]
 
-    def _initialize_translations(self) -> None:
+    @staticmethod
+    def _system_language() -> str:
+        import locale
+
         try:
             system_language, _ = locale.getdefaultlocale()
             if system_language:
                 candidate = system_language.split("_")[0]
                 if candidate in LANGUAGES:
-                    self.current_language = candidate
+                    return candidate
         except Exception:
             pass
+        return "en"
 
-        self._setup_translation()
-        self._update_messages()
+    @property
+    def current_language(self) -> str:
+        if self._language is None:
+            self._language = self._system_language()
+        return self._language
 
-    def _setup_translation(self) -> None:
-        translation = gettext.translation(
-            "messages",
-            localedir=LOCALE_DIR,
-            languages=[self.current_language],
-            fallback=True,
-        )
-        self._translator = translation.gettext
+    def _load_and_lookup(self, message: str, default: str) -> str:
+        # Erster Aufruf: Katalog laden, danach ist _lookup direkt dict.get.
+        self._lookup = get_catalog(self.current_language).get
+        return self._lookup(message, default)
 
     def gettext(self, message: str) -> str:
-        return self._translator(message)
+        return self._lookup(message, message)
 
-    def _update_messages(self) -> None:
-        global MESSAGES
-        MESSAGES = {key: self.gettext(value) for key, value in DEFAULT_MESSAGES.items()}
+    def get_messages(self) -> Dict[str, str]:
+        language = self.current_language
+        messages = _messages.get(language)
+        if messages is None:
+            translate = translator(language)
+            messages = {key: translate(value) for key, value in DEFAULT_MESSAGES.items()}
+            _messages[language] = messages
+        return messages
 
     def get_available_languages(self) -> Dict[str, str]:
         return LANGUAGES
@@ -126,9 +184,9 @@ class TranslationManager:
 
     def change_language(self, language_code: str) -> None:
         if language_code in LANGUAGES and language_code != self.current_language:
-            self.current_language = language_code
-            self._setup_translation()
-            self._update_messages()
+            self._language = language_code
+            # Bereits geladene Kataloge werden wiederverwendet.
+            self._lookup = get_catalog(language_code).get
             self._notify_observers()
 
     def add_observer(self, callback: Callable[[], None]) -> None:
@@ -148,4 +206,4 @@ translation_manager = TranslationManager()
 
 
 def _(message: str) -> str:
-    return translation_manager.gettext(message)
\ No newline at end of file
+    return translation_manager._lookup(message, message)
\ No newline at end of file
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+PDF Annotation Extractor - Watch folders
+Copyright (C) 2024 Engin Karahan - https://karahan.net
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .batch import BatchResult, _is_pdf, _output_path_for, process_file
+from .export import DEFAULT_FORMAT
+from .translations import _
+
+# Seconds a file must stay unchanged before it is extracted
+DEFAULT_SETTLE = 2.0
+DEFAULT_POLL_INTERVAL = 2.0
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+def scan_pdfs(directories: Iterable[str]) -> Iterator[Tuple[str, os.stat_result]]:
+    """
+    Yield every PDF below the directories with its stat result.
+    """
+    stack = list(directories)
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif _is_pdf(entry.name) and entry.is_file():
+                    yield os.path.normpath(entry.path), entry.stat()
+            except OSError:
+                continue
+
+
+class PollingWatcher:
+    """
+    Finds new and modified PDFs by comparing size and modification time
+    with the previous scan. Works everywhere, but every poll walks the tree.
+    """
+
+    def __init__(self, directories: List[str], interval: float = DEFAULT_POLL_INTERVAL):
+        self.directories = directories
+        self.interval = interval
+        self._known = {path: (stat.st_size, stat.st_mtime_ns)
+                       for path, stat in scan_pdfs(directories)}
+        self._next_poll = time.monotonic() + interval
+
+    def read(self, timeout: float) -> List[str]:
+        delay = self._next_poll - time.monotonic()
+        if delay > timeout:
+            time.sleep(max(0.0, timeout))
+            return []
+        time.sleep(max(0.0, delay))
+        self._next_poll = time.monotonic() + self.interval
+
+        changed = []
+        known = {}
+        for path, stat in scan_pdfs(self.directories):
+            known[path] = (stat.st_size, stat.st_mtime_ns)
+            if self._known.get(path) != known[path]:
+                changed.append(path)
+        self._known = known
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """
+    Linux inotify through ctypes. Only the directories that report an event
+    are looked at; new subdirectories are watched as they appear.
+    """
+
+    def __init__(self, directories: List[str]):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self.directories = directories
+        self._watches: Dict[int, str] = {}
+        try:
+            for directory in directories:
+                self._add_tree(directory)
+        except OSError:
+            self.close()
+            raise
+
+    @staticmethod
+    def available() -> bool:
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6")
+            return hasattr(libc, "inotify_init1")
+        except OSError:
+            return False
+
+    def _add_watch(self, directory: str) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()), directory)
+        self._watches[wd] = directory
+
+    def _add_tree(self, directory: str) -> List[str]:
+        # Returns the PDFs that are already in the tree, e.g. in a directory
+        # that was moved in as a whole.
+        found = []
+        for root, dirs, files in os.walk(directory):
+            self._add_watch(root)
+            found.extend(os.path.normpath(os.path.join(root, name))
+                         for name in files if _is_pdf(name))
+        return found
+
+    def read(self, timeout: float) -> List[str]:
+        ready, _write, _error = select.select([self._fd], [], [], max(0.0, timeout))
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        changed = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost: fall back to a full scan once.
+                changed.extend(path for path, _stat in scan_pdfs(self.directories))
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    changed.extend(self._add_tree(path))
+            elif _is_pdf(name):
+                changed.append(os.path.normpath(path))
+        return changed
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def _init_worker() -> None:
+    # The command line turns SIGTERM into KeyboardInterrupt; workers keep the
+    # default and leave Ctrl-C to the parent, which lets running files finish.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _start_pool(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+
+
+def create_watcher(directories: List[str], polling: bool = False,
+                   poll_interval: float = DEFAULT_POLL_INTERVAL):
+    if not polling and InotifyWatcher.available():
+        try:
+            return InotifyWatcher(directories)
+        except OSError:
+            # E.g. the inotify watch limit is reached.
+            pass
+    return PollingWatcher(directories, poll_interval)
+
+
+def _stat_key(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def outdated_pdfs(directories: Iterable[str], output_dir: Optional[str] = None,
+                  output_format: str = DEFAULT_FORMAT, compress: bool = False) -> List[str]:
+    """
+    PDFs whose export is missing or older than the PDF.
+    """
+    outdated = []
+    for path, stat in scan_pdfs(directories):
+        output = _stat_key(_output_path_for(path, output_dir, output_format, compress))
+        if output is None or output[1] < stat.st_mtime_ns:
+            outdated.append(path)
+    return outdated
+
+
+def watch(directories: List[str],
+          workers: Optional[int] = None,
+          page_offset: int = -1,
+          output_dir: Optional[str] = None,
+          output_format: str = DEFAULT_FORMAT,
+          compress: bool = False,
+          result_callback: Optional[Callable[[BatchResult], None]] = None,
+          settle: float = DEFAULT_SETTLE,
+          polling: bool = False,
+          poll_interval: float = DEFAULT_POLL_INTERVAL,
+          stop_event: Optional[threading.Event] = None) -> None:
+    """
+    Extract new and modified PDFs below the directories until stop_event is set.
+
+    A file is extracted once it has not changed for settle seconds, so files
+    that are still being written are not picked up half-way. At most workers
+    files are processed at a time; changes to files that are waiting or
+    being processed are coalesced, and a file that changes while it is being
+    extracted is extracted again afterwards. Extraction is incremental (see
+    extract_incremental()), so only pages with changed annotations are read
+    again. Exports that are missing or older than their PDF are brought up
+    to date at start.
+
+    If a worker dies, the files that were running are extracted again one
+    at a time, so that only the file that crashes it is reported as failed.
+    """
+    workers = workers or os.cpu_count() or 1
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    watcher = create_watcher(directories, polling, poll_interval)
+
+    # path -> (time at which it may be extracted, stat at the last change)
+    waiting: Dict[str, Tuple[float, Optional[Tuple[int, int]]]] = {}
+    running: Dict[Future, str] = {}
+    changed_while_running: Set[str] = set()
+    # Files that were running when a worker died; each runs alone until it
+    # is known whether it is the cause.
+    suspects: Set[str] = set()
+
+    def changed(path: str, now: float) -> None:
+        if path in running.values():
+            changed_while_running.add(path)
+        else:
+            waiting[path] = (now + settle, _stat_key(path))
+
+    now = time.monotonic()
+    for path in outdated_pdfs(directories, output_dir, output_format, compress):
+        waiting[path] = (now, _stat_key(path))
+
+    executor = _start_pool(workers)
+    try:
+        while stop_event is None or not stop_event.is_set():
+            now = time.monotonic()
+            # Set when no waiting file can start before a running one is done
+            blocked = False
+            for path, (due, stat) in sorted(waiting.items(), key=lambda item: item[1][0]):
+                if len(running) >= workers or suspects.intersection(running.values()):
+                    blocked = True
+                    break
+                if due > now:
+                    continue
+                if path in suspects and running:
+                    # Wait until it can run alone.
+                    blocked = True
+                    break
+                current = _stat_key(path)
+                if current is None:
+                    # Deleted or renamed before it settled
+                    del waiting[path]
+                    suspects.discard(path)
+                elif current != stat:
+                    waiting[path] = (now + settle, current)
+                else:
+                    del waiting[path]
+                    future = executor.submit(process_file, path, page_offset, output_dir,
+                                             None, True, output_format, compress)
+                    running[future] = path
+                    if path in suspects:
+                        blocked = True
+                        break
+
+            if running:
+                done, _pending = wait(list(running), timeout=0)
+                crashed: List[str] = []
+                for future in done:
+                    path = running.pop(future)
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        crashed.append(path)
+                        continue
+                    suspects.discard(path)
+                    if result_callback:
+                        result_callback(result)
+                    if path in changed_while_running:
+                        changed_while_running.discard(path)
+                        changed(path, now)
+
+                if crashed:
+                    # A crash inside MuPDF takes the pool down with every file
+                    # that was running; start a new one.
+                    crashed.extend(running.values())
+                    running.clear()
+                    executor.shutdown(wait=False)
+                    executor = _start_pool(workers)
+                    if len(crashed) == 1:
+                        path = crashed[0]
+                        suspects.discard(path)
+                        if result_callback:
+                            result_callback(BatchResult(
+                                path, error=_("The worker process terminated unexpectedly")))
+                        if path in changed_while_running:
+                            changed_while_running.discard(path)
+                            changed(path, now)
+                    else:
+                        for path in crashed:
+                            suspects.add(path)
+                            changed_while_running.discard(path)
+                            waiting[path] = (now, _stat_key(path))
+
+            # Sleep until the next file is due, or until an event arrives.
+            timeout = poll_interval if not running else 0.1
+            if waiting and not blocked and len(running) < workers:
+                timeout = min(timeout, max(0.0, min(due for due, _stat in waiting.values())
+                                           - now))
+            for path in watcher.read(timeout):
+                changed(path, time.monotonic())
+    finally:
+        watcher.close()
+        executor.shutdown(wait=True)
@@ -0,0 +1,120 @@
+"""
+AsyncExtractor: results match the synchronous extraction, every progress
+event reaches the job before it is done, and cancelled jobs stop.
+"""
+
+import asyncio
+import io
+import os
+
+import pytest
+
+from benchmarks.corpus import make_document
+from pdf_annotation_extractor.aio import AsyncExtractor, aextract, aextract_many
+from pdf_annotation_extractor.pdf_utils import PDFProcessingError, PDFProcessor
+from pdf_annotation_extractor.progress import STAGE_OFFSET, STAGE_PAGES
+
+
+@pytest.fixture(scope="module")
+def pdf_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("aio") / "doc.pdf")
+    make_document(path, pages=40, lines=20, annotations=1)
+    return path
+
+
+@pytest.fixture(scope="module")
+def expected(pdf_path, tmp_path_factory):
+    output_path = str(tmp_path_factory.mktemp("aio_expected") / "doc.jsonl")
+    with PDFProcessor(pdf_path) as processor:
+        processor.write_annotations(output_path, output_format="jsonl")
+        count = processor.annotation_count
+    with open(output_path, encoding="utf-8") as f:
+        return f.read(), count
+
+
+def read(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("processes", [True, False], ids=["processes", "threads"])
+def test_progress_is_delivered(pdf_path, expected, tmp_path, processes):
+    text, count = expected
+    output_path = str(tmp_path / "doc.jsonl")
+
+    async def run():
+        async with AsyncExtractor(max_concurrency=2, processes=processes) as extractor:
+            job = extractor.start(pdf_path, output=output_path, output_format="jsonl")
+            events = [event async for event in job]
+            return events, await job
+
+    events, result = asyncio.run(run())
+    assert result == output_path
+    assert read(output_path) == text
+
+    assert events[0].stage == STAGE_OFFSET
+    pages = [event for event in events if event.stage == STAGE_PAGES]
+    assert pages[0].current == 0
+    last = pages[-1]
+    assert last is events[-1]
+    assert last.current == last.total > 0
+    assert last.annotations == count
+    assert last.page_count == 40
+    assert [event.current for event in pages] == sorted(event.current for event in pages)
+
+
+def test_stream_output(pdf_path, expected):
+    text, _count = expected
+
+    async def run():
+        async with AsyncExtractor(max_concurrency=1) as extractor:
+            binary, textual = io.BytesIO(), io.StringIO()
+            await extractor.aextract(pdf_path, output=binary, output_format="jsonl")
+            with open(pdf_path, "rb") as f:
+                pdf_bytes = f.read()
+            await extractor.aextract(io.BytesIO(pdf_bytes), output=textual,
+                                     output_format="jsonl")
+            return binary.getvalue().decode("utf-8"), textual.getvalue()
+
+    from_path, from_bytes = asyncio.run(run())
+    assert from_path == text
+    assert from_bytes == text.replace(pdf_path, "document.pdf")
+
+
+def test_extract_many(pdf_path, expected, tmp_path):
+    text, _count = expected
+    outputs = [str(tmp_path / f"{index}.jsonl") for index in range(3)]
+    missing = str(tmp_path / "missing.pdf")
+
+    async def run():
+        async with AsyncExtractor(max_concurrency=2, processes=False) as extractor:
+            return await aextract_many([pdf_path, missing, pdf_path], output_format="jsonl",
+                                       outputs=outputs, extractor=extractor,
+                                       return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert results[0] == outputs[0] and results[2] == outputs[2]
+    assert isinstance(results[1], PDFProcessingError)
+    assert read(outputs[0]) == read(outputs[2]) == text
+
+
+def test_cancel_stops_the_extraction(tmp_path):
+    pdf_path = str(tmp_path / "large.pdf")
+    make_document(pdf_path, pages=400, lines=10, annotations=2)
+    output_path = str(tmp_path / "large.md")
+
+    async def run():
+        async with AsyncExtractor(max_concurrency=1) as extractor:
+            job = extractor.start(pdf_path, output=output_path)
+            async for event in job:
+                if event.stage == STAGE_PAGES:
+                    job.cancel()
+                    break
+            with pytest.raises(asyncio.CancelledError):
+                await job
+            # The slot is free again once the worker has stopped.
+            return await aextract(pdf_path, output=io.StringIO(), extractor=extractor)
+
+    output = asyncio.run(run())
+    assert not os.path.exists(output_path)
+    assert output.getvalue()
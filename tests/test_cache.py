@@ -0,0 +1,159 @@
+"""
+ExtractionCache: a hit writes the same export as a fresh extraction, least
+recently used entries are evicted, and entries of other format versions,
+options or file contents are never used.
+"""
+
+import os
+import time
+
+import pytest
+
+from benchmarks.corpus import make_document
+from pdf_annotation_extractor import cache as cache_module
+from pdf_annotation_extractor.cache import ExtractionCache, STALE_TEMP_AGE
+from pdf_annotation_extractor.filters import AnnotationFilter
+from pdf_annotation_extractor.pdf_utils import PDFProcessor
+
+EXPORT_DATE = "**Date:** "
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = str(tmp_path / "doc.pdf")
+    make_document(path, pages=8, lines=20, annotations=2)
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ExtractionCache(str(tmp_path / "cache"))
+
+
+def read_export(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines(keepends=True)
+    # The Markdown header holds the time of the export.
+    for index, line in enumerate(lines):
+        if line.startswith(EXPORT_DATE):
+            del lines[index]
+            break
+    return "".join(lines)
+
+
+def fresh_export(pdf_path, output_path, output_format, annotation_filter=None):
+    with PDFProcessor(pdf_path, annotation_filter=annotation_filter) as processor:
+        processor.write_annotations(output_path, output_format=output_format)
+    return read_export(output_path)
+
+
+@pytest.mark.parametrize("output_format", ["markdown", "jsonl"])
+def test_hit_matches_fresh_extraction(pdf_path, cache, tmp_path, output_format):
+    expected = fresh_export(pdf_path, str(tmp_path / "fresh"), output_format)
+
+    miss_path, miss_count = cache.extract_and_save(pdf_path, str(tmp_path / "miss"),
+                                                   output_format=output_format)
+    hit_path, hit_count = cache.extract_and_save(pdf_path, str(tmp_path / "hit"),
+                                                 output_format=output_format)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert read_export(miss_path) == expected
+    assert read_export(hit_path) == expected
+    assert hit_count == miss_count
+
+
+def test_one_entry_serves_all_formats(pdf_path, cache, tmp_path):
+    cache.extract_and_save(pdf_path, str(tmp_path / "first.md"))
+    cache.extract_and_save(pdf_path, str(tmp_path / "second.jsonl"), output_format="jsonl")
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_filters_have_their_own_entries(pdf_path, cache, tmp_path):
+    annotation_filter = AnnotationFilter(types=["Highlight"])
+    expected = fresh_export(pdf_path, str(tmp_path / "fresh"), "jsonl", annotation_filter)
+
+    cache.extract_and_save(pdf_path, str(tmp_path / "all"), output_format="jsonl")
+    for name in ("miss", "hit"):
+        output_path, _count = cache.extract_and_save(pdf_path, str(tmp_path / name),
+                                                     output_format="jsonl",
+                                                     annotation_filter=annotation_filter)
+        assert read_export(output_path) == expected
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_changed_file_misses(pdf_path, cache, tmp_path):
+    output_path = str(tmp_path / "out.jsonl")
+    cache.extract_and_save(pdf_path, output_path, output_format="jsonl")
+    make_document(pdf_path, pages=8, lines=20, annotations=2, seed=2)
+    cache.extract_and_save(pdf_path, output_path, output_format="jsonl")
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert read_export(output_path) == fresh_export(pdf_path, str(tmp_path / "fresh"), "jsonl")
+
+
+def test_version_bump_misses(pdf_path, cache, tmp_path, monkeypatch):
+    output_path = str(tmp_path / "out.jsonl")
+    cache.extract_and_save(pdf_path, output_path, output_format="jsonl")
+    monkeypatch.setattr(cache_module, "CACHE_FORMAT_VERSION",
+                        cache_module.CACHE_FORMAT_VERSION + 1)
+    cache.extract_and_save(pdf_path, output_path, output_format="jsonl")
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_corrupt_entry_is_extracted_again(pdf_path, cache, tmp_path):
+    output_path = str(tmp_path / "out.jsonl")
+    cache.extract_and_save(pdf_path, output_path, output_format="jsonl")
+    expected = read_export(output_path)
+    key = cache.key(pdf_path, page_offset=-1)
+    with open(cache._entry_path(key), "w", encoding="utf-8") as f:
+        f.write('{"page_count": ')
+
+    cache.extract_and_save(pdf_path, output_path, output_format="jsonl")
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert read_export(output_path) == expected
+    assert cache.get(key) is not None
+
+
+def age(cache, key, seconds):
+    then = time.time() - seconds
+    os.utime(cache._entry_path(key), (then, then))
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    entry = {"data": "x" * 1000}
+    cache.max_bytes = 2500
+    cache.put("aa1", entry)
+    cache.put("bb2", entry)
+    age(cache, "aa1", 200)
+    age(cache, "bb2", 300)
+    # A hit makes bb2 the most recently used entry.
+    assert cache.get("bb2") == entry
+
+    cache.put("cc3", entry)
+    assert cache.get("aa1") is None
+    assert cache.get("bb2") == entry
+    assert cache.get("cc3") == entry
+    assert cache.size() <= cache.max_bytes
+
+
+def test_evict_removes_stale_temporary_files(cache):
+    cache.put("aa1", {"data": "x"})
+    shard = os.path.join(cache.directory, "aa")
+    stale = os.path.join(shard, "stale.tmp")
+    writing = os.path.join(shard, "writing.tmp")
+    for path in (stale, writing):
+        with open(path, "w") as f:
+            f.write("{")
+    then = time.time() - STALE_TEMP_AGE - 60
+    os.utime(stale, (then, then))
+
+    assert cache.evict() == 1
+    assert not os.path.exists(stale)
+    assert os.path.exists(writing)
+    assert cache.get("aa1") == {"data": "x"}
+
+
+def test_purge(pdf_path, cache, tmp_path):
+    cache.extract_and_save(pdf_path, str(tmp_path / "out.md"))
+    assert cache.purge() == 1
+    assert cache.size() == 0
+    cache.extract_and_save(pdf_path, str(tmp_path / "out.md"))
+    assert cache.misses == 2
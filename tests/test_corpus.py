@@ -0,0 +1,48 @@
+"""
+The synthetic corpus of the benchmarks: documents depend only on their
+parameters and seed, and contain what make_document() reports.
+"""
+
+import fitz
+
+from benchmarks.corpus import make_document, parse_mix
+
+
+def describe(path: str):
+    # Everything but the file's random /ID
+    with fitz.open(path) as doc:
+        return [
+            (page.get_text(), [(annot.type[1], tuple(annot.rect), annot.info["title"],
+                                annot.info["content"], annot.info["modDate"])
+                               for annot in page.annots()])
+            for page in doc
+        ]
+
+
+def test_same_seed_same_document(tmp_path):
+    paths = [str(tmp_path / f"{name}.pdf") for name in ("a", "b", "c")]
+    make_document(paths[0], pages=6, seed=3)
+    make_document(paths[1], pages=6, seed=3)
+    make_document(paths[2], pages=6, seed=4)
+    assert describe(paths[0]) == describe(paths[1])
+    assert describe(paths[0]) != describe(paths[2])
+
+
+def test_reported_annotations(tmp_path):
+    path = str(tmp_path / "doc.pdf")
+    count = make_document(path, pages=20, lines=10, annotations=1.5,
+                          mix=parse_mix("highlight=1,ink=1"), front_matter=3)
+    pages = describe(path)
+    kinds = [kind for _text, annots in pages for kind, *_info in annots]
+    assert len(kinds) == count
+    assert 20 <= count <= 40
+    assert set(kinds) == {"Highlight", "Ink"}
+    # Printed page numbers start after the front matter.
+    assert [text.split()[-1] for text, _annots in pages[3:6]] == ["1", "2", "3"]
+
+
+def test_no_annotations(tmp_path):
+    path = str(tmp_path / "doc.pdf")
+    assert make_document(path, pages=3, annotations=0) == 0
+    assert make_document(path, pages=3, mix={}) == 0
+    assert all(annots == [] for _text, annots in describe(path))
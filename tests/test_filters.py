@@ -0,0 +1,69 @@
+"""
+A filtered extraction must give the same annotations as filtering the
+result of an unfiltered one.
+"""
+
+import pytest
+
+from benchmarks.corpus import make_document
+from pdf_annotation_extractor.filters import AnnotationFilter, parse_page_range
+from pdf_annotation_extractor.pdf_utils import PDFProcessor
+
+FILTERS = {
+    "pages": dict(pages=parse_page_range("4-9")),
+    "open_page_range": dict(pages=parse_page_range("20-")),
+    "type": dict(types=["Highlight"]),
+    "types": dict(types=["Underline", 15]),
+    "author": dict(author="^Bob"),
+    "dates": dict(since="2024-03-01", until="2024-07-01"),
+    "combined": dict(types=["Highlight", "Text"], pages=parse_page_range("3-18"),
+                     author="Carol|Alice", since="2024-05-01"),
+    "no_match": dict(author="^Nobody$"),
+}
+
+
+@pytest.fixture(scope="module")
+def pdf_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("filters") / "doc.pdf")
+    make_document(path, pages=24, lines=20, annotations=1.5)
+    return path
+
+
+@pytest.fixture(scope="module")
+def all_annotations(pdf_path):
+    with PDFProcessor(pdf_path) as processor:
+        return list(processor.iter_annotations())
+
+
+def post_filter(annotations, annotation_filter):
+    pages = annotation_filter.page_range(10 ** 6)
+    return [annotation for annotation in annotations
+            if annotation.page_num - 1 in pages
+            and annotation_filter.accepts(annotation.type_code, annotation.title,
+                                          annotation.modified_date)]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("options", FILTERS.values(), ids=list(FILTERS))
+def test_pushdown_matches_post_filtering(pdf_path, all_annotations, options, workers):
+    annotation_filter = AnnotationFilter(**options)
+    with PDFProcessor(pdf_path, annotation_filter=annotation_filter) as processor:
+        filtered = list(processor.iter_annotations(workers=workers))
+    assert filtered == post_filter(all_annotations, annotation_filter)
+
+
+def test_filters_are_not_trivial(all_annotations):
+    # Every filter above except no_match keeps some annotations and drops others.
+    for name, options in FILTERS.items():
+        kept = post_filter(all_annotations, AnnotationFilter(**options))
+        if name == "no_match":
+            assert kept == []
+        else:
+            assert 0 < len(kept) < len(all_annotations), name
+
+
+def test_page_range_skips_pages(pdf_path):
+    annotation_filter = AnnotationFilter(pages=parse_page_range("4-9"))
+    with PDFProcessor(pdf_path, annotation_filter=annotation_filter) as processor:
+        list(processor.iter_annotations())
+        assert processor.stats.counters["pages_loaded"] <= 6
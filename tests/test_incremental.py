@@ -0,0 +1,102 @@
+"""
+extract_incremental() must produce the same export as a full extraction
+after every kind of change to the PDF.
+"""
+
+import shutil
+
+import fitz
+import pytest
+
+from benchmarks.corpus import make_document
+from pdf_annotation_extractor.incremental import extract_incremental
+from pdf_annotation_extractor.pdf_utils import PDFProcessor
+
+FORMAT = "jsonl"
+
+
+def full_export(pdf_path: str, output_path: str) -> str:
+    with PDFProcessor(pdf_path) as processor:
+        processor.write_annotations(output_path, output_format=FORMAT)
+    with open(output_path, encoding="utf-8") as f:
+        return f.read()
+
+
+def incremental_export(pdf_path: str, output_path: str):
+    _output, count, pages = extract_incremental(pdf_path, output_path, output_format=FORMAT)
+    with open(output_path, encoding="utf-8") as f:
+        return f.read(), count, pages
+
+
+def annotated_page(doc) -> int:
+    return next(page.number for page in doc if page.first_annot is not None)
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = str(tmp_path / "doc.pdf")
+    make_document(path, pages=12, lines=20, annotations=2)
+    return path
+
+
+@pytest.fixture
+def exported(pdf_path, tmp_path):
+    # The first run extracts everything and writes the state file.
+    output_path = str(tmp_path / "doc.jsonl")
+    text, count, pages = incremental_export(pdf_path, output_path)
+    assert text == full_export(pdf_path, str(tmp_path / "full.jsonl"))
+    assert count == len(text.splitlines())
+    assert pages
+    return output_path
+
+
+def test_unchanged_document_is_not_extracted_again(pdf_path, exported, tmp_path):
+    text, _count, pages = incremental_export(pdf_path, exported)
+    assert pages == []
+    assert text == full_export(pdf_path, str(tmp_path / "full.jsonl"))
+
+
+def test_incremental_save(pdf_path, exported, tmp_path):
+    doc = fitz.open(pdf_path)
+    page_num = annotated_page(doc)
+    page = doc[page_num]
+    annot = page.first_annot
+    annot.set_info(content="Changed comment", modDate="D:20250101120000Z")
+    annot.update()
+    doc.saveIncr()
+    doc.close()
+
+    text, _count, pages = incremental_export(pdf_path, exported)
+    assert pages == [page_num]
+    assert "Changed comment" in text
+    assert text == full_export(pdf_path, str(tmp_path / "full.jsonl"))
+
+
+def test_deleted_annotation(pdf_path, exported, tmp_path):
+    doc = fitz.open(pdf_path)
+    page_num = annotated_page(doc)
+    page = doc[page_num]
+    page.delete_annot(page.first_annot)
+    doc.saveIncr()
+    doc.close()
+
+    before = full_export(pdf_path, str(tmp_path / "full.jsonl"))
+    text, count, pages = incremental_export(pdf_path, exported)
+    assert pages == [page_num]
+    assert text == before
+    assert count == len(before.splitlines())
+
+
+def test_full_rewrite(pdf_path, exported, tmp_path):
+    # A full save renumbers the objects, so nothing of the old file is kept.
+    doc = fitz.open(pdf_path)
+    page = doc[annotated_page(doc)]
+    page.add_text_annot((20, 20), "New note")
+    rewritten = str(tmp_path / "rewritten.pdf")
+    doc.save(rewritten, garbage=4, deflate=True)
+    doc.close()
+    shutil.move(rewritten, pdf_path)
+
+    text, _count, _pages = incremental_export(pdf_path, exported)
+    assert "New note" in text
+    assert text == full_export(pdf_path, str(tmp_path / "full.jsonl"))
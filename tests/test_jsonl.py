@@ -0,0 +1,108 @@
+"""
+JSON Lines exports: every record reads back to the values of its
+annotation, independent of the language, compressed or not.
+"""
+
+import gzip
+import io
+import json
+
+import pytest
+
+from benchmarks.corpus import make_document
+from pdf_annotation_extractor.dates import parse_iso_date, parse_pdf_date
+from pdf_annotation_extractor.jsonl import JsonLinesWriter, subtype_name
+from pdf_annotation_extractor.pdf_utils import PDFAnnotation, PDFProcessor
+from pdf_annotation_extractor.translations import translation_manager
+
+
+@pytest.fixture(scope="module")
+def pdf_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("jsonl") / "doc.pdf")
+    make_document(path, pages=8, lines=20, annotations=3)
+    return path
+
+
+@pytest.fixture(scope="module")
+def annotations(pdf_path):
+    with PDFProcessor(pdf_path) as processor:
+        return list(processor.iter_annotations())
+
+
+def read_records(path: str):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def export(pdf_path: str, output_path: str) -> str:
+    with PDFProcessor(pdf_path) as processor:
+        processor.write_annotations(output_path, output_format="jsonl")
+    return output_path
+
+
+def assert_round_trip(records, annotations, document):
+    assert len(records) == len(annotations)
+    for record, annotation in zip(records, annotations):
+        assert record["document"] == document
+        assert record["page_num"] == annotation.page_num
+        assert record["page_label"] == annotation.page_label
+        assert record["type_code"] == annotation.type_code
+        assert record["subtype"] == subtype_name(annotation.type_code)
+        assert tuple(record["rect"]) == annotation.rect
+        assert record["author"] == annotation.title
+        assert parse_iso_date(record["created"]) == parse_pdf_date(annotation.creation_date)
+        assert parse_iso_date(record["modified"]) == parse_pdf_date(annotation.modified_date)
+        assert record["content"] == annotation.content
+        assert record["highlighted_text"] == annotation.highlighted_text
+
+
+def test_round_trip(pdf_path, annotations, tmp_path):
+    records = read_records(export(pdf_path, str(tmp_path / "doc.jsonl")))
+    assert_round_trip(records, annotations, pdf_path)
+    assert {record["subtype"] for record in records} == {"Highlight", "Text", "Underline", "Ink"}
+    assert all(record["modified"] for record in records)
+
+
+def test_gzip_holds_the_same_records(pdf_path, tmp_path):
+    plain = export(pdf_path, str(tmp_path / "doc.jsonl"))
+    compressed = export(pdf_path, str(tmp_path / "doc.jsonl.gz"))
+    with open(plain, "rb") as f, gzip.open(compressed, "rb") as g:
+        assert f.read() == g.read()
+
+
+def test_records_do_not_depend_on_the_language(pdf_path, tmp_path):
+    previous = translation_manager.get_current_language()
+    exports = []
+    try:
+        for language in ("en", "de", "tr"):
+            translation_manager.change_language(language)
+            with open(export(pdf_path, str(tmp_path / f"{language}.jsonl")), "rb") as f:
+                exports.append(f.read())
+    finally:
+        translation_manager.change_language(previous)
+    assert exports[0] == exports[1] == exports[2]
+
+
+def test_special_values():
+    annotations = [
+        PDFAnnotation(2, 'Zitat: "Größe" \\ {x}\nzweite Zeile ', "Text", (0.5, 1.25, 2, 3.125),
+                      "Ayşe", "D:20240131143000+01'00'", "D:20240201", "2",
+                      highlighted_text="😀 tab\there", type_code=0, page_label="2"),
+        PDFAnnotation(3, "", "Ink", (0, 0, 1, 1), None, None, "not a date", "3", None, 15),
+    ]
+    f = io.StringIO()
+    writer = JsonLinesWriter(f)
+    writer.write_header("dir/ünïcode.pdf", 3, 0)
+    for annotation in annotations:
+        writer.write_annotation(annotation)
+    writer.flush()
+
+    lines = f.getvalue().split("\n")
+    assert lines[-1] == ""
+    records = [json.loads(line) for line in lines[:-1]]
+    assert_round_trip(records, annotations, "dir/ünïcode.pdf")
+    assert records[0]["created"] == "2024-01-31T14:30:00+01:00"
+    assert records[0]["modified"] == "2024-02-01T00:00:00"
+    assert records[1]["modified"] is None
+    assert "Größe" in lines[0]
@@ -0,0 +1,120 @@
+"""
+The Markdown export must stay byte-identical to the output of the original
+save_annotations(), which formatted every localized template per line, in
+every language.
+"""
+
+import io
+from datetime import datetime
+
+import pytest
+
+from benchmarks.corpus import make_document
+from pdf_annotation_extractor import markdown
+from pdf_annotation_extractor.markdown import MarkdownWriter
+from pdf_annotation_extractor.pdf_utils import PDFAnnotation, PDFProcessor
+from pdf_annotation_extractor.translations import _, translation_manager
+
+EXPORT_TIME = datetime(2024, 9, 1, 8, 30, 15)
+
+
+def reference_markdown(pdf_path, page_count, page_offset, annotations) -> str:
+    # save_annotations() before the MarkdownWriter, writing to a string
+    f = io.StringIO()
+    f.write(f"# {_('PDF Annotations Export')}\n\n")
+    f.write(_("**{label}:** {value}\n").format(label=_("File"), value=pdf_path))
+    f.write(_("**{label}:** {value}\n").format(
+        label=_("Date"), value=EXPORT_TIME.strftime('%Y-%m-%d %H:%M:%S')))
+    f.write(_("**{label}:** {value}\n").format(label=_("Total Pages"), value=page_count))
+    f.write(_("**{label}:** {value}\n").format(
+        label=_("Page Numbering Starts At"), value=1 + page_offset))
+    f.write("\n---\n\n")
+
+    current_page = None
+    for annotation in sorted(annotations, key=lambda x: x.page_num):
+        if current_page != annotation.internal_page_num:
+            current_page = annotation.internal_page_num
+            f.write(f"\n## {current_page}\n\n")
+
+        f.write(f"### {annotation.type}\n\n")
+
+        if annotation.highlighted_text:
+            f.write(_("**{label}:** {value}\n\n").format(
+                label=_("Highlighted Text"), value=annotation.highlighted_text))
+
+        if annotation.content:
+            f.write(_("**{label}:** {value}\n\n").format(
+                label=_("Comment"), value=annotation.content))
+
+        if annotation.title:
+            f.write(_("**{label}:** {value}\n").format(label=_("Author"), value=annotation.title))
+
+        if annotation.modified_date:
+            f.write(_("**{label}:** {value}\n").format(
+                label=_("Date"), value=annotation.modified_date))
+
+        f.write("\n---\n\n")
+    return f.getvalue()
+
+
+class FixedDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return EXPORT_TIME
+
+
+@pytest.fixture(params=["en", "de", "tr"])
+def language(request, monkeypatch):
+    monkeypatch.setattr(markdown, "datetime", FixedDatetime)
+    previous = translation_manager.get_current_language()
+    translation_manager.change_language(request.param)
+    yield request.param
+    translation_manager.change_language(previous)
+
+
+@pytest.fixture(scope="module")
+def pdf_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("markdown") / "doc.pdf")
+    make_document(path, pages=10, lines=20, annotations=3)
+    return path
+
+
+def written(pdf_path, page_count, page_offset, annotations) -> str:
+    f = io.StringIO()
+    writer = MarkdownWriter(f)
+    writer.write_header(pdf_path, page_count, page_offset)
+    for annotation in annotations:
+        writer.write_annotation(annotation)
+    writer.flush()
+    assert writer.count == len(annotations)
+    return f.getvalue()
+
+
+def test_export_matches_reference(language, pdf_path, tmp_path):
+    output_path = str(tmp_path / "doc.md")
+    with PDFProcessor(pdf_path) as processor:
+        processor.write_annotations(output_path)
+        annotations = processor.extract_annotations()
+        expected = reference_markdown(processor.pdf_path, processor.doc.page_count,
+                                      processor.page_offset, annotations)
+    with open(output_path, encoding="utf-8") as f:
+        assert f.read() == expected
+
+
+def test_values_are_written_literally(language):
+    # Values that look like templates or span lines are not formatted again.
+    annotations = [
+        PDFAnnotation(1, "{label} and {value}", "Text", (0, 0, 1, 1), "{0}",
+                      modified_date="D:20240101120000Z", internal_page_num="i"),
+        PDFAnnotation(1, "", "Highlight", (0, 0, 1, 1), None,
+                      highlighted_text="first line\nsecond line {}", internal_page_num="i"),
+        PDFAnnotation(3, "Kommentar mit Ümlaut\n\n- Liste", "Text", (0, 0, 1, 1), "Ayşe",
+                      internal_page_num="1"),
+        PDFAnnotation(4, "only content", "Text", (0, 0, 1, 1), "", internal_page_num="1"),
+    ]
+    assert written("{path}.pdf", 12, -2, annotations) == \
+        reference_markdown("{path}.pdf", 12, -2, annotations)
+
+
+def test_no_annotations(language):
+    assert written("empty.pdf", 1, 0, []) == reference_markdown("empty.pdf", 1, 0, [])
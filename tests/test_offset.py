@@ -0,0 +1,52 @@
+"""
+Detection of the offset between absolute and printed page numbers.
+"""
+
+import fitz
+import pytest
+
+from benchmarks.corpus import make_document
+from pdf_annotation_extractor.pdf_utils import PDFProcessor
+
+
+def detect(path: str) -> int:
+    with PDFProcessor(path) as processor:
+        return processor.detect_page_offset()
+
+
+@pytest.mark.parametrize("front_matter", [0, 2, 5])
+def test_offset_from_footer_numbers(tmp_path, front_matter):
+    path = str(tmp_path / "doc.pdf")
+    make_document(path, pages=12, lines=5, annotations=1, front_matter=front_matter)
+    assert detect(path) == -front_matter
+
+
+def test_offset_from_page_labels(tmp_path):
+    path = str(tmp_path / "doc.pdf")
+    make_document(path, pages=12, lines=5, annotations=1, front_matter=12)
+    doc = fitz.open(path)
+    doc.set_page_labels([{"startpage": 0, "style": "r"},
+                         {"startpage": 3, "style": "D", "firstpagenum": 1}])
+    labelled = str(tmp_path / "labelled.pdf")
+    doc.save(labelled)
+    doc.close()
+    assert detect(labelled) == -3
+
+
+def test_no_page_numbers(tmp_path):
+    path = str(tmp_path / "doc.pdf")
+    make_document(path, pages=6, lines=5, annotations=1, front_matter=6)
+    assert detect(path) == -1
+
+
+def test_non_ascii_digits_in_margin_are_ignored(tmp_path):
+    # "²" is a digit for str.isdigit(), but not a number int() accepts.
+    path = str(tmp_path / "doc.pdf")
+    make_document(path, pages=8, lines=5, annotations=1, front_matter=2)
+    doc = fitz.open(path)
+    for page in doc:
+        page.insert_text((40, 20), "Chapter note ²", fontsize=9)
+    superscript = str(tmp_path / "superscript.pdf")
+    doc.save(superscript)
+    doc.close()
+    assert detect(superscript) == -2
@@ -0,0 +1,72 @@
+"""
+ProgressReporter: updates are rate-limited, while stage starts, the final
+state and messages always get through.
+"""
+
+from pdf_annotation_extractor.progress import (STAGE_MESSAGE, STAGE_PAGES, ProgressEvent,
+                                               ProgressReporter, as_reporter)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def reporter_with_events(interval: float = 0.5):
+    clock = Clock()
+    events = []
+    return ProgressReporter(events.append, interval, clock), events, clock
+
+
+def test_updates_are_rate_limited():
+    reporter, events, clock = reporter_with_events()
+    reporter.start(STAGE_PAGES, total=100, page_count=400)
+    for current in range(100):
+        reporter.update(current, page=current * 4 + 1, annotations=current * 2)
+        clock.now += 0.125
+    reporter.finish(annotations=250)
+
+    # The first update, one every 0.5 s and the final state
+    assert [event.current for event in events] == list(range(0, 100, 4)) + [100]
+    final = events[-1]
+    assert (final.total, final.page_count, final.annotations) == (100, 400, 250)
+    assert final.elapsed == 12.5
+    assert final.rate == 8.0
+    assert final.eta == 0.0
+    assert events[1].eta == 12.0
+
+
+def test_finish_is_not_repeated():
+    reporter, events, clock = reporter_with_events()
+    reporter.start(STAGE_PAGES, total=3)
+    reporter.update(3, annotations=7)
+    reporter.finish(annotations=7)
+    assert len(events) == 1
+
+
+def test_messages_are_always_delivered():
+    reporter, events, clock = reporter_with_events()
+    reporter.start(STAGE_PAGES, total=10)
+    reporter.update(1)
+    reporter.message("first")
+    reporter("second")
+    reporter.update(2)
+    assert [(event.stage, event.message) for event in events] == [
+        (STAGE_PAGES, None), (STAGE_MESSAGE, "first"), (STAGE_MESSAGE, "second")
+    ]
+
+
+def test_string_callbacks():
+    messages = []
+    reporter = as_reporter(messages.append)
+    assert as_reporter(reporter) is reporter
+    assert as_reporter(None) is None
+
+    reporter.start(STAGE_PAGES, total=2, page_count=9)
+    reporter.update(0, page=4)
+    reporter.message("Warning")
+    assert messages == [ProgressEvent(STAGE_PAGES, 0, 2, 4, 9).format(), "Warning"]
+    assert "4" in messages[0] and "9" in messages[0]
@@ -0,0 +1,144 @@
+"""
+The extraction daemon: responses for good and bad requests, admission
+control and Unix socket handling.
+"""
+
+import http.client
+import json
+import os
+import socket
+import threading
+
+import pytest
+
+from benchmarks.corpus import make_document
+from pdf_annotation_extractor.server import ExtractionService, create_server
+
+MAX_BODY_SIZE = 1024 * 1024
+
+
+@pytest.fixture(scope="module")
+def pdf_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("server") / "doc.pdf")
+    make_document(path, pages=6, lines=10, annotations=2)
+    return path
+
+
+@pytest.fixture(scope="module")
+def service():
+    service = ExtractionService(workers=1, queue_size=0)
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def server(service):
+    server = create_server(service, "127.0.0.1", 0, max_body_size=MAX_BODY_SIZE)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    assert service.pending == 0
+
+
+def post(server, body: bytes, content_type: str = "application/json", query: str = ""):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=30)
+    try:
+        connection.request("POST", "/extract" + query, body, {"Content-Type": content_type})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_path_job(server, pdf_path):
+    status, result = post(server, json.dumps({"path": pdf_path}).encode())
+    assert status == 200
+    assert result["page_count"] == 6
+    assert result["annotations"]
+
+
+def test_pdf_upload(server, pdf_path):
+    with open(pdf_path, "rb") as f:
+        status, result = post(server, f.read(), "application/pdf", "?name=upload.pdf")
+    assert status == 200
+    assert result["document"] == "upload.pdf"
+
+
+@pytest.mark.parametrize("body", [
+    b"not json",
+    b'["a list"]',
+    b'{"no": "path"}',
+    b'{"path": "x.pdf", "page_offset": [1]}',
+    b'{"path": "x.pdf", "format": "html"}',
+    b'{"path": "x.pdf", "name": 7}',
+])
+def test_bad_request(server, body):
+    status, result = post(server, body)
+    assert status == 400
+    assert result["error"]
+
+
+def test_unreadable_pdf(server, tmp_path):
+    path = tmp_path / "broken.pdf"
+    path.write_bytes(b"not a pdf")
+    status, _result = post(server, json.dumps({"path": str(path)}).encode())
+    assert status == 422
+
+
+def status_without_body(server, length: int) -> int:
+    # The body is announced but never sent; the answer must not wait for it.
+    with socket.create_connection(server.server_address, timeout=10) as client:
+        client.sendall(b"POST /extract HTTP/1.1\r\nHost: localhost\r\n"
+                       b"Content-Type: application/pdf\r\n"
+                       b"Content-Length: %d\r\n\r\n" % length)
+        return int(client.makefile("rb").readline().split()[1])
+
+
+def test_body_too_large(server):
+    assert status_without_body(server, MAX_BODY_SIZE + 1) == 413
+
+
+def test_queue_full_is_rejected_before_the_body_is_read(server, service):
+    service.reserve()
+    try:
+        assert status_without_body(server, MAX_BODY_SIZE) == 503
+    finally:
+        service.release()
+    assert service.status()["rejected"] == 1
+
+
+def test_stale_socket_is_replaced(service, tmp_path):
+    socket_path = str(tmp_path / "daemon.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+    server = create_server(service, socket_path=socket_path)
+    server.server_close()
+
+
+def test_socket_of_running_server_is_kept(service, tmp_path):
+    socket_path = str(tmp_path / "daemon.sock")
+    listening = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listening.bind(socket_path)
+    listening.listen(1)
+    try:
+        with pytest.raises(FileExistsError):
+            create_server(service, socket_path=socket_path)
+        assert os.path.exists(socket_path)
+    finally:
+        listening.close()
+
+
+def test_other_file_is_not_replaced(service, tmp_path):
+    path = tmp_path / "daemon.sock"
+    path.write_text("data")
+    with pytest.raises(FileExistsError):
+        create_server(service, socket_path=str(path))
+    assert path.read_text() == "data"
+
+
+def test_public_address_requires_root(service):
+    with pytest.raises(ValueError):
+        create_server(service, "0.0.0.0", 0)
@@ -0,0 +1,62 @@
+"""
+Extraction in worker processes (shards of pages) must give exactly the
+result of the serial loop.
+"""
+
+import threading
+
+import pytest
+
+from benchmarks.corpus import make_document
+from pdf_annotation_extractor.filters import AnnotationFilter
+from pdf_annotation_extractor import pdf_utils
+from pdf_annotation_extractor.pdf_utils import ExtractionCancelled, PDFProcessor
+
+WORKERS = 2
+
+
+@pytest.fixture(scope="module")
+def pdf_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("sharding") / "doc.pdf")
+    make_document(path, pages=40, lines=20, annotations=1.5)
+    return path
+
+
+def export(pdf_path: str, output_path: str, workers: int, annotation_filter=None) -> str:
+    with PDFProcessor(pdf_path, annotation_filter=annotation_filter) as processor:
+        processor.write_annotations(output_path, workers=workers, output_format="jsonl")
+    with open(output_path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_sharded_export_matches_serial(pdf_path, tmp_path):
+    serial = export(pdf_path, str(tmp_path / "serial.jsonl"), 1)
+    sharded = export(pdf_path, str(tmp_path / "sharded.jsonl"), WORKERS)
+    assert serial
+    assert sharded == serial
+
+
+def test_sharded_annotations_match_serial(pdf_path):
+    with PDFProcessor(pdf_path) as processor:
+        serial = list(processor.extract_annotations())
+        sharded = processor.extract_annotations(workers=WORKERS)
+    assert sharded == serial
+
+
+def test_sharded_export_with_filter_matches_serial(pdf_path, tmp_path):
+    annotation_filter = AnnotationFilter(types=["Highlight"], pages=(5, 30))
+    serial = export(pdf_path, str(tmp_path / "serial.jsonl"), 1, annotation_filter)
+    sharded = export(pdf_path, str(tmp_path / "sharded.jsonl"), WORKERS, annotation_filter)
+    assert serial
+    assert sharded == serial
+
+
+def test_shard_worker_stops_when_cancelled(pdf_path):
+    cancel_event = threading.Event()
+    cancel_event.set()
+    pdf_utils._init_shard_worker(cancel_event)
+    try:
+        with pytest.raises(ExtractionCancelled):
+            pdf_utils._extract_pages(pdf_path, list(range(10)), 0, "en")
+    finally:
+        pdf_utils._init_shard_worker(None)
@@ -0,0 +1,152 @@
+"""
+In-memory documents and stream outputs: every kind of source gives the
+same export as the file, and every kind of output receives the same text.
+"""
+
+import gzip
+import io
+import mmap
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.corpus import make_document
+from pdf_annotation_extractor.pdf_utils import (PDFProcessingError, PDFProcessor,
+                                                extract_pdf_annotations)
+from pdf_annotation_extractor.sources import DEFAULT_STREAM_NAME, document_source
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+NAME = "upload.pdf"
+
+
+@pytest.fixture(scope="module")
+def pdf_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("sources") / "doc.pdf")
+    make_document(path, pages=8, lines=20, annotations=3)
+    return path
+
+
+@pytest.fixture(scope="module")
+def pdf_bytes(pdf_path):
+    with open(pdf_path, "rb") as f:
+        return f.read()
+
+
+def export(source, output_format="jsonl", name=None) -> str:
+    output = io.StringIO()
+    with PDFProcessor(source, name=name) as processor:
+        processor.write_annotations(output, output_format=output_format)
+    return output.getvalue()
+
+
+@pytest.fixture(scope="module")
+def expected(pdf_path):
+    # The file's export, naming the document as the in-memory sources do
+    text = export(pdf_path)
+    return text.replace(pdf_path, NAME)
+
+
+class Pipe(io.RawIOBase):
+    """A read-only, unseekable stream like stdin or a socket."""
+
+    def __init__(self, data: bytes):
+        self._data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self._data.readinto(buffer)
+
+
+def test_bytes_and_buffers(pdf_bytes, expected, tmp_path):
+    mapped_path = tmp_path / "mapped.pdf"
+    mapped_path.write_bytes(pdf_bytes)
+    with open(mapped_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        sources = [pdf_bytes, bytearray(pdf_bytes), memoryview(pdf_bytes),
+                   memoryview(b"xx" + pdf_bytes)[2:], m, io.BytesIO(pdf_bytes),
+                   io.BufferedReader(Pipe(pdf_bytes))]
+        for source in sources:
+            assert export(source, name=NAME) == expected, type(source).__name__
+
+
+def test_file_objects(pdf_path, pdf_bytes):
+    with open(pdf_path, "rb") as f:
+        assert export(f) == export(pdf_path)
+    # Streams opened in text mode can't be read as PDFs.
+    with pytest.raises(PDFProcessingError):
+        PDFProcessor(io.TextIOWrapper(io.BufferedReader(Pipe(pdf_bytes)), encoding="latin-1"))
+
+
+def test_sources_are_not_copied(pdf_path, pdf_bytes):
+    assert document_source(pdf_bytes).stream is pdf_bytes
+    assert document_source(memoryview(pdf_bytes)).stream is pdf_bytes
+    assert document_source(pdf_bytes).name == DEFAULT_STREAM_NAME
+    with open(pdf_path, "rb") as f:
+        source = document_source(f)
+    assert (source.path, source.stream) == (pdf_path, None)
+
+
+def test_unsupported_source():
+    with pytest.raises(PDFProcessingError):
+        PDFProcessor(12)
+
+
+def test_in_memory_document_needs_an_output(pdf_bytes):
+    with pytest.raises(PDFProcessingError):
+        extract_pdf_annotations(pdf_bytes)
+
+
+def without_export_time(text: str, output_format: str) -> str:
+    # The fourth line of the Markdown header holds the time of the export.
+    if output_format != "markdown":
+        return text
+    lines = text.split("\n")
+    del lines[3]
+    return "\n".join(lines)
+
+
+@pytest.mark.parametrize("output_format", ["markdown", "jsonl"])
+def test_stream_outputs(pdf_path, tmp_path, output_format):
+    output_path = str(tmp_path / "out")
+    with PDFProcessor(pdf_path) as processor:
+        processor.write_annotations(output_path, output_format=output_format)
+    with open(output_path, encoding="utf-8") as f:
+        expected = without_export_time(f.read(), output_format)
+
+    binary = io.BytesIO()
+    extract_pdf_annotations(pdf_path, output=binary, output_format=output_format)
+    assert not binary.closed
+    compressed = io.BytesIO()
+    with gzip.GzipFile(fileobj=compressed, mode="wb") as f:
+        extract_pdf_annotations(pdf_path, output=f, output_format=output_format)
+    outputs = [binary.getvalue().decode("utf-8"),
+               gzip.decompress(compressed.getvalue()).decode("utf-8"),
+               export(pdf_path, output_format)]
+    for text in outputs:
+        assert without_export_time(text, output_format) == expected
+
+
+def run_cli(*arguments: str, stdin: bytes) -> bytes:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, (SRC_DIR, env.get("PYTHONPATH"))))
+    return subprocess.run([sys.executable, "-m", "pdf_annotation_extractor", "extract",
+                           *arguments], input=stdin, env=env, check=True,
+                          capture_output=True).stdout
+
+
+def test_stdin_to_stdout(pdf_bytes, expected):
+    output = run_cli("-", "-f", "jsonl", "-q", stdin=pdf_bytes)
+    assert output.decode("utf-8") == expected.replace(NAME, "<stdin>")
+
+    output = run_cli("-", "-f", "jsonl", "-q", "--gzip", stdin=pdf_bytes)
+    assert gzip.decompress(output).decode("utf-8") == expected.replace(NAME, "<stdin>")
+
+
+def test_stdin_to_file(pdf_bytes, expected, tmp_path):
+    output_path = str(tmp_path / "out.jsonl.gz")
+    run_cli("-", "-f", "jsonl", "-q", "--gzip", "-o", output_path, stdin=pdf_bytes)
+    with gzip.open(output_path, "rt", encoding="utf-8") as f:
+        assert f.read() == expected.replace(NAME, "<stdin>")
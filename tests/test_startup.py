@@ -0,0 +1,44 @@
+"""
+Start-up of the command line interface: building the parser must not
+import PyMuPDF or tkinter, and --help must stay within the budget of
+benchmarks/bench_startup.py.
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+HEAVY_MODULES = ("tkinter", "fitz")
+# Milliseconds; generous compared to the 100 ms of the benchmark, as test
+# machines are often loaded.
+BUDGET = 250.0
+REPEAT = 5
+
+
+def _run(*arguments: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, (SRC_DIR, env.get("PYTHONPATH"))))
+    return subprocess.run([sys.executable, *arguments], env=env, check=True,
+                          capture_output=True, text=True)
+
+
+def test_parser_does_not_import_heavy_modules():
+    output = _run("-c", (
+        "import sys\n"
+        "from pdf_annotation_extractor import cli\n"
+        "cli.build_parser()\n"
+        f"print(' '.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))\n"
+    )).stdout
+    assert output.split() == []
+
+
+def test_help_is_within_budget():
+    best = float("inf")
+    for _run_number in range(REPEAT):
+        start = time.perf_counter()
+        _run("-m", "pdf_annotation_extractor", "--help")
+        best = min(best, time.perf_counter() - start)
+    assert best * 1000 <= BUDGET
@@ -0,0 +1,202 @@
+"""
+AnnotationStore: imports from PDFs and JSON Lines exports, queries and
+full-text search.
+"""
+
+import os
+
+import pytest
+
+from benchmarks.corpus import make_document
+from pdf_annotation_extractor import store as store_module
+from pdf_annotation_extractor.pdf_utils import PDFAnnotation, PDFProcessor
+from pdf_annotation_extractor.store import AnnotationStore, StoreError, import_sources
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("store")
+    paths = []
+    for seed in (1, 2):
+        path = str(directory / f"doc{seed}.pdf")
+        make_document(path, pages=6, lines=20, annotations=2, seed=seed)
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture(scope="module")
+def annotations(corpus):
+    result = {}
+    for path in corpus:
+        with PDFProcessor(path) as processor:
+            result[path] = list(processor.iter_annotations())
+    return result
+
+
+@pytest.fixture
+def store(tmp_path):
+    with AnnotationStore(str(tmp_path / "annotations.db")) as store:
+        yield store
+
+
+def export_jsonl(pdf_path: str, output_path: str) -> str:
+    with PDFProcessor(pdf_path) as processor:
+        processor.write_annotations(output_path, output_format="jsonl")
+    return output_path
+
+
+def test_import_pdfs(store, corpus, annotations):
+    results = import_sources(store, corpus, workers=1)
+    assert results == {path: len(annotations[path]) for path in corpus}
+    assert store.documents() == sorted(corpus)
+
+    records = list(store.query(document=corpus[0]))
+    expected = annotations[corpus[0]]
+    assert [(r["page_num"], r["type_code"], r["author"], r["content"]) for r in records] == \
+        [(a.page_num, a.type_code, a.title, a.content) for a in expected]
+    assert [r["rect"] for r in records] == [list(a.rect) for a in expected]
+
+
+def test_jsonl_and_pdf_import_replace_the_same_document(store, corpus, annotations, tmp_path,
+                                                        monkeypatch):
+    # The export names the document as it was given, relative here.
+    monkeypatch.chdir(os.path.dirname(corpus[0]))
+    jsonl_path = export_jsonl(os.path.basename(corpus[0]), str(tmp_path / "doc1.jsonl.gz"))
+
+    count = len(annotations[corpus[0]])
+    assert import_sources(store, [jsonl_path]) == {corpus[0]: count}
+    assert import_sources(store, [corpus[0]], workers=1) == {corpus[0]: count}
+    assert store.documents() == [corpus[0]]
+    assert len(list(store.query())) == count
+
+
+def test_failures_are_reported_by_absolute_path(store, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open("broken.pdf", "wb") as f:
+        f.write(b"not a PDF")
+    results = import_sources(store, ["missing.jsonl", "broken.pdf"], workers=1)
+    assert sorted(results) == [str(tmp_path / "broken.pdf"), str(tmp_path / "missing.jsonl")]
+    assert all(isinstance(result, str) for result in results.values())
+    assert store.documents() == []
+
+
+def test_truncated_jsonl_keeps_earlier_annotations(store, corpus, annotations, tmp_path):
+    jsonl_path = export_jsonl(corpus[0], str(tmp_path / "doc1.jsonl"))
+    store.import_jsonl(jsonl_path)
+    with open(jsonl_path, encoding="utf-8") as f:
+        lines = f.readlines()
+    with open(jsonl_path, "w", encoding="utf-8") as f:
+        f.writelines(lines[:3])
+        f.write(lines[3][:20])
+
+    with pytest.raises(ValueError):
+        store.import_jsonl(jsonl_path)
+    assert len(list(store.query())) == len(annotations[corpus[0]])
+
+
+def test_query_conditions(store, corpus, annotations):
+    import_sources(store, corpus, workers=1)
+    everything = [a for path in sorted(corpus) for a in annotations[path]]
+
+    def matching(**conditions):
+        return [(r["document"], r["page_num"], r["content"]) for r in store.query(**conditions)]
+
+    def expected(predicate):
+        return [(path, a.page_num, a.content) for path in sorted(corpus)
+                for a in annotations[path] if predicate(a)]
+
+    assert matching(author="Bob Example") == expected(lambda a: a.title == "Bob Example")
+    assert matching(page=3) == expected(lambda a: a.page_num == 3)
+    assert matching(type_code="Highlight") == expected(lambda a: a.type_code == 8)
+    assert matching(since="2024-06-01", until="2024-09-01") == expected(
+        lambda a: "D:20240601" <= a.modified_date < "D:20240901")
+    assert matching(document=os.path.join(os.path.dirname(corpus[0]), "*2.pdf")) == \
+        expected(lambda a: a in annotations[corpus[1]])
+    assert len(matching(limit=5)) == 5
+    assert len(matching()) == len(everything)
+
+
+def test_author_query_uses_the_index(store):
+    plan = " ".join(store.explain(author="Alice Example", since="2024-01-01"))
+    assert "annotations_author" in plan
+
+
+def test_unknown_type_is_rejected(store):
+    with pytest.raises(StoreError):
+        list(store.query(type_code="NoSuchType"))
+
+
+def note(page_num: int, content: str, highlighted_text: str = "") -> PDFAnnotation:
+    return PDFAnnotation(page_num, content, "Text", (0, 0, 10, 10), "Alice Example",
+                         highlighted_text=highlighted_text, type_code=0)
+
+
+def searched(store, text, **options):
+    return [(r["document"], r["page_num"]) for r in store.search(text, limit=1000, **options)]
+
+
+def test_search_comments_and_highlighted_text(store, corpus, annotations):
+    import_sources(store, corpus, workers=1)
+    commented = [(path, a.page_num) for path in corpus for a in annotations[path] if a.content]
+    assert sorted(searched(store, "comment")) == sorted(commented)
+
+    record = next(store.search("comment 3*"))
+    assert record["content"].startswith("Comment 3.")
+    assert "[Comment]" in record["snippet"]
+
+    highlighted = [(path, a.page_num) for path in corpus for a in annotations[path]
+                   if "consequat" in (a.highlighted_text or "").split()]
+    assert highlighted
+    assert sorted(set(searched(store, "consequ*"))) == sorted(set(highlighted))
+    assert set(searched(store, "consequat", document=corpus[1])) == \
+        {hit for hit in highlighted if hit[0] == corpus[1]}
+
+
+def test_search_ranks_and_updates_on_reimport(store):
+    store.add_document("notes.pdf", [note(1, "budget"), note(2, "budget budget budget")])
+    assert searched(store, "budget") == [("notes.pdf", 2), ("notes.pdf", 1)]
+
+    store.add_document("notes.pdf", [note(1, "schedule")])
+    assert searched(store, "budget") == []
+    assert searched(store, "schedule") == [("notes.pdf", 1)]
+    store.remove_document("notes.pdf")
+    assert searched(store, "schedule") == []
+
+
+def test_search_query_syntax(store):
+    store.add_document("notes.pdf", [note(1, "cognitive load theory"), note(2, "load balancing"),
+                                     note(3, "Überlastung", "cognitive")])
+    assert searched(store, "cognitive load") == [("notes.pdf", 1)]
+    # Diacritics are ignored.
+    assert searched(store, "uberlastung") == [("notes.pdf", 3)]
+    assert sorted(searched(store, '"load balancing" OR theory', raw=True)) == \
+        [("notes.pdf", 1), ("notes.pdf", 2)]
+    # Query syntax in free text is searched for literally.
+    assert searched(store, 'load AND (') == []
+    assert searched(store, "") == []
+
+
+def test_bad_raw_query(store):
+    store.add_document("notes.pdf", [note(1, "budget")])
+    with pytest.raises(StoreError):
+        list(store.search('"unterminated', raw=True))
+
+
+def test_store_without_fts5(tmp_path, monkeypatch):
+    path = str(tmp_path / "annotations.db")
+    fts_script = store_module.MIGRATIONS[store_module.FTS_MIGRATION]
+    monkeypatch.setattr(store_module, "MIGRATIONS", (
+        store_module.MIGRATIONS[0], fts_script.replace("USING fts5(", "USING no_fts5(")
+    ))
+    with AnnotationStore(path) as store:
+        assert store.schema_version() == store_module.FTS_MIGRATION
+        store.add_document("notes.pdf", [note(1, "budget")])
+        assert [r["content"] for r in store.query()] == ["budget"]
+        with pytest.raises(StoreError, match="FTS5"):
+            list(store.search("budget"))
+
+    # Once FTS5 is available, the migration indexes the stored rows.
+    monkeypatch.undo()
+    with AnnotationStore(path) as store:
+        assert store.schema_version() == store_module.SCHEMA_VERSION
+        assert searched(store, "budget") == [("notes.pdf", 1)]
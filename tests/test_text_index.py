@@ -0,0 +1,99 @@
+"""
+PageWordIndex: lookups through the bands find the same words as a scan
+of the whole page, and markup annotations get exactly the words they
+cover.
+"""
+
+import random
+
+import fitz
+import pytest
+
+from pdf_annotation_extractor.pdf_utils import PDFProcessor
+from pdf_annotation_extractor.text_index import BAND_HEIGHT, PageWordIndex, annotation_rects
+
+LINES = [
+    "The quick brown fox jumps over the lazy dog",
+    "Pack my box with five dozen liquor jugs",
+    "How vexingly quick daft zebras jump",
+    "Sphinx of black quartz judge my vow",
+]
+TOP = 72
+LINE_HEIGHT = 14
+
+
+def scan(words, rect):
+    # words_in() without the bands
+    x0, y0, x1, y1 = rect
+    found = []
+    for index, word in enumerate(words):
+        wx0, wy0, wx1, wy1 = word[:4]
+        overlap = min(x1, wx1) - max(x0, wx0)
+        if y0 <= (wy0 + wy1) / 2 <= y1 and overlap > 0 and overlap * 2 >= wx1 - wx0:
+            found.append(index)
+    return found
+
+
+@pytest.fixture
+def page():
+    doc = fitz.open()
+    page = doc.new_page()
+    for number, text in enumerate(LINES):
+        page.insert_text((72, TOP + number * LINE_HEIGHT), text, fontsize=11)
+    yield page
+    doc.close()
+
+
+def test_bands_find_the_same_words_as_a_scan(page):
+    index = PageWordIndex.from_page(page)
+    rng = random.Random(1)
+    for _lookup in range(500):
+        x0, x1 = sorted(rng.uniform(0, page.rect.width) for _x in range(2))
+        y0 = rng.uniform(TOP - 20, TOP + len(LINES) * LINE_HEIGHT)
+        y1 = y0 + rng.uniform(0, 4 * BAND_HEIGHT)
+        assert sorted(index.words_in((x0, y0, x1, y1))) == scan(index.words, (x0, y0, x1, y1))
+
+
+def test_highlight_gets_the_words_it_covers(page):
+    quads = page.search_for("brown fox jumps", quads=True)
+    annot = page.add_highlight_annot(quads)
+    # The annotation rect reaches into the next line, which get_textbox()
+    # picked up; the quads don't.
+    index = PageWordIndex.from_page(page)
+    assert index.text_in(annotation_rects(annot)) == "brown fox jumps"
+
+
+def test_multi_line_highlight_skips_other_lines(page):
+    # From the middle of the second line to the middle of the fourth
+    start = page.search_for("five dozen liquor jugs")[0]
+    end = page.search_for("Sphinx of black")[0]
+    annot = page.add_highlight_annot(start=fitz.Point(start.x0 + 1, (start.y0 + start.y1) / 2),
+                                     stop=fitz.Point(end.x1 - 1, (end.y0 + end.y1) / 2))
+    rects = annotation_rects(annot)
+    assert len(rects) == 3
+
+    text = PageWordIndex.from_page(page).text_in(rects)
+    assert text == "five dozen liquor jugs\n" + LINES[2] + "\nSphinx of black"
+
+
+def test_half_covered_words(page):
+    index = PageWordIndex.from_page(page)
+    word = next(word for word in index.words if word[4] == "zebras")
+    x0, y0, x1, y1 = word[:4]
+    middle = (x0 + x1) / 2
+    assert index.text_in([(middle - 0.5, y0, x1, y1)]) == "zebras"
+    assert index.text_in([(middle + 1, y0, x1, y1)]) == ""
+    assert index.text_in([]) == ""
+
+
+def test_extraction_uses_the_index(tmp_path, page):
+    page.add_highlight_annot(page.search_for("lazy dog", quads=True))
+    page.add_underline_annot(page.search_for("black quartz", quads=True))
+    path = str(tmp_path / "doc.pdf")
+    page.parent.save(path)
+
+    with PDFProcessor(path) as processor:
+        annotations = list(processor.iter_annotations())
+        assert processor.stats.counters["text_lookups"] == 2
+    assert [annotation.highlighted_text for annotation in annotations] == \
+        ["lazy dog", "black quartz"]
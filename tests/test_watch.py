@@ -0,0 +1,150 @@
+"""
+watch(): exports are brought up to date at start and follow new and
+modified files, and a file that crashes its worker fails alone.
+"""
+
+import os
+import queue
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from benchmarks.corpus import make_document
+from pdf_annotation_extractor import watch as watch_module
+from pdf_annotation_extractor.batch import process_file
+from pdf_annotation_extractor.pdf_utils import PDFProcessor
+from pdf_annotation_extractor.watch import outdated_pdfs, watch
+
+SETTLE = 0.2
+# Seconds to wait for an expected result
+TIMEOUT = 30
+CRASHING_NAME = "crash.pdf"
+
+
+def crashing_process_file(path, *args):
+    # Runs in a worker process.
+    if os.path.basename(path) == CRASHING_NAME:
+        os._exit(1)
+    return process_file(path, *args)
+
+
+@pytest.fixture(scope="module")
+def sample(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("samples")
+    paths = []
+    for seed in (1, 2):
+        path = str(directory / f"sample{seed}.pdf")
+        make_document(path, pages=4, lines=20, annotations=2, seed=seed)
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture
+def folders(tmp_path):
+    inbox, exports = tmp_path / "inbox", tmp_path / "exports"
+    inbox.mkdir()
+    return str(inbox), str(exports)
+
+
+def export_of(pdf_path: str, exports: str) -> str:
+    name = os.path.splitext(os.path.basename(pdf_path))[0]
+    return os.path.join(exports, f"{name}_annotations.jsonl")
+
+
+def full_export(pdf_path: str, tmp_path) -> str:
+    output_path = str(tmp_path / "expected.jsonl")
+    with PDFProcessor(pdf_path) as processor:
+        processor.write_annotations(output_path, output_format="jsonl")
+    with open(output_path, encoding="utf-8") as f:
+        return f.read()
+
+
+def read(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+@contextmanager
+def watching(inbox: str, exports: str, polling: bool = False, workers: int = 1):
+    results: "queue.Queue" = queue.Queue()
+    stop = threading.Event()
+    thread = threading.Thread(target=watch, args=([inbox],), kwargs=dict(
+        workers=workers, output_dir=exports, output_format="jsonl",
+        result_callback=results.put, settle=SETTLE, polling=polling, poll_interval=0.1,
+        stop_event=stop))
+    thread.start()
+    try:
+        yield results
+    finally:
+        stop.set()
+        thread.join(TIMEOUT)
+    assert not thread.is_alive()
+
+
+def next_results(results: "queue.Queue", count: int):
+    return sorted((results.get(timeout=TIMEOUT) for _result in range(count)),
+                  key=lambda result: result.pdf_path)
+
+
+def test_outdated_pdfs(sample, folders):
+    inbox, exports = folders
+    os.makedirs(exports)
+    current, missing = (shutil.copy(path, inbox) for path in sample)
+    with open(export_of(current, exports), "w") as f:
+        f.write("")
+    assert outdated_pdfs([inbox], exports, "jsonl") == [missing]
+
+    # Modified after its export was written
+    later = time.time() + 10
+    os.utime(current, (later, later))
+    assert sorted(outdated_pdfs([inbox], exports, "jsonl")) == sorted([current, missing])
+
+
+@pytest.mark.parametrize("polling", [False, True], ids=["inotify", "polling"])
+def test_exports_follow_the_folder(sample, folders, tmp_path, polling):
+    inbox, exports = folders
+    first = shutil.copy(sample[0], inbox)
+    with watching(inbox, exports, polling) as results:
+        # Brought up to date at start
+        [result] = next_results(results, 1)
+        assert result.ok and result.pdf_path == first
+        assert read(export_of(first, exports)) == full_export(first, tmp_path)
+
+        # A new file is extracted once it has settled.
+        second = os.path.join(inbox, "second.pdf")
+        with open(sample[1], "rb") as source, open(second, "wb") as f:
+            data = source.read()
+            f.write(data[:len(data) // 2])
+            f.flush()
+            time.sleep(SETTLE / 4)
+            f.write(data[len(data) // 2:])
+        [result] = next_results(results, 1)
+        assert result.ok and result.pdf_path == second
+        assert read(export_of(second, exports)) == full_export(second, tmp_path)
+
+        # A modified file is extracted again.
+        shutil.copy(sample[1], first)
+        [result] = next_results(results, 1)
+        assert result.ok and result.pdf_path == first
+        assert read(export_of(first, exports)) == full_export(first, tmp_path)
+        time.sleep(SETTLE * 2)
+        assert results.empty()
+
+
+def test_crash_fails_only_its_file(sample, folders, monkeypatch):
+    monkeypatch.setattr(watch_module, "process_file", crashing_process_file)
+    inbox, exports = folders
+    names = ["a.pdf", CRASHING_NAME, "c.pdf"]
+    for name in names:
+        shutil.copy(sample[0], os.path.join(inbox, name))
+
+    with watching(inbox, exports, polling=True, workers=3) as results:
+        reported = next_results(results, 3)
+        time.sleep(SETTLE * 2)
+        assert results.empty()
+    assert [os.path.basename(result.pdf_path) for result in reported] == sorted(names)
+    assert [result.ok for result in reported] == [True, True, False]
+    assert os.path.exists(export_of(os.path.join(inbox, "a.pdf"), exports))